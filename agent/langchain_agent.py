@@ -5,6 +5,7 @@ from extractors.base import Extractor
 from extractors.claim_extractor import ClaimExtractor
 from ocr.processor import OCRDispatcher, OCRProcessor
 from rag.rag_client import RAGRunner, RAGConfig
+from rag.query_builder import QueryBuilder, RAG_QUERY_MAX_CHARS
 from orchestrator.payload_stream import PayloadPusherService
 from orchestrator.rpa_client import RPAClient
 
@@ -38,6 +39,7 @@ class ClaimPipeline:
         self.rpa = RPAClient()
         self.rag = rag_runner or RAGRunner(llm_client=llm_client, config=RAGConfig(k=rag_top_k))
         self.rag_top_k = rag_top_k
+        self.query_builder = QueryBuilder(max_chars=min(RAG_QUERY_MAX_CHARS, self.rag.embed_client.max_input_chars))
 
     def run(
         self,
@@ -52,12 +54,12 @@ class ClaimPipeline:
 
         # 1) OCR
         text = self.ocr.ocr_attachments(attachment_keys)
-        combined_text = f"{text}\n\n{body}"
 
-        # 2) RAG retrieval
+        # 2) RAG retrieval on a bounded query built from the salient parts of the claim
         retrieved_docs = []
         try:
-            retrieved = self.rag.retrieve(combined_text, k=self.rag_top_k)
+            queries = self.query_builder.build(subject, body, text)
+            retrieved = self.rag.retrieve_fused(queries, k=self.rag_top_k) if queries else []
             if retrieved:
                 for i, r in enumerate(retrieved, 1):
                     logger.info(
@@ -74,7 +76,7 @@ class ClaimPipeline:
             augmented_text = text
 
         # 3) LLM Extraction
-        struct = self.extractor.extract(subject, body, augmented_text, sender=sender)
+        struct = self.extractor.extract(subject, body, augmented_text, sender=sender, ocr_text=text)
 
         # 4) Correlation ID
         correlation_id = str(uuid.uuid4())
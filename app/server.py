@@ -1,12 +1,17 @@
 import os
 import logging
+import time
 import asyncio
+import threading
 from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from orchestrator.email_poller import EmailPollingService
 from rag.rag_client import RAGRunner
-from document_ingestor.scheduler import schedule_periodic_reindex, preload_knowledge_base
+from stores.snapshot_sync import SnapshotSubscriber, open_remote
+from document_ingestor.scheduler import schedule_periodic_reindex, preload_knowledge_base, start_event_consumer
+from document_ingestor.events import INGEST_EVENTS_QUEUE_URL, INGEST_RECONCILE_MINUTES, S3EventConsumer
 from orchestrator.rpa_reply_service import RPAReplyService
 from orchestrator.email_poller import GraphEmailClient
 from bedrock_llms.client import BedrockLLMClient
@@ -30,50 +35,145 @@ class EmailPollingAppS3:
     ):
         self.app = FastAPI(lifespan=self.lifespan)
         self.polling_service: EmailPollingService | None = None
+        self.polling_task: asyncio.Task | None = None
         self.rpa_reply_service: RPAReplyService | None = None
         self.s3_bucket = s3_bucket
         self.reindex_interval_minutes = reindex_interval_minutes
         self.work_dir = work_dir
         self.scheduler = None
+        self.event_consumer: S3EventConsumer | None = None
+        self.snapshot_subscriber: SnapshotSubscriber | None = None
+        self.rag_runner: RAGRunner | None = None
+        # Knowledge-base warm-up progress, reported by /ready.
+        self.kb_status = "starting"  # starting | warming | ready | failed
+        self.kb_error: str | None = None
+        self.startup_timings: dict[str, float] = {}
 
         # Health check route
         self.app.get("/")(self.read_root)
+        self.app.get("/ready")(self.readiness)
+        self.app.get("/rag/cache")(self.rag_cache_stats)
+        self.app.get("/queue/stats")(self.queue_stats)
+        self.app.get("/extract/templates")(self.template_stats)
 
     async def read_root(self) -> dict[str, str]:
         return {"message": "Email polling and RPA reply service running with S3 ingestion."}
 
-    @asynccontextmanager
-    async def lifespan(self, app: FastAPI):
+    async def rag_cache_stats(self) -> dict:
+        """Retrieval cache sizes and hit rates, for sizing RAG_*_CACHE_SIZE."""
+        if self.rag_runner is None:
+            return {}
+        return self.rag_runner.cache_stats()
+
+    async def template_stats(self) -> dict:
+        """Provider layout template hit rate: claims extracted without the main LLM call."""
+        if self.polling_service is None:
+            return {}
+        templates = getattr(self.polling_service.pipeline.extractor, "provider_templates", None)
+        return templates.stats() if templates is not None else {}
+
+    async def queue_stats(self) -> dict:
+        """Claim work queue depth and age, for scaling WORK_QUEUE_WORKERS."""
+        if self.polling_service is None:
+            return {}
+        return await asyncio.to_thread(self.polling_service.queue.stats)
+
+    async def readiness(self) -> JSONResponse:
+        """
+        200 once the knowledge base has been refreshed from S3, 503 before.
+        Claims are still processed meanwhile, against the last persisted index.
         """
-        Startup: RAG runner + S3 KB preload + async email polling + RPA reply service.
+        if self.kb_status != "ready" and self.snapshot_subscriber and self.snapshot_subscriber.current:
+            self.kb_status, self.kb_error = "ready", None
+        body: dict = {
+            "status": self.kb_status,
+            "ready": self.kb_status == "ready",
+            "error": self.kb_error,
+            "timings_secs": {name: round(secs, 3) for name, secs in self.startup_timings.items()},
+        }
+        if self.rag_runner is not None:
+            body["index"] = self.rag_runner.store.stats()
+            body["index_version"] = self.rag_runner.index_version
+        return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+    def _warm_up_knowledge_base(self, rag_runner: RAGRunner) -> None:
         """
+        Background thread: refresh the index from S3, then start the periodic
+        reindex. Replicas instead fetch the builder's latest snapshot and follow it.
+        """
+        self.kb_status = "warming"
+        start = time.time()
         try:
-            # --- RAG / S3 setup ---
-            logger.info("Initializing RAG runner...")
-            rag_runner = RAGRunner()
+            if rag_runner.config.snapshot_role == "replica":
+                subscriber = self.snapshot_subscriber = SnapshotSubscriber(rag_runner, open_remote())
+                # Covers a snapshot already loaded at startup; swaps rebuild it themselves.
+                rag_runner.build_lexical_index()
+                try:
+                    subscriber.poll_once()
+                    self.startup_timings["snapshot_fetch"] = time.time() - start
+                finally:
+                    # Keeps polling (and retrying) in the background either way.
+                    subscriber.start()
+                # Nothing published yet: /ready flips once the first snapshot arrives.
+                self.kb_status = "ready" if subscriber.current else "warming"
+                return
 
             logger.info("Preloading knowledge base from S3...")
             ingestor = preload_knowledge_base(
                 rag_runner,
                 bucket=self.s3_bucket,
+                timings=self.startup_timings,
                 work_dir=self.work_dir
             )
 
-            # Schedule periodic S3 reindex
-            if self.reindex_interval_minutes:
+            # Start incremental updates once the first pass is done. With S3 event
+            # notifications the full sweep only reconciles missed events.
+            if INGEST_EVENTS_QUEUE_URL:
+                self.event_consumer = start_event_consumer(ingestor, INGEST_EVENTS_QUEUE_URL)
+                self.scheduler = schedule_periodic_reindex(ingestor, interval_minutes=INGEST_RECONCILE_MINUTES)
+            elif self.reindex_interval_minutes:
                 self.scheduler = schedule_periodic_reindex(
                     ingestor,
                     interval_minutes=self.reindex_interval_minutes
                 )
+            self.kb_status = "ready"
+        except Exception as e:
+            logger.exception("Knowledge base warm-up failed: %s", e)
+            self.kb_error = str(e)
+            self.kb_status = "failed"
+        finally:
+            self.startup_timings["kb_warm_up"] = time.time() - start
+            logger.info("Knowledge base warm-up %s in %.2fs: %s", self.kb_status,
+                        self.startup_timings["kb_warm_up"], self.startup_timings)
+
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI):
+        """
+        Startup: RAG runner from the last persisted index, then email polling
+        and RPA replies right away; the S3 KB preload runs in the background.
+        """
+        try:
+            # --- RAG / S3 setup ---
+            logger.info("Initializing RAG runner...")
+            start = time.time()
+            rag_runner = RAGRunner()
+            self.rag_runner = rag_runner
+            self.startup_timings["rag_init"] = time.time() - start
+
+            threading.Thread(
+                target=self._warm_up_knowledge_base, args=(rag_runner,), name="kb-warm-up", daemon=True
+            ).start()
 
             # --- Email polling setup ---
             logger.info("Starting EmailPollingService...")
-            self.polling_service = EmailPollingService()
-            self.polling_service.pipeline.rag = rag_runner
-            asyncio.create_task(self.polling_service.run())
+            start = time.time()
+            self.polling_service = EmailPollingService(rag_runner=rag_runner)
+            self.polling_task = asyncio.create_task(self.polling_service.run())
+            self.startup_timings["email_polling"] = time.time() - start
 
             # --- RPA reply service setup ---
             logger.info("Starting RPAReplyService...")
+            start = time.time()
             llm_client = BedrockLLMClient()
             redis_client = AsyncRedisCache()
 
@@ -93,14 +193,26 @@ class EmailPollingAppS3:
                 poll_interval=30
             )
             asyncio.create_task(self.rpa_reply_service.run())
+            self.startup_timings["rpa_reply"] = time.time() - start
 
-            logger.info("Background services started successfully.")
+            logger.info("Background services started successfully: %s",
+                        {name: round(secs, 3) for name, secs in self.startup_timings.items()})
             yield
 
         finally:
             logger.info("Shutting down services...")
+            if self.event_consumer:
+                self.event_consumer.stop(timeout=0)
+            if self.snapshot_subscriber:
+                self.snapshot_subscriber.stop(timeout=0)
             if self.scheduler:
                 self.scheduler.shutdown(wait=False)
+            if self.polling_task:
+                # Workers still use the queue until the poller has cancelled and awaited them.
+                self.polling_task.cancel()
+                await asyncio.gather(self.polling_task, return_exceptions=True)
+            if self.polling_service:
+                self.polling_service.queue.close()
 
 # Use environment variable for S3 bucket
 s3_bucket_env = os.environ.get("S3_BUCKET_KB")
@@ -9,14 +9,14 @@ class BaseLLMClient(ABC):
         ...
 
     @abstractmethod
-    def chat_completion(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    def chat_completion(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Multi-turn chat completion (OpenAI-style response dict)"""
         ...
 
     @abstractmethod
     def stream(
         self,
-        messages: List[Dict[str, str]],
+        messages: List[Dict[str, Any]],
         *,
         temperature: float | None = None,
         max_tokens: int | None = None,
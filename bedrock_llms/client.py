@@ -1,16 +1,42 @@
+import threading
 from functools import lru_cache
 from typing import List, Dict, Any, Optional, Iterable
 from langchain_aws import ChatBedrock
-from .config import AWS_REGION, DEFAULT_BEDROCK_MODEL, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS
+from .config import (
+    AWS_REGION,
+    DEFAULT_BEDROCK_MODEL,
+    DEFAULT_TEMPERATURE,
+    DEFAULT_MAX_TOKENS,
+    PROMPT_CACHING,
+    PROMPT_CACHING_MAX_REJECTIONS,
+    PROMPT_CACHING_MODELS,
+)
 from .logger import get_logger
-from .retry import with_retries
+from .retry import validation_error, with_retries
 from .normalizer import normalize_response
-from .messages import to_lc_messages
+from .messages import to_lc_messages, strip_cache_control
 from .base import BaseLLMClient
 
 log = get_logger()
 
 
+def supports_prompt_caching(model_id: str) -> bool:
+    if PROMPT_CACHING in ("0", "off", "false", "no"):
+        return False
+    if PROMPT_CACHING in ("1", "on", "true", "yes"):
+        return True
+    return any(m in model_id for m in PROMPT_CACHING_MODELS)
+
+
+def is_cache_rejection(exc: BaseException) -> bool:
+    """True if exc comes from a ValidationException about cache checkpoints, not some other bad input."""
+    err = validation_error(exc)
+    if err is None:
+        return False
+    message = str(err.response.get("Error", {}).get("Message", "")).lower()
+    return "cache_control" in message or "cachepoint" in message or "caching" in message
+
+
 class BedrockLLMClient(BaseLLMClient):
     def __init__(
         self,
@@ -23,8 +49,18 @@ class BedrockLLMClient(BaseLLMClient):
         self.region_name = region_name or AWS_REGION
         self.default_temp = temperature
         self.default_max_tokens = max_tokens
+        self.prompt_caching = supports_prompt_caching(self.model_id)
+        self._cache_rejections = 0
+        self._usage_lock = threading.Lock()
+        self.usage = {
+            "calls": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0,
+        }
 
-        log.info("Initialized Bedrock client: %s", self.model_id)
+        log.info("Initialized Bedrock client: %s (prompt caching=%s)", self.model_id, self.prompt_caching)
 
     @lru_cache(maxsize=16)
     def _get_llm(self, temperature: float, max_tokens: int) -> ChatBedrock:
@@ -35,19 +71,72 @@ class BedrockLLMClient(BaseLLMClient):
             max_tokens=max_tokens,
         )
 
+    def _prepare(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return messages if self.prompt_caching else strip_cache_control(messages)
+
+    def _invoke_messages(self, llm: ChatBedrock, messages: List[Dict[str, Any]], retries: int):
+        cached = self.prompt_caching
+        try:
+            resp = with_retries(llm.invoke, to_lc_messages(self._prepare(messages)), retries=retries)
+        except Exception as e:
+            if not cached or not is_cache_rejection(e):
+                raise
+            # Resend this call without checkpoints; caching is only turned off if the model keeps refusing it.
+            with self._usage_lock:
+                self._cache_rejections += 1
+                if self._cache_rejections >= PROMPT_CACHING_MAX_REJECTIONS:
+                    self.prompt_caching = False
+            log.warning("Prompt caching rejected by %s (%d in a row%s): %s", self.model_id, self._cache_rejections,
+                        ", disabling" if not self.prompt_caching else "", e)
+            return with_retries(llm.invoke, to_lc_messages(strip_cache_control(messages)), retries=retries)
+        if cached:
+            with self._usage_lock:
+                self._cache_rejections = 0
+        return resp
+
+    def _record_usage(self, resp: Any) -> Dict[str, int]:
+        meta = getattr(resp, "usage_metadata", None) or {}
+        details = meta.get("input_token_details") or {}
+        usage = {
+            "prompt_tokens": int(meta.get("input_tokens", 0) or 0),
+            "completion_tokens": int(meta.get("output_tokens", 0) or 0),
+            "cache_read_tokens": int(details.get("cache_read", 0) or 0),
+            "cache_write_tokens": int(details.get("cache_creation", 0) or 0),
+        }
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["input_tokens"] += usage["prompt_tokens"]
+            self.usage["output_tokens"] += usage["completion_tokens"]
+            self.usage["cache_read_tokens"] += usage["cache_read_tokens"]
+            self.usage["cache_write_tokens"] += usage["cache_write_tokens"]
+        if usage["cache_read_tokens"] or usage["cache_write_tokens"]:
+            log.debug(
+                "Prompt cache: read=%d write=%d tokens",
+                usage["cache_read_tokens"], usage["cache_write_tokens"],
+            )
+        return usage
+
+    def usage_stats(self) -> Dict[str, int]:
+        with self._usage_lock:
+            return dict(self.usage)
+
     def invoke(self, prompt: str, *, temperature=None, max_tokens=None, retries=3) -> str:
         llm = self._get_llm(temperature or self.default_temp, max_tokens or self.default_max_tokens)
         resp = with_retries(llm.invoke, prompt, retries=retries)
+        self._record_usage(resp)
         return normalize_response(resp)
 
-    def chat_completion(self, messages: List[Dict[str, str]], *, temperature=None, max_tokens=None, retries=3) -> Dict[str, Any]:
+    def chat_completion(self, messages: List[Dict[str, Any]], *, temperature=None, max_tokens=None, retries=3) -> Dict[str, Any]:
         llm = self._get_llm(temperature or self.default_temp, max_tokens or self.default_max_tokens)
-        lc_messages = to_lc_messages(messages)
-        resp = with_retries(llm.invoke, lc_messages, retries=retries)
-        return {"choices": [{"message": {"role": "assistant", "content": normalize_response(resp)}}]}
+        resp = self._invoke_messages(llm, messages, retries)
+        usage = self._record_usage(resp)
+        return {
+            "choices": [{"message": {"role": "assistant", "content": normalize_response(resp)}}],
+            "usage": usage,
+        }
 
-    def stream(self, messages: List[Dict[str, str]], *, temperature=None, max_tokens=None) -> Iterable[str]:
+    def stream(self, messages: List[Dict[str, Any]], *, temperature=None, max_tokens=None) -> Iterable[str]:
         llm = self._get_llm(temperature or self.default_temp, max_tokens or self.default_max_tokens)
-        lc_messages = to_lc_messages(messages)
+        lc_messages = to_lc_messages(self._prepare(messages))
         for chunk in llm.stream(lc_messages):
             yield normalize_response(chunk)
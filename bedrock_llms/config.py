@@ -10,3 +10,15 @@ DEFAULT_BEDROCK_MODEL = os.environ.get(
 
 DEFAULT_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.0"))
 DEFAULT_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1024"))
+
+# Prompt caching: "auto" enables it only for models that accept Anthropic-style cache_control
+# blocks (Nova uses a different cachePoint format and is not listed).
+PROMPT_CACHING = os.getenv("BEDROCK_PROMPT_CACHING", "auto").lower()
+# Consecutive cache_control rejections after which a client stops sending cache checkpoints.
+PROMPT_CACHING_MAX_REJECTIONS = int(os.getenv("BEDROCK_PROMPT_CACHING_MAX_REJECTIONS", "3"))
+PROMPT_CACHING_MODELS = tuple(
+    m.strip() for m in os.getenv(
+        "BEDROCK_PROMPT_CACHING_MODELS",
+        "claude-3-5-haiku,claude-3-7-sonnet,claude-sonnet-4,claude-opus-4,claude-haiku-4",
+    ).split(",") if m.strip()
+)
@@ -1,7 +1,11 @@
 import os
 import json
+import time
+import random
 import logging
-from typing import List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
 import boto3
 
 logger = logging.getLogger(__name__)
@@ -9,24 +13,143 @@ logger.setLevel(os.environ.get("EMBED_LOG_LEVEL", "INFO"))
 
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 EMBED_MODEL_ID = os.getenv("TITAN_EMBED_MODEL", "amazon.titan-embed-text-v1")
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "8"))
+EMBED_MAX_RPS = float(os.getenv("EMBED_MAX_RPS", "20"))  # 0 disables rate limiting
+EMBED_RETRIES = int(os.getenv("EMBED_RETRIES", "3"))
+# Models accepting a list of texts per request, and their per-request limit.
+BATCH_MODELS = {"cohere.embed": 96}
+# Per-text input limits in characters. Titan's are token limits (8k) at a
+# conservative ~3 chars/token for noisy OCR text; Cohere caps texts at 2048 chars.
+MODEL_INPUT_CHARS = {"amazon.titan-embed": 24000, "cohere.embed": 2048}
+EMBED_MAX_INPUT_CHARS = int(os.getenv("EMBED_MAX_INPUT_CHARS", "0"))  # 0 uses the model limit
+# Cohere embed v3 input types: indexed chunks and search queries are embedded differently.
+SEARCH_DOCUMENT = "search_document"
+SEARCH_QUERY = "search_query"
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting requests per second."""
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
 
 class BedrockEmbedClient:
     """Wrapper for AWS Bedrock embedding model."""
-    def __init__(self, model_id: str = EMBED_MODEL_ID, region: str = AWS_REGION):
+    def __init__(
+        self,
+        model_id: str = EMBED_MODEL_ID,
+        region: str = AWS_REGION,
+        max_workers: int = EMBED_MAX_WORKERS,
+        max_rps: float = EMBED_MAX_RPS,
+        retries: int = EMBED_RETRIES,
+    ):
         self.model_id = model_id
         self.client = boto3.client("bedrock-runtime", region_name=region)
+        self.max_workers = max(1, max_workers)
+        self.retries = max(1, retries)
+        self.limiter = RateLimiter(max_rps)
+        self.batch_limit = next((n for prefix, n in BATCH_MODELS.items() if prefix in model_id), 1)
+        self.max_input_chars = EMBED_MAX_INPUT_CHARS or next(
+            (n for prefix, n in MODEL_INPUT_CHARS.items() if prefix in model_id), 24000
+        )
 
-    def embed(self, text: str) -> List[float]:
-        """Return embedding vector for a given text."""
-        body = json.dumps({"inputText": text})
-        resp = self.client.invoke_model(modelId=self.model_id, body=body)
-        body_str = resp["body"].read().decode("utf-8")
-        try:
-            data = json.loads(body_str)
-            emb = data.get("embedding") or data.get("embeddings") or data.get("result")
-            if isinstance(emb, list):
-                return emb
-        except Exception:
-            logger.exception("Failed to parse embedding response; returning empty vector")
+    def truncate(self, text: str) -> str:
+        """Clip text to the model's input limit so oversize inputs are not rejected."""
+        if len(text) <= self.max_input_chars:
+            return text
+        logger.debug("Truncating embedding input from %d to %d chars", len(text), self.max_input_chars)
+        return text[:self.max_input_chars]
+
+    def _invoke(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.limiter.acquire()
+        resp = self.client.invoke_model(modelId=self.model_id, body=json.dumps(payload))
+        return json.loads(resp["body"].read().decode("utf-8"))
+
+    def embed(self, text: str, input_type: str = SEARCH_DOCUMENT) -> List[float]:
+        """Return embedding vector for a given text; input_type only applies to Cohere models."""
+        if self.batch_limit > 1:
+            return self._embed_batch([text], input_type)[0]
+        data = self._invoke({"inputText": self.truncate(text)})
+        emb = data.get("embedding") or data.get("embeddings") or data.get("result")
+        if isinstance(emb, list):
+            return emb
         raise RuntimeError("Embedding error or unexpected response from Bedrock")
+
+    def _embed_batch(self, texts: Sequence[str], input_type: str = SEARCH_DOCUMENT) -> List[List[float]]:
+        data = self._invoke({"texts": [self.truncate(t) for t in texts], "input_type": input_type})
+        embs = data.get("embeddings")
+        if isinstance(embs, dict):
+            embs = embs.get("float")
+        if not isinstance(embs, list) or len(embs) != len(texts):
+            raise RuntimeError("Embedding error or unexpected batch response from Bedrock")
+        return embs
+
+    def embed_many(self, texts: Sequence[str], input_type: str = SEARCH_DOCUMENT) -> List[List[float]]:
+        """
+        Embed many texts concurrently (or in model-sized batches where the model
+        accepts them), preserving input order. Only failed items are retried.
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending = list(range(len(texts)))
+        if not pending:
+            return []
+
+        if self.batch_limit > 1:
+            def work(idxs: List[int]) -> List[int]:
+                try:
+                    for i, emb in zip(idxs, self._embed_batch([texts[i] for i in idxs], input_type)):
+                        results[i] = emb
+                    return []
+                except Exception as e:
+                    logger.debug("Embedding batch of %d failed: %s", len(idxs), e)
+                    return idxs
+
+            def units(idxs: List[int]) -> List[List[int]]:
+                return [idxs[j:j + self.batch_limit] for j in range(0, len(idxs), self.batch_limit)]
+        else:
+            def work(idxs: List[int]) -> List[int]:
+                i = idxs[0]
+                try:
+                    results[i] = self.embed(texts[i], input_type)
+                    return []
+                except Exception as e:
+                    logger.debug("Embedding item %d failed: %s", i, e)
+                    return idxs
+
+            def units(idxs: List[int]) -> List[List[int]]:
+                return [[i] for i in idxs]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for attempt in range(self.retries):
+                failed: List[int] = []
+                for f in pool.map(work, units(pending)):
+                    failed.extend(f)
+                pending = failed
+                if not pending:
+                    break
+                if attempt < self.retries - 1:
+                    wait = (2 ** attempt) + random.random()
+                    logger.warning("Retrying %d failed embeddings (sleep %.2fs)", len(pending), wait)
+                    time.sleep(wait)
+
+        if pending:
+            raise RuntimeError(f"Embedding failed for {len(pending)} of {len(texts)} texts")
+        return results  # type: ignore[return-value]
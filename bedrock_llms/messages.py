@@ -1,7 +1,32 @@
-from typing import List, Dict
+from typing import Any, List, Dict
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
 
-def to_lc_messages(messages: List[Dict[str, str]]) -> List[BaseMessage]:
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def text_block(text: str) -> Dict[str, Any]:
+    return {"type": "text", "text": text}
+
+
+def cacheable_block(text: str) -> Dict[str, Any]:
+    """Text block marked as a prompt-cache checkpoint (everything up to it is cached)."""
+    return {"type": "text", "text": text, "cache_control": dict(CACHE_CONTROL)}
+
+
+def strip_cache_control(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Flatten text-block content back to plain strings for models without caching."""
+    flat: List[Dict[str, Any]] = []
+    for msg in messages:
+        content = msg.get("content", "")
+        if isinstance(content, list):
+            content = "".join(
+                block.get("text", "") if isinstance(block, dict) else str(block) for block in content
+            )
+        flat.append({**msg, "content": content})
+    return flat
+
+
+def to_lc_messages(messages: List[Dict[str, Any]]) -> List[BaseMessage]:
     lc_messages: List[BaseMessage] = []
     for msg in messages:
         role = msg.get("role", "user")
@@ -1,14 +1,31 @@
 import time, random
-from typing import Callable, Any
+from typing import Callable, Any, Optional
+from botocore.exceptions import ClientError
 from .logger import get_logger
 
 log = get_logger()
 
+
+def validation_error(exc: Optional[BaseException]) -> Optional[ClientError]:
+    """The Bedrock ValidationException exc is, or was raised from; None if there is none."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, ClientError) and exc.response.get("Error", {}).get("Code") == "ValidationException":
+            return exc
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
 def with_retries(func: Callable, *args, retries: int = 3, **kwargs) -> Any:
     for attempt in range(retries):
         try:
             return func(*args, **kwargs)
         except Exception as e:
+            # A malformed request fails the same way every time.
+            if validation_error(e) is not None:
+                log.error("LLM call rejected as invalid, not retrying: %s", e)
+                raise
             if attempt == retries - 1:
                 log.exception("LLM call failed permanently.")
                 raise
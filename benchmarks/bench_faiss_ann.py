@@ -0,0 +1,86 @@
+"""
+Recall and latency of FaissStore index types against the exact flat index
+on synthetic clustered vectors.
+
+Usage:
+    python -m benchmarks.bench_faiss_ann [--sizes 10000,100000,1000000] [--dim 256]
+        [--queries 500] [--k 10] [--types hnsw,ivf_flat,ivf_pq,ivf_sq8]
+
+Full 1M x 1536-d float32 needs ~6 GB; the default dim keeps the run on a laptop.
+"""
+import argparse
+import time
+import numpy as np
+import faiss
+from stores.faiss_store import FaissIndexOptions, build_index, apply_search_params
+
+
+def synthetic(n: int, dim: int, seed: int, n_clusters: int = 256) -> np.ndarray:
+    """Gaussian clusters, closer to real embedding distributions than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n)
+    x = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+
+def timed_search(index, xq: np.ndarray, k: int):
+    start = time.perf_counter()
+    D, I = index.search(xq, k)
+    batch = time.perf_counter() - start
+    start = time.perf_counter()
+    for q in xq[:100]:
+        index.search(q.reshape(1, -1), k)
+    single_ms = (time.perf_counter() - start) / min(100, len(xq)) * 1000
+    return I, batch, single_ms
+
+
+def recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", default="hnsw,ivf_flat,ivf_pq,ivf_sq8")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--pq-m", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'n':>9} {'index':>9} {'build s':>8} {'MB':>8} {'recall@k':>9} {'batch ms/q':>11} {'single ms':>10}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        xb = synthetic(n, args.dim, seed=1)
+        xq = synthetic(args.queries, args.dim, seed=2)
+
+        flat = faiss.IndexFlatIP(args.dim)
+        flat.add(xb)
+        truth, batch, single = timed_search(flat, xq, args.k)
+        mb = xb.nbytes / 1e6
+        print(f"{n:>9} {'flat':>9} {0.0:>8.2f} {mb:>8.1f} {1.0:>9.3f} {batch / len(xq) * 1000:>11.3f} {single:>10.3f}")
+
+        for index_type in args.types.split(","):
+            opts = FaissIndexOptions(
+                index_type=index_type, metric="cosine", nprobe=args.nprobe,
+                ef_search=args.ef_search, pq_m=args.pq_m,
+            )
+            start = time.perf_counter()
+            index = build_index(args.dim, opts, n_train=n)
+            if not index.is_trained:
+                index.train(xb[: min(n, 100_000)])
+            index.add_with_ids(xb, np.arange(n, dtype="int64"))
+            apply_search_params(index, opts)
+            build = time.perf_counter() - start
+            size_mb = faiss.serialize_index(index).nbytes / 1e6
+            found, batch, single = timed_search(index, xq, args.k)
+            print(f"{n:>9} {index_type:>9} {build:>8.2f} {size_mb:>8.1f} {recall(truth, found):>9.3f} "
+                  f"{batch / len(xq) * 1000:>11.3f} {single:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Query latency of vector-only, hybrid (BM25 + vector, RRF-fused) and
+lexical fast-path retrieval over a synthetic benefits corpus.
+
+Embedding a query is a Bedrock round trip, which dominates vector search;
+it is simulated with a fixed delay (--embed-ms) on top of a deterministic
+local embedding, so the numbers show what the lexical fast path saves.
+
+Usage:
+    python -m benchmarks.bench_hybrid_retrieval [--chunks 20000] [--queries 300]
+        [--k 5] [--embed-ms 60] [--fastpath 0.8] [--dim 256]
+
+Code lookups ("J45.9 asthma cover") should mostly take the fast path;
+free-text questions fall back to hybrid and pay the embedding call.
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+from rag.fusion import reciprocal_rank_fusion
+from rag.lexical import BM25Index
+from stores.faiss_store import FaissIndexOptions, FaissStore
+
+WORDS = (
+    "member claim benefit outpatient inpatient dental optical maternity limit policy scheme cover "
+    "exclusion pre-authorisation hospital consultation annual family chronic medication referral"
+).split()
+QUESTIONS = [
+    "what is the outpatient limit for a family",
+    "does the scheme cover maternity at a private hospital",
+    "is pre-authorisation needed before an inpatient admission",
+    "how much dental cover does a member get each year",
+]
+
+
+def embed(text: str, dim: int, delay: float) -> List[float]:
+    """Deterministic stand-in for the embedding model, plus its network latency."""
+    if delay:
+        time.sleep(delay)
+    rng = np.random.default_rng(abs(hash(text)) % (2**32))
+    return rng.standard_normal(dim).astype(np.float32).tolist()
+
+
+def corpus(n: int, seed: int = 3) -> List[Tuple[str, Dict[str, str]]]:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        code = f"{rng.choice('ABEJKZ')}{rng.randint(10, 99)}.{rng.randint(0, 9)}"
+        text = f"Diagnosis code {code} benefit B{i:05d}: " + " ".join(rng.choice(WORDS) for _ in range(60))
+        docs.append((text, {"source": f"doc{i // 50}", "content_hash": f"h{i}", "code": code}))
+    return docs
+
+
+def queries(docs, n: int, seed: int = 5) -> List[str]:
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        if i % 2:
+            out.append(rng.choice(QUESTIONS))
+        else:
+            text, meta = rng.choice(docs)
+            out.append(f"{text.split(':')[0].split()[-1]} {meta['code']}")
+    return out
+
+
+def retrieve(mode: str, query: str, store: FaissStore, lexical: BM25Index, k: int, args) -> bool:
+    """One query the way RAGRunner.retrieve_many handles it; True if the fast path answered."""
+    delay = args.embed_ms / 1000
+    hits: List[Dict] = []
+    if mode != "vector":
+        ranked, ideal = lexical.search(query, 2 * k)
+        scores = dict(ranked)
+        hits = [{**d, "lexical_score": scores[d["id"]]} for d in store.get([i for i, _ in ranked])]
+        if mode == "fastpath" and len(hits) >= k and ideal and ranked[0][1] / ideal >= args.fastpath:
+            return True
+    found = store.query(embed(query, args.dim, delay), k=k)
+    if hits:
+        reciprocal_rank_fusion([found, hits], k)
+    return False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-ms", type=float, default=60.0)
+    parser.add_argument("--fastpath", type=float, default=0.8)
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    docs = corpus(args.chunks)
+    store = FaissStore(args.dim, FaissIndexOptions(index_type="flat", metric="cosine"))
+    ids = store.upsert(docs, [embed(text, args.dim, 0) for text, _ in docs])
+    start = time.perf_counter()
+    lexical = BM25Index()
+    lexical.add((i, text, meta) for i, (text, meta) in zip(ids, docs))
+    print(f"{args.chunks} chunks, BM25 build {time.perf_counter() - start:.2f}s, {lexical.stats()['terms']} terms")
+
+    qs = queries(docs, args.queries)
+    print(f"{'mode':>9} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'fast path':>10}")
+    for mode in ("vector", "hybrid", "fastpath"):
+        times, fast = [], 0
+        for q in qs:
+            t0 = time.perf_counter()
+            fast += retrieve(mode, q, store, lexical, args.k, args)
+            times.append((time.perf_counter() - t0) * 1000)
+        times.sort()
+        print(f"{mode:>9} {statistics.mean(times):>8.2f} {times[len(times) // 2]:>8.2f} "
+              f"{times[int(len(times) * 0.95)]:>8.2f} {fast / len(qs):>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
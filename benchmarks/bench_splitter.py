@@ -0,0 +1,80 @@
+"""
+Throughput, scaling and peak memory of the streaming TokenSplitter on large
+synthetic policy-style documents, fed as fixed-size text blocks the way the
+S3 parsers deliver them.
+
+Usage:
+    python -m benchmarks.bench_splitter [--sizes-mb 1,4,16] [--chunk-tokens 256]
+        [--overlap 32] [--block-kb 64]
+
+Linear time shows up as a flat MB/s column across sizes; peak memory should
+stay near one block plus one chunk regardless of document size.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Iterator
+from document_ingestor.splitters import SplitOptions, TokenSplitter, approx_tokens
+
+WORDS = (
+    "member claim benefit outpatient inpatient dental optical maternity limit policy scheme cover "
+    "exclusion pre-authorisation hospital consultation KES 25,000 annual per family the of and is to"
+).split()
+
+
+def synthetic_blocks(total_bytes: int, block_bytes: int, seed: int = 7) -> Iterator[str]:
+    """Paragraphs of random sentences, generated lazily and cut at arbitrary offsets."""
+    rng = random.Random(seed)
+    produced = 0
+    buf = ""
+    while produced < total_bytes:
+        while len(buf) < block_bytes:
+            sentences = (
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 40))).capitalize() + rng.choice(".;?")
+                for _ in range(rng.randint(1, 10))
+            )
+            buf += " ".join(sentences) + "\n\n"
+        block, buf = buf[:block_bytes], buf[block_bytes:]
+        produced += len(block)
+        yield block
+
+
+def run(size_mb: float, splitter: TokenSplitter, block_bytes: int) -> None:
+    total = int(size_mb * 1024 * 1024)
+    # Generate outside the timed region so only splitting is measured.
+    blocks = list(synthetic_blocks(total, block_bytes))
+
+    start = time.perf_counter()
+    n_chunks = sum(1 for _ in splitter.split_blocks(blocks))
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    chunks = splitter.split_blocks(synthetic_blocks(total, block_bytes))
+    sample = [next(chunks) for _ in range(50)]
+    for _ in chunks:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mean_tokens = sum(approx_tokens(c) for c in sample) / len(sample)
+    print(f"{size_mb:>7.1f} MB  {n_chunks:>8} chunks  {elapsed:>7.2f}s  {size_mb / elapsed:>6.2f} MB/s  "
+          f"~{mean_tokens:.0f} tok/chunk  peak {peak / 1024:,.0f} KiB (streamed)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", default="1,4,16")
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--block-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    splitter = TokenSplitter(SplitOptions(args.chunk_tokens, args.overlap))
+    print(f"chunk_size={args.chunk_tokens} tokens overlap={args.overlap} block={args.block_kb} KiB")
+    for size in (float(s) for s in args.sizes_mb.split(",")):
+        run(size, splitter, args.block_kb * 1024)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote_plus
+import boto3
+from botocore.exceptions import ClientError
+from .logging_utils import logger
+
+# SQS queue receiving the knowledge bucket's s3:ObjectCreated:* / s3:ObjectRemoved:* notifications.
+INGEST_EVENTS_QUEUE_URL: Optional[str] = os.getenv("INGEST_EVENTS_QUEUE_URL")
+# Custom SQS endpoint, e.g. ElasticMQ or LocalStack for local runs.
+SQS_ENDPOINT_URL: Optional[str] = os.getenv("SQS_ENDPOINT_URL")
+# Keep receiving until the queue has been quiet this long, so a bulk upload becomes one batch.
+INGEST_EVENTS_COALESCE_SECS = float(os.getenv("INGEST_EVENTS_COALESCE_SECS", "5"))
+# Upper bound on how long one batch keeps collecting during a sustained burst.
+INGEST_EVENTS_MAX_BATCH_SECS = float(os.getenv("INGEST_EVENTS_MAX_BATCH_SECS", "60"))
+INGEST_EVENTS_WAIT_SECS = int(os.getenv("INGEST_EVENTS_WAIT_SECS", "20"))
+# Visibility timeout held on received messages; it is renewed every third of it until they are deleted.
+INGEST_EVENTS_VISIBILITY_SECS = int(os.getenv("INGEST_EVENTS_VISIBILITY_SECS", "300"))
+INGEST_EVENTS_DELETE_ATTEMPTS = int(os.getenv("INGEST_EVENTS_DELETE_ATTEMPTS", "3"))
+# Full bucket sweep interval while event-driven; a safety net for lost notifications.
+INGEST_RECONCILE_MINUTES = int(os.getenv("INGEST_RECONCILE_MINUTES", "720"))
+
+CREATED = "created"
+REMOVED = "removed"
+
+
+def parse_s3_event(body: str, bucket: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    (key, created|removed) for each record of an S3 notification,
+    delivered directly or wrapped in an SNS envelope. Test events and other
+    buckets' records are dropped.
+    """
+    try:
+        payload = json.loads(body)
+    except (TypeError, ValueError):
+        logger.warning("Ignoring non-JSON queue message")
+        return []
+    if isinstance(payload, dict) and "Message" in payload and "Records" not in payload:
+        try:
+            payload = json.loads(payload["Message"])
+        except (TypeError, ValueError):
+            return []
+    events: List[Tuple[str, str]] = []
+    for record in (payload or {}).get("Records", []) if isinstance(payload, dict) else []:
+        name = record.get("eventName", "")
+        s3 = record.get("s3") or {}
+        if bucket and (s3.get("bucket") or {}).get("name") != bucket:
+            continue
+        obj = s3.get("object") or {}
+        if "key" not in obj:
+            continue
+        if name.startswith("ObjectCreated"):
+            action = CREATED
+        elif name.startswith("ObjectRemoved"):
+            action = REMOVED
+        else:
+            continue
+        # Keys are URL-encoded with '+' for spaces.
+        events.append((unquote_plus(obj["key"]), action))
+    return events
+
+
+class S3EventConsumer:
+    """
+    Applies S3 object notifications from an SQS queue to the index.
+
+    Messages are collected until the queue goes quiet (or a batch has been
+    open for max_batch_secs) and coalesced to one entry per key. SQS does
+    not keep events in order, so each key's current state is read with a
+    HEAD: existing objects go through ingest_file (unchanged ones are still
+    skipped by fingerprint), missing ones are dropped from the index.
+
+    A batch runs under the ingestor's run_lock, so it never overlaps the
+    reconciliation sweep. While a batch is collected and applied, a
+    heartbeat keeps its messages invisible to other consumers. Messages are
+    deleted only once their keys have been applied; failures are redelivered
+    after the visibility timeout.
+    """
+
+    def __init__(
+        self,
+        ingestor,
+        queue_url: Optional[str] = INGEST_EVENTS_QUEUE_URL,
+        sqs=None,
+        endpoint_url: Optional[str] = SQS_ENDPOINT_URL,
+        coalesce_secs: float = INGEST_EVENTS_COALESCE_SECS,
+        max_batch_secs: float = INGEST_EVENTS_MAX_BATCH_SECS,
+        wait_secs: int = INGEST_EVENTS_WAIT_SECS,
+        visibility_secs: int = INGEST_EVENTS_VISIBILITY_SECS,
+        delete_attempts: int = INGEST_EVENTS_DELETE_ATTEMPTS,
+    ):
+        if not queue_url:
+            raise ValueError("INGEST_EVENTS_QUEUE_URL must be set to consume S3 events")
+        self.ingestor = ingestor
+        self.queue_url = queue_url
+        self.sqs = sqs or boto3.client("sqs", endpoint_url=endpoint_url)
+        self.coalesce_secs = coalesce_secs
+        self.max_batch_secs = max_batch_secs
+        self.wait_secs = wait_secs
+        self.visibility_secs = max(30, visibility_secs)
+        self.delete_attempts = max(1, delete_attempts)
+        self.last_summary: Dict[str, Any] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Receipt handles of the batch in flight, renewed by the heartbeat.
+        self._held: Set[str] = set()
+        self._held_lock = threading.Lock()
+
+    def _receive(self, wait_secs: int) -> List[Dict[str, Any]]:
+        resp = self.sqs.receive_message(
+            QueueUrl=self.queue_url, MaxNumberOfMessages=10, WaitTimeSeconds=max(0, min(20, wait_secs)),
+            VisibilityTimeout=self.visibility_secs,
+        )
+        messages = resp.get("Messages", [])
+        with self._held_lock:
+            self._held.update(msg["ReceiptHandle"] for msg in messages)
+        return messages
+
+    @staticmethod
+    def _entries(handles: List[str]) -> List[Dict[str, str]]:
+        return [{"Id": str(n), "ReceiptHandle": h} for n, h in enumerate(handles)]
+
+    def _extend_visibility(self) -> None:
+        """Renew the visibility timeout of every held message."""
+        with self._held_lock:
+            held = sorted(self._held)
+        for i in range(0, len(held), 10):
+            part = held[i:i + 10]
+            try:
+                resp = self.sqs.change_message_visibility_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[{**e, "VisibilityTimeout": self.visibility_secs} for e in self._entries(part)],
+                )
+            except Exception as e:
+                logger.warning("Failed to extend visibility of %d S3 event messages: %s", len(part), e)
+                continue
+            for failure in resp.get("Failed", []):
+                logger.warning("Failed to extend visibility of an S3 event message: %s %s",
+                               failure.get("Code"), failure.get("Message"))
+
+    def _heartbeat(self, done: threading.Event) -> None:
+        while not done.wait(self.visibility_secs / 3):
+            self._extend_visibility()
+
+    def _delete(self, handles: List[str]) -> None:
+        """Delete applied messages, retrying entries SQS reports as failed."""
+        for i in range(0, len(handles), 10):
+            pending = handles[i:i + 10]
+            for attempt in range(1, self.delete_attempts + 1):
+                try:
+                    resp = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=self._entries(pending))
+                except Exception as e:
+                    logger.warning("Deleting %d S3 event messages failed (attempt %d): %s", len(pending), attempt, e)
+                    continue
+                failures = resp.get("Failed", [])
+                if not failures:
+                    break
+                for failure in failures:
+                    logger.warning("Deleting an S3 event message failed (attempt %d): %s %s",
+                                   attempt, failure.get("Code"), failure.get("Message"))
+                pending = [pending[int(failure["Id"])] for failure in failures]
+            else:
+                logger.error("Gave up deleting %d S3 event messages; they will be redelivered", len(pending))
+
+    def collect(self) -> Tuple[Dict[str, str], Dict[str, Set[str]]]:
+        """
+        Long-poll for a burst of messages. Returns the last action seen per
+        key and, per receipt handle, the keys it mentioned.
+        """
+        latest: Dict[str, str] = {}
+        handles: Dict[str, Set[str]] = {}
+        messages = self._receive(self.wait_secs)
+        opened = time.time()
+        while messages:
+            for msg in messages:
+                keys = set()
+                for key, action in parse_s3_event(msg.get("Body", ""), self.ingestor.bucket):
+                    keys.add(key)
+                    latest[key] = action
+                handles[msg["ReceiptHandle"]] = keys
+            if self._stop.is_set() or time.time() - opened >= self.max_batch_secs:
+                break
+            messages = self._receive(int(self.coalesce_secs))
+        return latest, handles
+
+    def _head(self, key: str) -> Optional[Dict[str, Any]]:
+        """Listing-style entry for the object, or None if it no longer exists."""
+        try:
+            return self.ingestor._head(key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def apply(self, latest: Dict[str, str]) -> Tuple[List[Dict[str, Any]], Set[str]]:
+        """Index or remove each key; returns the results and the keys that failed."""
+        results: List[Dict[str, Any]] = []
+        failed: Set[str] = set()
+        start = time.time()
+        with self.ingestor.run_lock:
+            for key in sorted(latest):
+                try:
+                    obj = self._head(key)
+                    if obj is None:
+                        removed = self.ingestor.remove_source(key)
+                        results.append({"file": key, "status": "removed", "deleted": removed})
+                    else:
+                        result = self.ingestor.ingest_file(key, obj=obj, save_state=False)
+                        results.append(result)
+                        if result.get("status") == "failed":
+                            failed.add(key)
+                except Exception as e:
+                    logger.exception("Failed to apply S3 event for %s: %s", key, e)
+                    results.append({"file": key, "status": "failed", "error": str(e)})
+                    failed.add(key)
+            self.ingestor._save_state()
+            if any(r.get("status") in ("added", "updated", "removed") for r in results):
+                try:
+                    self.ingestor.rag.save_snapshot()
+                except Exception as e:
+                    logger.exception("Failed to write index snapshot: %s", e)
+        self.last_summary = self.ingestor._summarize(results, time.time() - start)
+        logger.info(
+            "S3 events: %(added)d added, %(updated)d updated, %(skipped)d skipped, %(removed)d removed, "
+            "%(failed)d failed; %(chunks_embedded)d chunks embedded in %(duration_secs).1fs",
+            self.last_summary,
+        )
+        return results, failed
+
+    def poll_once(self) -> List[Dict[str, Any]]:
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(done,), name="s3-events-visibility", daemon=True)
+        heartbeat.start()
+        try:
+            latest, handles = self.collect()
+            if not handles:
+                return []
+            logger.info("Coalesced %d S3 event messages into %d keys (%d removals)",
+                        len(handles), len(latest), sum(a == REMOVED for a in latest.values()))
+            results, failed = self.apply(latest) if latest else ([], set())
+            self._delete([h for h, keys in handles.items() if not keys & failed])
+            return results
+        finally:
+            done.set()
+            heartbeat.join()
+            with self._held_lock:
+                self._held.clear()
+
+    def run(self) -> None:
+        logger.info("Consuming S3 events from %s", self.queue_url)
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception("S3 event polling failed")
+                self._stop.wait(self.coalesce_secs)
+
+    def start(self) -> "S3EventConsumer":
+        self._thread = threading.Thread(target=self.run, name="s3-events", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import os
+import re
+import hashlib
+import threading
+from typing import Container, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+# Estimated Jaccard similarity (word 3-gram shingles) at which a chunk counts as a near-duplicate.
+INGEST_NEAR_DUP_THRESHOLD = float(os.getenv("INGEST_NEAR_DUP_THRESHOLD", "0.9"))
+# off | skip (near-duplicate chunks are neither embedded nor indexed)
+INGEST_NEAR_DUP_MODE = os.getenv("INGEST_NEAR_DUP_MODE", "skip")
+INGEST_MINHASH_PERMS = int(os.getenv("INGEST_MINHASH_PERMS", "128"))
+
+_WORD_RE = re.compile(r"\w+")
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+SHINGLE = 3
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    words = _WORD_RE.findall(text.lower())
+    grams = [" ".join(words[i:i + SHINGLE]) for i in range(max(1, len(words) - SHINGLE + 1))]
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams],
+        dtype=np.uint64,
+    )
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(bands, rows) whose LSH S-curve (1/b)^(1/r) is closest to the threshold."""
+    best = (num_perm, 1)
+    best_err = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        err = abs((1 / bands) ** (1 / rows) - threshold)
+        if err < best_err:
+            best, best_err = (bands, rows), err
+    return best
+
+
+class NearDupDetector:
+    """
+    MinHash signatures plus banded LSH over chunk text. find() returns an
+    already known chunk whose estimated Jaccard similarity is at least the
+    threshold; candidates from the LSH buckets are verified against their
+    signatures, so the cost per chunk stays flat as the index grows.
+    """
+
+    def __init__(self, threshold: float = INGEST_NEAR_DUP_THRESHOLD, num_perm: int = INGEST_MINHASH_PERMS, seed: int = 1):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(self.bands)]
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = _shingle_hashes(text)
+        # Universal hashing a*h+b mod p (uint64 wraparound is part of the hash), truncated to 32 bits.
+        permuted = ((np.outer(hashes, self._a) + self._b) % _MERSENNE) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def find(
+        self, sig: np.ndarray, exclude: Optional[str] = None, also_exclude: Container[str] = (),
+    ) -> Optional[str]:
+        """Key of a known near-duplicate of sig, or None. Excluded keys never match."""
+        with self._lock:
+            seen: Set[str] = set()
+            for band, key in zip(self._buckets, self._band_keys(sig)):
+                for candidate in band.get(key, ()):
+                    if candidate == exclude or candidate in seen or candidate in also_exclude:
+                        continue
+                    seen.add(candidate)
+                    if float(np.mean(self._signatures[candidate] == sig)) >= self.threshold:
+                        return candidate
+        return None
+
+    def add(self, key: str, sig: np.ndarray) -> None:
+        with self._lock:
+            if key in self._signatures:
+                return
+            self._signatures[key] = sig
+            for band, band_key in zip(self._buckets, self._band_keys(sig)):
+                band.setdefault(band_key, set()).add(key)
+
+    def remove(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                sig = self._signatures.pop(key, None)
+                if sig is None:
+                    continue
+                for band, band_key in zip(self._buckets, self._band_keys(sig)):
+                    members = band.get(band_key)
+                    if members is not None:
+                        members.discard(key)
+                        if not members:
+                            del band[band_key]
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    @staticmethod
+    def encode(sig: np.ndarray) -> bytes:
+        return sig.astype(np.uint32).tobytes()
+
+    @staticmethod
+    def decode(blob: bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=np.uint32)
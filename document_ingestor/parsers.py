@@ -0,0 +1,113 @@
+from __future__ import annotations
+import os
+import codecs
+import zipfile
+import tempfile
+from typing import IO, Iterator, Optional
+from xml.etree.ElementTree import iterparse
+from .logging_utils import logger
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - optional dependency
+    PdfReader = None
+
+# Objects up to this size stay in memory while parsing; larger ones spill to a temp file.
+INGEST_SPOOL_MAX_BYTES = int(os.getenv("INGEST_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+READ_CHUNK = 1024 * 1024
+TEXT_BLOCK = 64 * 1024
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_TEXT_EXTENSIONS = (".txt", ".md", ".csv", ".tsv", ".json", ".html", ".htm", ".xml", ".rst", ".log")
+
+
+def spool_body(body) -> IO[bytes]:
+    """Copy an S3 StreamingBody into a spooled temp file without holding it all in memory."""
+    spool = tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_MAX_BYTES)
+    chunks = body.iter_chunks(READ_CHUNK) if hasattr(body, "iter_chunks") else iter(lambda: body.read(READ_CHUNK), b"")
+    for chunk in chunks:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+def _looks_like_text(sample: bytes) -> bool:
+    if not sample:
+        return False
+    if b"\x00" in sample:
+        return False
+    text = sample.decode("utf-8", errors="replace")
+    bad = sum(1 for ch in text if ch == "�" or (ord(ch) < 32 and ch not in "\n\r\t\f"))
+    return bad / max(1, len(text)) < 0.05
+
+
+def detect_format(fp: IO[bytes], key: str, content_type: Optional[str] = None) -> str:
+    """pdf | docx | text | binary, from magic bytes first, then content type and extension."""
+    head = fp.read(4096)
+    fp.seek(0)
+    lower_key = key.lower()
+    ctype = (content_type or "").lower()
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK") and (lower_key.endswith(".docx") or "wordprocessingml" in ctype):
+        return "docx"
+    if ctype.startswith("text/") or lower_key.endswith(_TEXT_EXTENSIONS) or _looks_like_text(head):
+        return "text" if _looks_like_text(head) else "binary"
+    return "binary"
+
+
+def iter_text(fp: IO[bytes]) -> Iterator[str]:
+    """Decode UTF-8 (BOM tolerated) block by block; split multibyte sequences are carried over."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    while True:
+        raw = fp.read(TEXT_BLOCK)
+        if not raw:
+            break
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_pdf(fp: IO[bytes]) -> Iterator[str]:
+    """One block per page; pages are parsed lazily by pypdf."""
+    if PdfReader is None:
+        logger.warning("pypdf not installed; skipping PDF")
+        return
+    reader = PdfReader(fp)
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if text.strip():
+            yield text + "\n\n"
+
+
+def iter_docx(fp: IO[bytes]) -> Iterator[str]:
+    """Paragraph text streamed from word/document.xml without building the full DOM."""
+    with zipfile.ZipFile(fp) as zf, zf.open("word/document.xml") as xml:
+        parts = []
+        for event, elem in iterparse(xml, events=("end",)):
+            if elem.tag == f"{_W}t" and elem.text:
+                parts.append(elem.text)
+            elif elem.tag == f"{_W}tab":
+                parts.append("\t")
+            elif elem.tag == f"{_W}p":
+                if parts:
+                    # Blank-line separated, like PDF pages, so the splitter can cut at paragraphs.
+                    yield "".join(parts) + "\n\n"
+                parts = []
+                elem.clear()
+
+
+def iter_document(fp: IO[bytes], key: str, content_type: Optional[str] = None) -> Iterator[str]:
+    """Text blocks of a document; nothing for binaries without extractable text."""
+    fmt = detect_format(fp, key, content_type)
+    if fmt == "pdf":
+        return iter_pdf(fp)
+    if fmt == "docx":
+        return iter_docx(fp)
+    if fmt == "text":
+        return iter_text(fp)
+    logger.info("Skipping binary object %s (%s)", key, content_type or "unknown type")
+    return iter(())
@@ -0,0 +1,175 @@
+from __future__ import annotations
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+from .logging_utils import logger
+from .parsers import iter_document
+
+if TYPE_CHECKING:
+    from .s3_ingestor import S3DocumentIngestor
+
+INGEST_DOWNLOAD_WORKERS = int(os.getenv("INGEST_DOWNLOAD_WORKERS", "8"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "16"))
+# Write ingest_state.json after this many finished files or seconds, whichever comes first.
+INGEST_CHECKPOINT_FILES = int(os.getenv("INGEST_CHECKPOINT_FILES", "50"))
+INGEST_CHECKPOINT_SECS = float(os.getenv("INGEST_CHECKPOINT_SECS", "30"))
+
+_DONE = object()
+
+
+class IngestPipeline:
+    """
+    Concurrent ingestion of a bucket listing:
+
+      downloads (thread pool) -> parse + chunk -> embedders -> single writer
+
+    Stages are joined by bounded queues, so a slow stage holds back the ones
+    before it instead of buffering whole documents in memory. Only the writer
+    touches the vector store and ingest state.
+    """
+
+    def __init__(
+        self,
+        ingestor: "S3DocumentIngestor",
+        download_workers: int = INGEST_DOWNLOAD_WORKERS,
+        embed_workers: int = INGEST_EMBED_WORKERS,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        checkpoint_files: int = INGEST_CHECKPOINT_FILES,
+        checkpoint_secs: float = INGEST_CHECKPOINT_SECS,
+    ):
+        self.ingestor = ingestor
+        self.download_workers = max(1, download_workers)
+        self.embed_workers = max(1, embed_workers)
+        self.checkpoint_files = max(1, checkpoint_files)
+        self.checkpoint_secs = checkpoint_secs
+        self.downloaded: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.to_embed: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.to_write: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.results: List[Dict[str, Any]] = []
+        self._results_lock = threading.Lock()
+
+    def _add_result(self, result: Dict[str, Any]) -> None:
+        with self._results_lock:
+            self.results.append(result)
+
+    # ---------------- Stages ----------------
+    def _download(self, obj: Dict[str, Any]) -> None:
+        key = obj["Key"]
+        try:
+            if self.ingestor.is_unchanged(key, obj):
+                self._add_result({"file": key, "status": "skipped", "indexed": 0})
+                return
+            spool, content_type = self.ingestor._download_s3_object(key)
+            self.downloaded.put((obj, spool, content_type))
+        except Exception as e:
+            logger.exception("Failed to download %s: %s", key, e)
+            self._add_result({"file": key, "status": "failed", "error": str(e)})
+
+    def _chunker(self) -> None:
+        while True:
+            item = self.downloaded.get()
+            if item is _DONE:
+                break
+            obj, spool, content_type = item
+            key = obj["Key"]
+            plan = self.ingestor.plan_file(key, obj)
+            try:
+                with spool:
+                    # Batches are queued as the document is parsed, so it is never held whole.
+                    for batch in self.ingestor.iter_batches(plan, iter_document(spool, key, content_type)):
+                        self.to_embed.put((plan, batch))
+            except Exception as e:
+                logger.exception("Failed to chunk %s: %s", key, e)
+                plan.errors += 1
+                plan.planned = True
+            # End of the plan; the writer finishes the file once this and all its batches are through.
+            self.to_embed.put((plan, None))
+        for _ in range(self.embed_workers):
+            self.to_embed.put(_DONE)
+
+    def _embedder(self) -> None:
+        while True:
+            item = self.to_embed.get()
+            if item is _DONE:
+                self.to_write.put(_DONE)
+                break
+            plan, batch = item
+            if batch is None:
+                self.to_write.put((plan, None, None, 0))
+                continue
+            try:
+                vectors, n_embedded = self.ingestor._vectors_for(batch)
+                self.to_write.put((plan, batch, vectors, n_embedded))
+            except Exception as e:
+                logger.exception("Embedding failed for a batch of %s: %s", plan.key, e)
+                self.to_write.put((plan, batch, None, 0))
+
+    def _writer(self) -> None:
+        finished = 0
+        last_checkpoint = time.time()
+        remaining = self.embed_workers
+        while remaining:
+            item = self.to_write.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            plan, batch, vectors, n_embedded = item
+            if batch is not None:
+                plan.written += 1
+                if vectors is None:
+                    plan.errors += 1
+                else:
+                    try:
+                        self.ingestor.write_batch(plan, batch, vectors)
+                        plan.embedded += n_embedded
+                    except Exception as e:
+                        plan.errors += 1
+                        logger.exception("Batch indexing failed for %s: %s", plan.key, e)
+            if plan.finished or not plan.complete:
+                continue
+            plan.finished = True
+            try:
+                self._add_result(self.ingestor.finish_file(plan))
+            except Exception as e:
+                logger.exception("Failed to finish %s: %s", plan.key, e)
+                self._add_result({"file": plan.key, "status": "failed", "error": str(e)})
+            finished += 1
+            if finished % self.checkpoint_files == 0 or time.time() - last_checkpoint >= self.checkpoint_secs:
+                self.ingestor._save_state()
+                last_checkpoint = time.time()
+        self.ingestor._save_state()
+
+    # ---------------- Run ----------------
+    def _run_stage(self, stage: Callable[[], None]) -> None:
+        """Run a stage, then close the cache connection its thread opened; threads are new every sweep."""
+        try:
+            stage()
+        finally:
+            if self.ingestor.cache:
+                self.ingestor.cache.close_thread_connection()
+
+    def run(self, objects: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        start = time.time()
+        stages = [("ingest-chunker", self._chunker)]
+        stages += [(f"ingest-embed-{i}", self._embedder) for i in range(self.embed_workers)]
+        stages.append(("ingest-writer", self._writer))
+        threads = [
+            threading.Thread(target=self._run_stage, args=(stage,), name=name, daemon=True)
+            for name, stage in stages
+        ]
+        for t in threads:
+            t.start()
+
+        # Downloaders block on the bounded queue, which throttles the pool.
+        with ThreadPoolExecutor(max_workers=self.download_workers, thread_name_prefix="ingest-dl") as pool:
+            list(pool.map(self._download, objects))
+        self.downloaded.put(_DONE)
+        for t in threads:
+            t.join()
+
+        logger.info("Pipelined ingest of %d objects finished in %.2fs", len(objects), time.time() - start)
+        return self.results
@@ -1,13 +1,62 @@
 from __future__ import annotations
+import os
 import json
 import time
+import threading
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, Iterable, List, Tuple
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import boto3
-from .splitters import SimpleSplitter, SplitOptions
+from .splitters import INGEST_CHUNK_OVERLAP_TOKENS, INGEST_CHUNK_TOKENS, SplitOptions, TokenSplitter
 from .sqlite_cache import SQLiteEmbedCache
 from .logging_utils import logger
 from .utils import _sha256_text
+from .parsers import iter_document, spool_body
+from .pipeline import IngestPipeline
+from .near_dup import INGEST_NEAR_DUP_MODE, INGEST_NEAR_DUP_THRESHOLD, NearDupDetector
+
+# Run ingest_bucket through the concurrent download/chunk/embed/write pipeline.
+INGEST_PIPELINED = os.getenv("INGEST_PIPELINED", "true").lower() in ("1", "true", "yes")
+
+
+@dataclass
+class FilePlan:
+    """
+    Work for one changed object, carried through the ingestion stages.
+    Chunks stream through iter_batches; the plan only keeps their hashes.
+    """
+    key: str
+    obj: Dict[str, Any]
+    prev: Dict[str, Any]
+    # Chunk hashes of the previous version, or None if they cannot be diffed (replace the source).
+    old_hashes: Optional[Set[str]]
+    # Every chunk hash the previous version held; an edited chunk must not match its own old text.
+    own_hashes: Set[str]
+    replace: bool
+    started: float
+    chunk_hashes: List[str] = field(default_factory=list)
+    stale: List[str] = field(default_factory=list)
+    total_batches: int = 0
+    # Set once no more batches will come (total_batches is then final).
+    planned: bool = False
+    finished: bool = False
+    ids: List[int] = field(default_factory=list)
+    embedded: int = 0
+    errors: int = 0
+    written: int = 0
+    # Near-duplicate chunk hash -> hash of the indexed chunk it was skipped in favour of.
+    near_dups: Dict[str, str] = field(default_factory=dict)
+    # MinHash signatures of new chunks not yet written to the cache.
+    signatures: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def empty(self) -> bool:
+        return self.planned and not self.errors and not self.chunk_hashes and not self.near_dups
+
+    @property
+    def complete(self) -> bool:
+        """Fully planned, with every batch written (or failed)."""
+        return self.planned and self.written >= self.total_batches
 
 
 class S3DocumentIngestor:
@@ -19,23 +68,34 @@ class S3DocumentIngestor:
         self,
         rag_runner,
         bucket: str,
-        chunk_size: int = 1000,
-        chunk_overlap: int = 150,
+        chunk_size: int = INGEST_CHUNK_TOKENS,
+        chunk_overlap: int = INGEST_CHUNK_OVERLAP_TOKENS,
         batch_size: int = 32,
         enable_cache: bool = True,
         reembed_on_change: bool = False,
         work_dir: str = ".rag_ingest",
+        pipelined: bool = INGEST_PIPELINED,
+        near_dup_mode: str = INGEST_NEAR_DUP_MODE,
+        near_dup_threshold: float = INGEST_NEAR_DUP_THRESHOLD,
     ):
         self.rag = rag_runner
         self.bucket = bucket
         self.s3 = boto3.client("s3")
-        self.splitter = SimpleSplitter(SplitOptions(chunk_size, chunk_overlap))
+        self.splitter = TokenSplitter(SplitOptions(chunk_size, chunk_overlap))
         self.batch_size = batch_size
         self.enable_cache = enable_cache
         self.reembed_on_change = reembed_on_change
         self.work_dir = work_dir
+        self.pipelined = pipelined
         self.cache = SQLiteEmbedCache(f"{work_dir}/embed_cache.sqlite") if enable_cache else None
+        if near_dup_mode not in ("off", "skip"):
+            raise ValueError(f"Unsupported near-duplicate mode {near_dup_mode!r}")
+        self.near_dups = NearDupDetector(near_dup_threshold) if near_dup_mode == "skip" else None
+        self._load_signatures()
         self.state_path = f"{work_dir}/ingest_state.json"
+        self.last_summary: Dict[str, Any] = {}
+        # Single-flight guard: bucket sweeps and S3 event batches never run concurrently.
+        self.run_lock = threading.RLock()
         self._load_state()
 
     def _load_state(self):
@@ -45,9 +105,38 @@ class S3DocumentIngestor:
         except Exception:
             self.state = {}
 
+    def _load_signatures(self) -> None:
+        """Seed the near-duplicate detector with signatures of chunks indexed on earlier runs."""
+        if self.near_dups is None or not self.cache:
+            return
+        for rows in self.cache.iter_signatures():
+            for key, blob in rows:
+                self.near_dups.add(key, NearDupDetector.decode(blob))
+        logger.info("Loaded %d near-duplicate signatures", len(self.near_dups))
+
+    def _release(self, hashes: Iterable[str]) -> None:
+        """
+        Forget removed chunks in the near-duplicate detector. Objects whose
+        chunks were skipped in favour of them lose their fingerprint, so the
+        next sweep re-plans them and embeds what is no longer covered.
+        """
+        if self.near_dups is None:
+            return
+        hashes = set(hashes)
+        # A hash another object still holds stays known.
+        for entry in self.state.values():
+            hashes.difference_update(entry.get("chunks", ()))
+        self.near_dups.remove(hashes)
+        for key, entry in self.state.items():
+            if hashes & set((entry.get("near_dups") or {}).values()):
+                entry.pop("etag", None)
+                logger.info("Near-duplicate source removed; %s will be re-planned on the next sweep", key)
+
     def _save_state(self):
-        with open(self.state_path, "w", encoding="utf-8") as f:
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
 
     # ---------------- S3 helpers ----------------
     def _list_s3_objects(self) -> List[Dict[str, Any]]:
@@ -58,82 +147,325 @@ class S3DocumentIngestor:
             objects.extend(page.get("Contents", []))
         return objects
 
-    def _read_s3_object(self, key: str) -> str:
+    def _download_s3_object(self, key: str) -> Tuple[IO[bytes], Optional[str]]:
+        """Stream an object into a spooled temp file; returns (file, content type)."""
         obj = self.s3.get_object(Bucket=self.bucket, Key=key)
-        raw = obj["Body"].read()
         try:
-            return raw.decode("utf-8", errors="ignore")
-        except Exception:
-            logger.warning("Failed to decode %s as UTF-8", key)
-            return ""
+            return spool_body(obj["Body"]), obj.get("ContentType")
+        finally:
+            obj["Body"].close()
 
     # ---------------- Chunking & caching ----------------
-    def _make_chunk_meta(self, source: str, chunk_index: int, orig_len: int) -> Dict[str, Any]:
+    def _make_chunk_meta(self, source: str, chunk_index: int, orig_len: int, content_hash: str) -> Dict[str, Any]:
         return {
             "source": source,
             "chunk_index": chunk_index,
             "orig_len": orig_len,
+            "content_hash": content_hash,
             "ingested_at": datetime.utcnow().isoformat(),
         }
 
-    def _prepare_docs_for_index(self, chunks: List[str], source: str) -> List[Tuple[str, Dict[str, Any], str]]:
-        docs: List[Tuple[str, Dict[str, Any], str]] = []
-        for i, c in enumerate(chunks):
-            h = _sha256_text(c)
-            meta = self._make_chunk_meta(source, i, len(c))
-            docs.append((c, meta, h))
-        return docs
-
-    def _chunk_and_batch(self, text: str, source: str) -> Iterable[List[Tuple[str, Dict[str, Any]]]]:
-        chunks = self.splitter.split_text(text)
-        docs_with_hash = self._prepare_docs_for_index(chunks, source)
+    def _vectors_for(self, batch: List[Tuple[str, Dict[str, Any]]]) -> Tuple[List[List[float]], int]:
+        """Vectors for a batch, reusing cached embeddings; returns (vectors, number embedded)."""
+        hashes = [meta["content_hash"] for _, meta in batch]
+        cached = self.cache.get_vectors(hashes) if self.cache and not self.reembed_on_change else {}
+        missing = [i for i, h in enumerate(hashes) if h not in cached]
+        embedded = self.rag.embed_client.embed_many([batch[i][0] for i in missing]) if missing else []
+        vectors = [cached.get(h) for h in hashes]
+        for i, vec in zip(missing, embedded):
+            vectors[i] = vec
+        return vectors, len(missing)  # type: ignore[return-value]
+
+    # ---------------- Change detection ----------------
+    @staticmethod
+    def _fingerprint(obj: Dict[str, Any]) -> Dict[str, Any]:
+        """Identity of an S3 object version, from a list_objects_v2 entry."""
+        modified = obj.get("LastModified")
+        return {
+            "etag": obj.get("ETag"),
+            "size": obj.get("Size"),
+            "last_modified": modified.isoformat() if hasattr(modified, "isoformat") else modified,
+        }
+
+    def _head(self, key: str) -> Dict[str, Any]:
+        head = self.s3.head_object(Bucket=self.bucket, Key=key)
+        return {"Key": key, "ETag": head.get("ETag"), "Size": head.get("ContentLength"),
+                "LastModified": head.get("LastModified")}
+
+    def is_unchanged(self, key: str, obj: Dict[str, Any]) -> bool:
+        prev = self.state.get(key)
+        if not prev or "etag" not in prev:
+            return False
+        return all(prev.get(k) == v for k, v in self._fingerprint(obj).items())
+
+    def remove_source(self, key: str) -> int:
+        """Drop a deleted object's chunks from the index, cache and state."""
+        removed = self.rag.delete_source(key)
+        if self.cache:
+            self.cache.delete_by_source(key)
+        entry = self.state.pop(key, None) or {}
+        self._release(entry.get("chunks", []))
+        return removed
+
+    # ---------------- Restore ----------------
+    def restore_index_from_cache(self, batch_size: int = 1000) -> int:
+        """
+        Rebuild an in-memory vector store from vectors persisted in the embed
+        cache, so cached chunks are searchable after a restart without any
+        Bedrock calls. Persistent stores (pgvector) are left untouched.
+
+        The lexical index is first built from whatever the store already
+        holds (a loaded snapshot, pgvector rows); restored chunks are then
+        added to it as they are indexed.
+        """
+        self.rag.build_lexical_index()
+        if not self.cache or getattr(self.rag.store, "persistent", False):
+            return 0
+        start = time.time()
+        restored = 0
+        dim = self.rag.config.embed_dim
+        # A loaded snapshot already holds most chunks; only add what it lacks.
+        known = self.rag.store.content_hashes()
+        for rows in self.cache.iter_vectors(batch_size):
+            docs: List[Tuple[str, Dict[str, Any]]] = []
+            vectors: List[List[float]] = []
+            for key, content, meta, vec in rows:
+                if len(vec) != dim or key in known:
+                    continue
+                meta.pop("indexed_id", None)
+                docs.append((content, meta))
+                vectors.append(vec)
+            restored += len(self.rag.index_vectors(docs, vectors))
+        logger.info("Restored %d cached vectors into the index in %.2fs", restored, time.time() - start)
+        if restored:
+            self.rag.save_snapshot()
+        return restored
+
+    # ---------------- Main ingestion ----------------
+    def plan_file(self, key: str, obj: Dict[str, Any], force: bool = False) -> FilePlan:
+        """Start planning a changed object; its chunks are then streamed through iter_batches."""
+        prev = self.state.get(key) or {}
+        # Without a chunk list from a previous run we cannot diff; replace the source.
+        old_hashes: Optional[Set[str]] = set(prev["chunks"]) if "chunks" in prev and not force else None
+        return FilePlan(
+            key=key,
+            obj=obj,
+            prev=prev,
+            old_hashes=old_hashes,
+            own_hashes=set(prev.get("chunks", ())),
+            replace=old_hashes is None and bool(prev),
+            started=time.time(),
+        )
+
+    def iter_batches(self, plan: FilePlan, blocks: Iterable[str]) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Chunk a downloaded object, given as a stream of text blocks, and yield
+        batches of chunks that need indexing, as they fill up. Only chunk
+        hashes are kept; once exhausted, plan.stale and plan.total_batches
+        are final.
+        """
+        if isinstance(blocks, str):
+            blocks = [blocks]
+        seen: Set[str] = set()
         batch: List[Tuple[str, Dict[str, Any]]] = []
-        for chunk_text, meta, h in docs_with_hash:
-            existing = self.cache.get(h) if self.cache else None
-            if existing and not self.reembed_on_change:
+        for i, chunk_text in enumerate(self.splitter.split_blocks(blocks)):
+            h = _sha256_text(chunk_text)
+            # A chunk repeated within the document (a boilerplate footer) is indexed once.
+            if h in seen or self._is_near_dup(plan, chunk_text, h):
                 continue
-            batch.append((chunk_text, meta))
+            seen.add(h)
+            plan.chunk_hashes.append(h)
+            if plan.old_hashes and h in plan.old_hashes:
+                continue
+            batch.append((chunk_text, self._make_chunk_meta(plan.key, i, len(chunk_text), h)))
             if len(batch) >= self.batch_size:
+                plan.total_batches += 1
                 yield batch
                 batch = []
         if batch:
+            plan.total_batches += 1
             yield batch
+        plan.stale = sorted((plan.old_hashes or set()) - seen)
+        plan.planned = True
 
-    # ---------------- Main ingestion ----------------
-    def ingest_file(self, key: str, force: bool = False) -> Dict[str, Any]:
-        start = time.time()
-        text = self._read_s3_object(key)
-        if not text.strip():
-            logger.warning("Empty or unreadable file: %s", key)
-            return {"skipped": True, "file": key}
-
-        total_indexed = 0
-        indexed_ids: List[int] = []
-        for batch in self._chunk_and_batch(text, key):
-            try:
-                ids = self.rag.index_documents(batch)
-                for (chunk_text, meta), idx in zip(batch, ids):
-                    h = _sha256_text(chunk_text)
-                    if self.cache:
-                        self.cache.set(h, key, key, meta["chunk_index"], {"indexed_id": idx})
-                indexed_ids.extend(ids)
-                total_indexed += len(ids)
-                logger.info("Indexed %s chunks from %s (batch size=%d)", len(ids), key, len(batch))
-            except Exception as e:
-                logger.exception("Batch indexing failed for %s: %s", key, e)
+    def _is_near_dup(self, plan: FilePlan, chunk_text: str, h: str) -> bool:
+        """
+        True if a new chunk is a near-duplicate of a known chunk (recorded in
+        plan.near_dups). Other new chunks get their signature registered, so
+        later chunks in this run can match them.
+        """
+        if h in plan.near_dups:
+            return True
+        if self.near_dups is None or (plan.old_hashes and h in plan.old_hashes):
+            return False
+        sig = self.near_dups.signature(chunk_text)
+        # The old version's chunks are still registered until finish_file removes them as stale.
+        match = self.near_dups.find(sig, exclude=h, also_exclude=plan.own_hashes)
+        if match is not None:
+            plan.near_dups[h] = match
+            return True
+        self.near_dups.add(h, sig)
+        plan.signatures[h] = NearDupDetector.encode(sig)
+        return False
 
-        self.state[key] = {"indexed_at": datetime.utcnow().isoformat(), "file": key}
-        self._save_state()
-        dur = time.time() - start
-        return {"file": key, "indexed": total_indexed, "ids": indexed_ids, "duration_secs": dur}
+    def write_batch(self, plan: FilePlan, batch: List[Tuple[str, Dict[str, Any]]], vectors: List[List[float]]) -> None:
+        """Index one embedded batch and cache its vectors."""
+        if plan.replace:
+            self.rag.delete_source(plan.key)
+            plan.replace = False
+        ids = self.rag.index_vectors(batch, vectors)
+        hashes = [meta["content_hash"] for _, meta in batch]
+        if self.cache:
+            self.cache.set_many(
+                (meta["content_hash"], plan.key, plan.key, meta["chunk_index"], {**meta, "indexed_id": idx}, vec, chunk_text)
+                for (chunk_text, meta), idx, vec in zip(batch, ids, vectors)
+            )
+            self.cache.set_signatures({h: plan.signatures[h] for h in hashes if h in plan.signatures})
+        # Written signatures are in the cache; what is left belongs to chunks not yet indexed.
+        for h in hashes:
+            plan.signatures.pop(h, None)
+        plan.ids.extend(ids)
+        logger.info("Indexed %s chunks from %s (batch size=%d)", len(ids), plan.key, len(batch))
+
+    def finish_file(self, plan: FilePlan) -> Dict[str, Any]:
+        """
+        Remove stale chunks and record the object's fingerprint. If any batch
+        failed the state is left as it was, so the next run retries the object.
+        An object that yields no text loses its old chunks and is recorded as
+        empty, so it is not downloaded again until it changes.
+        """
+        if plan.empty:
+            logger.warning("Empty or unreadable file: %s", plan.key)
+            deleted = self.remove_source(plan.key) if plan.prev else 0
+            self.state[plan.key] = {
+                "indexed_at": datetime.utcnow().isoformat(),
+                "file": plan.key,
+                **self._fingerprint(plan.obj),
+                "chunks": [],
+            }
+            return {"file": plan.key, "status": "skipped", "empty": True, "indexed": 0, "deleted": deleted,
+                    "duration_secs": time.time() - plan.started}
+
+        result = {
+            "file": plan.key,
+            "status": "updated" if plan.prev else "added",
+            "indexed": len(plan.ids),
+            "embedded": plan.embedded,
+            "deleted": 0,
+            "near_dups": len(plan.near_dups),
+            "ids": plan.ids,
+        }
+        if plan.errors:
+            result["status"] = "failed"
+            # Chunks that never made it into the index cannot stand in for others.
+            if self.near_dups is not None:
+                self.near_dups.remove(set(plan.signatures))
+        else:
+            if plan.replace:
+                self.rag.delete_source(plan.key)
+            result["deleted"] = self.rag.delete_chunks(plan.key, plan.stale) if plan.stale else 0
+            if plan.stale and self.cache:
+                self.cache.delete_chunks(plan.key, plan.stale)
+            self.state[plan.key] = {
+                "indexed_at": datetime.utcnow().isoformat(),
+                "file": plan.key,
+                **self._fingerprint(plan.obj),
+                "chunks": plan.chunk_hashes,
+            }
+            if plan.near_dups:
+                self.state[plan.key]["near_dups"] = plan.near_dups
+            if plan.stale:
+                self._release(plan.stale)
+        result["duration_secs"] = time.time() - plan.started
+        return result
+
+    def ingest_file(
+        self,
+        key: str,
+        force: bool = False,
+        obj: Optional[Dict[str, Any]] = None,
+        save_state: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Index one object. Unchanged objects (same ETag, size and LastModified
+        as last run) are skipped without downloading; for changed ones only
+        new chunk hashes are embedded and chunks no longer present are removed.
+        """
+        obj = obj or self._head(key)
+        if not force and self.is_unchanged(key, obj):
+            return {"file": key, "status": "skipped", "indexed": 0}
+
+        plan = self.plan_file(key, obj, force=force)
+        spool, content_type = self._download_s3_object(key)
+        try:
+            with spool:
+                for batch in self.iter_batches(plan, iter_document(spool, key, content_type)):
+                    try:
+                        vectors, n_embedded = self._vectors_for(batch)
+                        self.write_batch(plan, batch, vectors)
+                        plan.embedded += n_embedded
+                    except Exception as e:
+                        plan.errors += 1
+                        logger.exception("Batch indexing failed for %s: %s", key, e)
+        except Exception as e:
+            plan.errors += 1
+            plan.planned = True
+            logger.exception("Failed to parse %s: %s", key, e)
+        result = self.finish_file(plan)
+        if save_state:
+            self._save_state()
+        return result
 
     def ingest_bucket(self) -> List[Dict[str, Any]]:
-        results = []
-        for obj in self._list_s3_objects():
-            key = obj["Key"]
+        with self.run_lock:
+            return self._ingest_bucket()
+
+    def _ingest_bucket(self) -> List[Dict[str, Any]]:
+        start = time.time()
+        objects = self._list_s3_objects()
+        if self.pipelined:
+            results = IngestPipeline(self).run(objects)
+        else:
+            results = []
+            for obj in objects:
+                key = obj["Key"]
+                try:
+                    results.append(self.ingest_file(key, obj=obj))
+                except Exception as e:
+                    logger.exception("Failed to ingest %s: %s", key, e)
+                    results.append({"file": key, "status": "failed", "error": str(e)})
+
+        listed = {obj["Key"] for obj in objects}
+        for key in [k for k in self.state if k not in listed]:
             try:
-                res = self.ingest_file(key)
-                results.append(res)
+                removed = self.remove_source(key)
+                results.append({"file": key, "status": "removed", "deleted": removed})
             except Exception as e:
-                logger.exception("Failed to ingest %s: %s", key, e)
+                logger.exception("Failed to remove %s: %s", key, e)
+        self._save_state()
+
+        try:
+            self.rag.save_snapshot()
+        except Exception as e:
+            logger.exception("Failed to write index snapshot: %s", e)
+
+        self.last_summary = self._summarize(results, time.time() - start)
+        logger.info(
+            "Reindex summary: %(added)d added, %(updated)d updated, %(skipped)d skipped, %(removed)d removed, "
+            "%(failed)d failed; %(chunks_embedded)d chunks embedded, %(chunks_deleted)d deleted, "
+            "%(near_dups_skipped)d near-duplicates skipped (embedding calls saved) in %(duration_secs).1fs",
+            self.last_summary,
+        )
         return results
+
+    @staticmethod
+    def _summarize(results: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {s: 0 for s in ("added", "updated", "skipped", "removed", "failed")}
+        for r in results:
+            summary[r.get("status", "failed")] = summary.get(r.get("status", "failed"), 0) + 1
+        summary["chunks_embedded"] = sum(r.get("embedded", 0) for r in results)
+        summary["chunks_deleted"] = sum(r.get("deleted", 0) for r in results)
+        # Each skipped near-duplicate is one embedding call (and one index entry) saved.
+        summary["near_dups_skipped"] = sum(r.get("near_dups", 0) for r in results)
+        summary["duration_secs"] = duration
+        return summary
@@ -1,7 +1,9 @@
 from __future__ import annotations
-from typing import Optional
+import time
+from typing import Dict, Optional
 from .logging_utils import logger
 from .s3_ingestor import S3DocumentIngestor
+from .events import INGEST_EVENTS_QUEUE_URL, S3EventConsumer
 
 # Scheduler optional (APScheduler)
 try:
@@ -11,15 +13,30 @@ except Exception:
     BackgroundScheduler = None
     APSCHED_AVAILABLE = False
 
-def preload_knowledge_base(rag_runner, bucket: str, **ingest_opts):
+def preload_knowledge_base(rag_runner, bucket: str, timings: Optional[Dict[str, float]] = None, **ingest_opts):
     """
-    Preload all documents from an S3 bucket into the RAG index.
+    Preload all documents from an S3 bucket into the RAG index, after
+    restoring previously embedded chunks from the local cache. Phase
+    durations in seconds are recorded in timings when given.
     """
+    timings = timings if timings is not None else {}
+    start = time.time()
     ingestor = S3DocumentIngestor(rag_runner, bucket=bucket, **ingest_opts)
+    ingestor.restore_index_from_cache()
+    timings["restore_cache"] = time.time() - start
+
+    start = time.time()
     results = ingestor.ingest_bucket()
-    logger.info("Preloaded S3 knowledge base: %s", results)
+    timings["ingest_bucket"] = time.time() - start
+    logger.info("Preloaded S3 knowledge base: %s", ingestor.last_summary or results)
     return ingestor
 
+def start_event_consumer(ingestor, queue_url: Optional[str] = None, **opts) -> S3EventConsumer:
+    """Apply S3 object notifications from SQS to the index on a background thread."""
+    consumer = S3EventConsumer(ingestor, queue_url=queue_url or INGEST_EVENTS_QUEUE_URL, **opts)
+    return consumer.start()
+
+
 def schedule_periodic_reindex(ingestor, interval_minutes: Optional[int] = None):
     if not APSCHED_AVAILABLE or BackgroundScheduler is None:
         logger.warning("APScheduler not installed; skipping scheduled reindex")
@@ -35,7 +52,8 @@ def schedule_periodic_reindex(ingestor, interval_minutes: Optional[int] = None):
             logger.exception("Scheduled reindex failed")
 
     if interval_minutes is not None:
-        scheduler.add_job(job, "interval", minutes=interval_minutes, id="reindex_s3")
+        # A run still going when the next is due is not doubled up; missed runs collapse into one.
+        scheduler.add_job(job, "interval", minutes=interval_minutes, id="reindex_s3", max_instances=1, coalesce=True)
     else:
         raise ValueError("interval_minutes must be provided")
 
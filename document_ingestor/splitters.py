@@ -1,50 +1,183 @@
 from __future__ import annotations
+import os
+import re
 from dataclasses import dataclass
-from typing import List
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+# Chunk sizes are in approximate model tokens, not characters.
+INGEST_CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "256"))
+INGEST_CHUNK_OVERLAP_TOKENS = int(os.getenv("INGEST_CHUNK_OVERLAP_TOKENS", "32"))
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# Unit boundaries: paragraph breaks, line breaks, and whitespace after sentence punctuation.
+_BOUNDARY_RE = re.compile(r"\n[ \t]*\n\s*|\n|(?<=[.!?;])\s+")
+_PARA_END_RE = re.compile(r"\n[ \t]*\n\s*$")
+_WORD_RE = re.compile(r"\S+\s*")
+_CHARS_PER_TOKEN = 4
+
+
+def approx_tokens(text: str) -> int:
+    """
+    Cheap BPE-style estimate: one per punctuation mark and short word, one
+    per four characters of longer words. Additive over whitespace splits.
+    """
+    return sum(max(1, len(t) // _CHARS_PER_TOKEN) for t in _TOKEN_RE.findall(text))
 
 
 @dataclass
 class SplitOptions:
-    chunk_size: int = 1000
-    chunk_overlap: int = 150
-    length_function = len
+    chunk_size: int = INGEST_CHUNK_TOKENS
+    chunk_overlap: int = INGEST_CHUNK_OVERLAP_TOKENS
+    length_function: Callable[[str], int] = approx_tokens
 
 
-class SimpleSplitter:
+# (text, tokens, ends a paragraph)
+_Unit = Tuple[str, int, bool]
+
+
+class TokenSplitter:
+    """
+    Streaming splitter. Text blocks (pages, paragraphs, decoded reads) are
+    cut into sentence/line units, which are packed into chunks of at most
+    chunk_size tokens; each chunk starts with up to chunk_overlap tokens
+    from the end of the previous one. Chunks end at a paragraph break when
+    one falls in their second half, otherwise at a sentence or line break;
+    only units longer than a chunk are cut between words. Runs in linear
+    time and buffers roughly one chunk plus one unit.
+    """
+
     def __init__(self, opts: SplitOptions):
+        if opts.chunk_size <= 0:
+            raise ValueError("chunk_size must be > 0")
+        if not 0 <= opts.chunk_overlap < opts.chunk_size:
+            raise ValueError("chunk_overlap must be >= 0 and < chunk_size")
         self.opts = opts
+        self.length = opts.length_function
+        # Text without any boundary is force-cut once the buffer holds a few chunks' worth.
+        self.max_pending = opts.chunk_size * _CHARS_PER_TOKEN * 4
 
     def split_text(self, text: str) -> List[str]:
+        return list(self.split_blocks([text]))
+
+    def split_blocks(self, blocks: Iterable[str]) -> Iterator[str]:
         size = self.opts.chunk_size
-        overlap = self.opts.chunk_overlap
-        if size <= 0:
-            raise ValueError("chunk_size must be > 0")
+        current: List[_Unit] = []
+        tokens = 0
+        has_new = False  # current holds more than the overlap carried from the last chunk
+        for unit in self._units(blocks):
+            if has_new and tokens + unit[1] > size:
+                cut = self._cut_point(current, tokens, size - unit[1])
+                emitted, rest = current[:cut], current[cut:]
+                yield self._join(emitted)
+                current = self._overlap(emitted) + rest
+                tokens = sum(u[1] for u in current)
+                has_new = bool(rest)
+            # Overlap yields to new text when both do not fit; it is always at the front.
+            while current and tokens + unit[1] > size:
+                tokens -= current.pop(0)[1]
+            current.append(unit)
+            tokens += unit[1]
+            has_new = True
+        if has_new:
+            yield self._join(current)
+
+    # ---------------- Units ----------------
+    def _units(self, blocks: Iterable[str]) -> Iterator[_Unit]:
+        pending = ""
+        carry_cr = False
+        for block in blocks:
+            if carry_cr:
+                block = "\r" + block
+            # Hold back a trailing CR so a CRLF split across blocks stays one newline.
+            carry_cr = block.endswith("\r")
+            if carry_cr:
+                block = block[:-1]
+            pending += block.replace("\r\n", "\n").replace("\r", "\n")
+            start = 0
+            for m in _BOUNDARY_RE.finditer(pending):
+                # A boundary at the very end may continue into the next block.
+                if m.end() == len(pending):
+                    break
+                yield from self._sized(pending[start:m.end()])
+                start = m.end()
+            pending = pending[start:]
+            if len(pending) > self.max_pending:
+                split_at = pending.rfind(" ", 0, self.max_pending) + 1 or self.max_pending
+                yield from self._sized(pending[:split_at])
+                pending = pending[split_at:]
+        if carry_cr:
+            pending += "\n"
+        if pending.strip():
+            yield from self._sized(pending)
+
+    def _sized(self, text: str) -> Iterator[_Unit]:
+        """Units of at most chunk_size tokens; oversized ones are cut between words."""
+        if not text.strip():
+            return
+        para = bool(_PARA_END_RE.search(text))
+        n = self.length(text)
+        if n <= self.opts.chunk_size:
+            yield text, n, para
+            return
+        piece, piece_tokens = "", 0
+        for word in self._words(text):
+            t = self.length(word)
+            if piece and piece_tokens + t > self.opts.chunk_size:
+                yield piece, piece_tokens, False
+                piece, piece_tokens = "", 0
+            piece += word
+            piece_tokens += t
+        if piece.strip():
+            yield piece, piece_tokens, para
 
-        text = text.replace("\r\n", "\n").replace("\r", "\n")
-        if len(text) <= size:
-            return [text]
-
-        chunks: List[str] = []
-        start = 0
-        text_len = len(text)
-        while start < text_len:
-            end = start + size
-            if end >= text_len:
-                chunks.append(text[start:text_len].strip())
+    def _words(self, text: str) -> Iterator[str]:
+        max_chars = self.opts.chunk_size * _CHARS_PER_TOKEN
+        for m in _WORD_RE.finditer(text):
+            word = m.group()
+            # A single "word" longer than a chunk (base64, table rules) is cut by characters.
+            for i in range(0, len(word), max_chars):
+                yield word[i:i + max_chars]
+
+    # ---------------- Chunks ----------------
+    def _cut_point(self, units: List[_Unit], tokens: int, keep_max: int) -> int:
+        """
+        Number of units to emit: through the last paragraph break in the
+        second half if what follows it (at most keep_max tokens) can start
+        the next chunk, else all of them.
+        """
+        kept = 0
+        for i in range(len(units) - 1, 0, -1):
+            kept += units[i][1]
+            if kept > keep_max or kept * 2 > tokens:
+                break
+            if units[i - 1][2]:
+                return i
+        return len(units)
+
+    def _overlap(self, units: List[_Unit]) -> List[_Unit]:
+        """Whole trailing sentences within chunk_overlap tokens, else trailing words of the last one."""
+        budget = self.opts.chunk_overlap
+        if budget <= 0 or not units:
+            return []
+        carry: List[_Unit] = []
+        used = 0
+        for unit in reversed(units):
+            if used + unit[1] > budget:
+                break
+            carry.append(unit)
+            used += unit[1]
+        # Carried units never count as a paragraph end, so a chunk is never just overlap.
+        if carry:
+            return [(text, n, False) for text, n, _ in reversed(carry)]
+        words = list(self._words(units[-1][0]))
+        tail, used = "", 0
+        for word in reversed(words):
+            t = self.length(word)
+            if used + t > budget:
                 break
+            tail, used = word + tail, used + t
+        return [(tail, used, False)] if tail.strip() else []
 
-            # try to find newline or punctuation boundary
-            split_at = text.rfind("\n", start, end)
-            if split_at == -1:
-                for delim in ('.', '!', '?', ';'):
-                    split_at = text.rfind(delim, start, end)
-                    if split_at != -1:
-                        split_at += 1
-                        break
-            if split_at == -1 or split_at <= start:
-                split_at = end
-
-            chunk = text[start:split_at].strip()
-            chunks.append(chunk)
-            start = max(split_at - overlap, split_at)
-        return chunks
\ No newline at end of file
+    @staticmethod
+    def _join(units: List[_Unit]) -> str:
+        return "".join(u[0] for u in units).strip()
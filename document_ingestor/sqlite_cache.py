@@ -1,52 +1,256 @@
 from __future__ import annotations
 import json
 import sqlite3
+import threading
+from array import array
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# SQLite's default limit on host parameters is 999 on older builds.
+_IN_CHUNK = 500
+
+
+def _encode_vector(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode_vector(blob: bytes) -> List[float]:
+    vec = array("f")
+    vec.frombytes(blob)
+    return vec.tolist()
+
+
+# (key, source, file_path, chunk_index, meta, vector, content) as accepted by set_many.
+CacheRow = Tuple[str, str, str, int, Dict[str, Any], Optional[Sequence[float]], Optional[str]]
 
 
 class SQLiteEmbedCache:
-    """Cache mapping content_hash -> embedding metadata"""
-    def __init__(self, path: str):
+    """
+    Cache mapping (content_hash, source) -> chunk text, metadata and float32
+    embedding. Lookups by hash alone reuse a vector from any source.
+
+    Each thread gets its own connection (the server, scheduler and ingestion
+    pipeline threads all use the cache); the database runs in WAL mode so
+    readers never wait for the writer. Writes are serialised in-process.
+    """
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
         self.path = Path(path)
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(str(self.path))
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._conn_lock = threading.Lock()
+        self._write_lock = threading.RLock()
         self._create_table()
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Only the owning thread uses it; the flag just lets close() run from any thread.
+            conn = sqlite3.connect(str(self.path), timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conn_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_thread_connection(self) -> None:
+        """Close the calling thread's connection; call it before a short-lived worker thread exits."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._conn_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close(self) -> None:
+        with self._conn_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
     def _create_table(self):
-        cur = self.conn.cursor()
+        with self._write_lock, self.conn:
+            cur = self.conn.cursor()
+            # One row per (content hash, source): the same chunk text in two objects has two rows,
+            # so removing it from one object never evicts the other's vector.
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embed_cache (
+                    key TEXT NOT NULL,
+                    source TEXT NOT NULL DEFAULT '',
+                    file_path TEXT,
+                    chunk_index INTEGER,
+                    created_at TEXT,
+                    meta TEXT,
+                    content TEXT,
+                    vector BLOB,
+                    minhash BLOB,
+                    PRIMARY KEY (key, source)
+                )
+                """
+            )
+            # Older caches were created without content/vector/minhash columns.
+            columns = {row[1]: row[5] for row in cur.execute("PRAGMA table_info(embed_cache)")}
+            for column, ddl in (("content", "TEXT"), ("vector", "BLOB"), ("minhash", "BLOB")):
+                if column not in columns:
+                    cur.execute(f"ALTER TABLE embed_cache ADD COLUMN {column} {ddl}")
+            if not columns.get("source"):
+                self._migrate_composite_key(cur)
+            cur.execute("CREATE INDEX IF NOT EXISTS embed_cache_source ON embed_cache (source, chunk_index)")
+
+    @staticmethod
+    def _migrate_composite_key(cur: sqlite3.Cursor) -> None:
+        """Rebuild a cache keyed by content hash alone as one keyed by (hash, source)."""
+        cur.execute("DROP INDEX IF EXISTS embed_cache_source")
+        cur.execute("ALTER TABLE embed_cache RENAME TO embed_cache_old")
         cur.execute(
             """
-            CREATE TABLE IF NOT EXISTS embed_cache (
-                key TEXT PRIMARY KEY,
-                source TEXT,
+            CREATE TABLE embed_cache (
+                key TEXT NOT NULL,
+                source TEXT NOT NULL DEFAULT '',
                 file_path TEXT,
                 chunk_index INTEGER,
                 created_at TEXT,
-                meta TEXT
+                meta TEXT,
+                content TEXT,
+                vector BLOB,
+                minhash BLOB,
+                PRIMARY KEY (key, source)
             )
             """
         )
-        self.conn.commit()
+        cur.execute(
+            "INSERT OR REPLACE INTO embed_cache "
+            "SELECT key, COALESCE(source, ''), file_path, chunk_index, created_at, meta, content, vector, minhash "
+            "FROM embed_cache_old"
+        )
+        cur.execute("DROP TABLE embed_cache_old")
+
+    @staticmethod
+    def _in_chunks(keys: Iterable[str]) -> Iterator[List[str]]:
+        keys = list(keys)
+        for i in range(0, len(keys), _IN_CHUNK):
+            yield keys[i:i + _IN_CHUNK]
 
     def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata for many keys with one IN query per 500 keys; missing keys are omitted."""
+        found: Dict[str, Dict[str, Any]] = {}
         cur = self.conn.cursor()
-        cur.execute("SELECT meta FROM embed_cache WHERE key = ?", (key,))
-        row = cur.fetchone()
-        if not row:
-            return None
-        return json.loads(row[0])
+        for part in self._in_chunks(keys):
+            cur.execute(f"SELECT key, meta FROM embed_cache WHERE key IN ({','.join('?' * len(part))})", part)
+            for key, meta in cur.fetchall():
+                found[key] = json.loads(meta)
+        return found
 
-    def set(self, key: str, source: str, file_path: str, chunk_index: int, meta: Dict[str, Any]):
+    def has_vector(self, key: str) -> bool:
+        cur = self.conn.cursor()
+        cur.execute("SELECT 1 FROM embed_cache WHERE key = ? AND vector IS NOT NULL", (key,))
+        return cur.fetchone() is not None
+
+    def set(
+        self,
+        key: str,
+        source: str,
+        file_path: str,
+        chunk_index: int,
+        meta: Dict[str, Any],
+        vector: Optional[Sequence[float]] = None,
+        content: Optional[str] = None,
+    ):
+        self.set_many([(key, source, file_path, chunk_index, meta, vector, content)])
+
+    def set_many(self, rows: Iterable[CacheRow]) -> int:
+        """Write many entries in a single transaction; returns the number written."""
+        now = datetime.utcnow().isoformat()
+        params = [
+            (
+                key, source, file_path, chunk_index, now, json.dumps(meta),
+                content, _encode_vector(vector) if vector is not None else None,
+            )
+            for key, source, file_path, chunk_index, meta, vector, content in rows
+        ]
+        if not params:
+            return 0
+        with self._write_lock, self.conn:
+            self.conn.executemany(
+                "REPLACE INTO embed_cache(key, source, file_path, chunk_index, created_at, meta, content, vector) "
+                "VALUES(?,?,?,?,?,?,?,?)",
+                params,
+            )
+        return len(params)
+
+    def get_vectors(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Bulk fetch of stored vectors; keys without a vector are omitted."""
+        found: Dict[str, List[float]] = {}
+        cur = self.conn.cursor()
+        for part in self._in_chunks(keys):
+            cur.execute(
+                f"SELECT key, vector FROM embed_cache WHERE vector IS NOT NULL "
+                f"AND key IN ({','.join('?' * len(part))})",
+                part,
+            )
+            for key, blob in cur.fetchall():
+                found[key] = _decode_vector(blob)
+        return found
+
+    def iter_vectors(self, batch_size: int = 1000) -> Iterator[List[Tuple[str, str, Dict[str, Any], List[float]]]]:
+        """Yield batches of (key, content, meta, vector) for every row with a stored vector."""
+        # WAL readers see a consistent snapshot and do not block writers on other threads.
         cur = self.conn.cursor()
         cur.execute(
-            "REPLACE INTO embed_cache(key, source, file_path, chunk_index, created_at, meta) VALUES(?,?,?,?,?,?)",
-            (key, source, file_path, chunk_index, datetime.utcnow().isoformat(), json.dumps(meta)),
+            "SELECT key, content, meta, vector FROM embed_cache "
+            "WHERE vector IS NOT NULL AND content IS NOT NULL ORDER BY source, chunk_index"
         )
-        self.conn.commit()
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [(key, content, json.loads(meta), _decode_vector(blob)) for key, content, meta, blob in rows]
 
-    def delete_by_source(self, source: str):
+    def set_signatures(self, signatures: Dict[str, bytes]) -> None:
+        """Store MinHash signatures for existing entries, in one transaction."""
+        if not signatures:
+            return
+        with self._write_lock, self.conn:
+            self.conn.executemany(
+                "UPDATE embed_cache SET minhash = ? WHERE key = ?", [(sig, key) for key, sig in signatures.items()]
+            )
+
+    def iter_signatures(self, batch_size: int = 5000) -> Iterator[List[Tuple[str, bytes]]]:
+        """Batches of (key, minhash) for entries that have both a vector and a signature."""
         cur = self.conn.cursor()
-        cur.execute("DELETE FROM embed_cache WHERE source = ?", (source,))
-        self.conn.commit()
+        cur.execute("SELECT key, minhash FROM embed_cache WHERE vector IS NOT NULL AND minhash IS NOT NULL")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+    def delete_keys(self, keys: Iterable[str]):
+        """Delete entries by content hash, for every source that has them."""
+        with self._write_lock, self.conn:
+            for part in self._in_chunks(keys):
+                self.conn.execute(f"DELETE FROM embed_cache WHERE key IN ({','.join('?' * len(part))})", part)
+
+    def delete_chunks(self, source: str, keys: Iterable[str]):
+        """Delete one source's entries for the given content hashes; other sources keep theirs."""
+        with self._write_lock, self.conn:
+            for part in self._in_chunks(keys):
+                self.conn.execute(
+                    f"DELETE FROM embed_cache WHERE source = ? AND key IN ({','.join('?' * len(part))})",
+                    [source, *part],
+                )
+
+    def delete_by_source(self, source: str):
+        with self._write_lock, self.conn:
+            self.conn.execute("DELETE FROM embed_cache WHERE source = ?", (source,))
@@ -15,9 +15,12 @@ class Extractor(ABC):
         subject: str,
         body: str,
         attachments_text: str,
-        sender: Optional[str] = None
+        sender: Optional[str] = None,
+        ocr_text: Optional[str] = None,
     ) -> StructuredResult:
         """
-        Extract structured data from raw inputs.
+        Extract structured data from raw inputs. attachments_text may carry
+        retrieved context for the LLM; ocr_text, when given, is the
+        attachments' own text, for anything that must not read that context.
         """
         raise NotImplementedError
@@ -1,3 +1,4 @@
+import os
 import logging
 from typing import Optional
 from bedrock_llms.base import BaseLLMClient
@@ -10,17 +11,29 @@ from .prompts.service_type_prompt import ServiceTypePrompt
 from .prompts.chronic_disease_prompt import ChronicDiseasePrompt
 from .prompts.benefit_type_prompt import BenefitTypePrompt
 from .utils.member_number import MemberNumberExtractor
+from .utils.entity_scanner import EntityScanner, ScanResult
 from .utils.normalizers import Normalizers
 from .utils.json_parser import JSONParser
 from .utils.prompt_runner import PromptRunner
+from .utils.provider_templates import ProviderTemplateRegistry
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PROVIDER_NAME = os.getenv("DEFAULT_PROVIDER_NAME", "Agha Khan University (AKU)")
+
 
 class ClaimExtractor(Extractor):
-    def __init__(self, llm_client: Optional[BaseLLMClient] = None):
+    def __init__(
+        self,
+        llm_client: Optional[BaseLLMClient] = None,
+        skip_llm_when_confident: bool = True,
+        provider_templates: Optional[ProviderTemplateRegistry] = None,
+    ):
         self.llm_client = llm_client or BedrockLLMClient()
         self.prompt_runner = PromptRunner(self.llm_client)
+        self.scanner = EntityScanner()
+        self.provider_templates = provider_templates or ProviderTemplateRegistry()
+        self.skip_llm_when_confident = skip_llm_when_confident
 
         # prompts
         self.extraction_prompt = ExtractionPrompt()
@@ -29,35 +42,81 @@ class ClaimExtractor(Extractor):
         self.chronic_prompt = ChronicDiseasePrompt()
         self.benefit_prompt = BenefitTypePrompt()
 
-    def extract(self, subject: str, body: str, attachments_text: str, sender: Optional[str] = None) -> StructuredResult:
-        # Main JSON extraction
-        prompt = self.extraction_prompt.build(subject, body, attachments_text, sender=sender)
-        resp_dict = self.llm_client.chat_completion(messages=[{"role": "user", "content": prompt}])
-        resp = resp_dict["choices"][0]["message"]["content"]
+    def extract(
+        self,
+        subject: str,
+        body: str,
+        attachments_text: str,
+        sender: Optional[str] = None,
+        ocr_text: Optional[str] = None,
+    ) -> StructuredResult:
+        # Templates and the scanner read the claim documents only, never retrieved KB context
+        # (tariff and benefit tables would otherwise pass as claim lines, names and numbers).
+        claim_text = attachments_text if ocr_text is None else ocr_text
+
+        # Known provider layouts are read straight from their anchors
+        template_data = self.provider_templates.extract(sender, claim_text)
 
-        data = JSONParser.extract_first_object(resp)
+        # Deterministic pre-extraction; the main LLM call is only needed when it falls short
+        scan = self.scanner.scan(subject, body, claim_text)
+        if template_data is not None:
+            data = template_data
+        elif self.skip_llm_when_confident and scan.is_confident():
+            logger.info("Pre-extraction found all required fields; skipping main LLM extraction")
+            data = scan.to_data()
+        else:
+            # Main JSON extraction
+            messages = self.extraction_prompt.build_messages(subject, body, attachments_text, sender=sender)
+            resp_dict = self.llm_client.chat_completion(messages=messages)
+            resp = resp_dict["choices"][0]["message"]["content"]
+
+            data = JSONParser.extract_first_object(resp)
+            self._fill_from_scan(data, scan)
 
         # Normalization
         Normalizers.normalize_invoiced_amount(data)
-        member_number, is_smart = MemberNumberExtractor.extract(subject, body, attachments_text)
+        if template_data is None and not scan.missing(("member_number",)):
+            # Labelled or smart-format number; the first bare token could be a phone number
+            member_number, is_smart = scan.member_number, scan.is_smart
+        elif template_data is None:
+            member_number, is_smart = MemberNumberExtractor.extract(subject, body, claim_text)
+        else:
+            member_number, is_smart = MemberNumberExtractor.extract(template_data["member_number"], "", "")
         data["member_number"] = member_number
         data["is_smart"] = is_smart
 
 
-        # Extra signals
+        # Extra signals; each LLM call is skipped when a provider template already supplies the field
         combined_text = f"{attachments_text}\n\n{body}"
         try:
-            data["clinical_summary"] = self.prompt_runner.run(self.clinical_prompt, combined_text, max_tokens=300)
-            data["service_type"] = self.prompt_runner.run(self.service_prompt, combined_text, max_tokens=50).lower()
-            chronic_resp = self.prompt_runner.run(self.chronic_prompt, combined_text, max_tokens=20)
-            data["is_chronic"] = "yes" in chronic_resp.lower() or "true" in chronic_resp.lower()
-            data["benefit_type"] = self.prompt_runner.run(self.benefit_prompt, combined_text, max_tokens=50).lower()
+            if not data.get("clinical_summary"):
+                data["clinical_summary"] = self.prompt_runner.run(self.clinical_prompt, combined_text, max_tokens=300)
+            if not data.get("service_type"):
+                data["service_type"] = self.prompt_runner.run(self.service_prompt, combined_text, max_tokens=50).lower()
+            if data.get("is_chronic") is None:
+                chronic_resp = self.prompt_runner.run(self.chronic_prompt, combined_text, max_tokens=20)
+                data["is_chronic"] = "yes" in chronic_resp.lower() or "true" in chronic_resp.lower()
+            if not data.get("benefit_type"):
+                data["benefit_type"] = self.prompt_runner.run(self.benefit_prompt, combined_text, max_tokens=50).lower()
         except Exception as e:
             logger.warning("Failed to extract some fields: %s", e)
 
         # Finalize claim_details
         Normalizers.normalize_claim_details(data)
 
-        data["provider_name"] = "Agha Khan University (AKU)"
+        if template_data is None:
+            data["provider_name"] = DEFAULT_PROVIDER_NAME
+        data.pop("template", None)
 
         return StructuredResult(**data)
+
+    @staticmethod
+    def _fill_from_scan(data: dict, scan: ScanResult) -> None:
+        """Fill fields the LLM left empty with confident deterministic values."""
+        for key, value in scan.to_data().items():
+            if key not in scan.confidence or scan.missing((key,)):
+                continue
+            if key == "member_name" and not EntityScanner.is_name(value):
+                continue
+            if data.get(key) in (None, "", "unknown", [], 0, 0.0):
+                data[key] = value
@@ -1,19 +1,45 @@
 from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from bedrock_llms.messages import cacheable_block, text_block
+from .registry import TEMPLATES_DIR, CompiledTemplate, get_registry
 
 
 class BasePrompt:
-    templates_dir = Path(__file__).parent.parent.parent / "templates"
+    # Subclasses may point at another directory; each directory gets its own registry.
+    templates_dir: Path = TEMPLATES_DIR
+    # Placeholders whose values never change between calls stay in the cacheable prefix.
+    static_fields: Tuple[str, ...] = ()
 
     def __init__(self, template_filename: str):
+        self.template_name = template_filename
         self.template_path = self.templates_dir / template_filename
+        self.registry = get_registry(self.templates_dir)
+
+    def compiled(self) -> CompiledTemplate:
+        return self.registry.get(self.template_name)
 
     def load_template(self) -> str:
-        with open(self.template_path, "r", encoding="utf-8") as f:
-            return f.read()
+        return self.compiled().source
 
     def build_prompt(self, **kwargs) -> str:
         """Replace placeholders in template with kwargs."""
-        template = self.load_template()
-        for key, value in kwargs.items():
-            template = template.replace(f"{{{key}}}", str(value))
-        return template
+        return self.compiled().render(kwargs)
+
+    def split_prompt(self, **kwargs) -> Tuple[str, str]:
+        """
+        Split the rendered prompt into the static prefix (everything before the
+        first per-call placeholder) and the variable remainder.
+        """
+        compiled = self.compiled()
+        cut = compiled.split_index(kwargs, self.static_fields)
+        return compiled.render(kwargs, 0, cut), compiled.render(kwargs, cut)
+
+    def build_prompt_messages(self, **kwargs) -> List[Dict[str, Any]]:
+        """Single user message with the static prefix as a cacheable block."""
+        prefix, rest = self.split_prompt(**kwargs)
+        content = []
+        if prefix.strip():
+            content.append(cacheable_block(prefix))
+        if rest:
+            content.append(text_block(rest))
+        return [{"role": "user", "content": content}]
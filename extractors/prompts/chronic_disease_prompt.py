@@ -1,3 +1,4 @@
+from typing import Any, Dict, List
 from .base_prompt import BasePrompt
 
 
@@ -7,3 +8,6 @@ class ChronicDiseasePrompt(BasePrompt):
 
     def build(self, text: str) -> str:
         return super().build_prompt(claim_text=text)
+
+    def build_messages(self, text: str) -> List[Dict[str, Any]]:
+        return super().build_prompt_messages(claim_text=text)
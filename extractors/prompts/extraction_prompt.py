@@ -1,18 +1,20 @@
 from .base_prompt import BasePrompt
 import json
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 
 class ExtractionPrompt(BasePrompt):
+    static_fields = ("SCHEMA",)
+
     def __init__(self):
         super().__init__("extraction_prompt.txt")
 
-    def build(
-        self,
+    @staticmethod
+    def _fields(
         subject: str,
         body: str,
         attachment_text: str,
-        sender: Optional[str] = None) -> str:
+        sender: Optional[str] = None) -> Dict[str, str]:
         schema = {
             "member_number": "string (mandatory) - if missing use 'unknown'",
             "member_name": "string (mandatory) - full patient name or 'unknown'",
@@ -21,10 +23,26 @@ class ExtractionPrompt(BasePrompt):
             "claim_details": 'array of {"item":string, "cost":number} or empty array',
             "invoiced_amount": "number - total invoiced amount in KES",
         }
-        return super().build_prompt(
+        return dict(
             SCHEMA=json.dumps(schema, indent=2),
             EMAIL_SUBJECT=subject,
             EMAIL_BODY=body,
             ATTACHMENT_TEXT=attachment_text,
             SENDER_EMAIL=sender or "unknown"
         )
+
+    def build(
+        self,
+        subject: str,
+        body: str,
+        attachment_text: str,
+        sender: Optional[str] = None) -> str:
+        return super().build_prompt(**self._fields(subject, body, attachment_text, sender))
+
+    def build_messages(
+        self,
+        subject: str,
+        body: str,
+        attachment_text: str,
+        sender: Optional[str] = None) -> List[Dict[str, Any]]:
+        return super().build_prompt_messages(**self._fields(subject, body, attachment_text, sender))
@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = Path(__file__).parent.parent.parent / "templates"
+# Seconds between mtime checks per template; 0 checks on every render.
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "2.0"))
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+# (is_placeholder, literal text or placeholder name)
+Segment = Tuple[bool, str]
+
+
+class CompiledTemplate:
+    """A template pre-split into static and placeholder segments."""
+
+    def __init__(self, path: Path, source: str, mtime_ns: int):
+        self.path = path
+        self.source = source
+        self.mtime_ns = mtime_ns
+        self.checked_at = time.monotonic()
+        self.segments: List[Segment] = self.compile(source)
+
+    @staticmethod
+    def compile(source: str) -> List[Segment]:
+        segments: List[Segment] = []
+        pos = 0
+        for m in _PLACEHOLDER.finditer(source):
+            if m.start() > pos:
+                segments.append((False, source[pos:m.start()]))
+            segments.append((True, m.group(1)))
+            pos = m.end()
+        if pos < len(source):
+            segments.append((False, source[pos:]))
+        return segments
+
+    def render(self, values: Dict[str, Any], start: int = 0, end: Optional[int] = None) -> str:
+        """Render segments[start:end] in one join; unknown placeholders are left as-is."""
+        parts: List[str] = []
+        for is_placeholder, text in self.segments[start:end]:
+            if not is_placeholder:
+                parts.append(text)
+            elif text in values:
+                parts.append(str(values[text]))
+            else:
+                parts.append("{" + text + "}")
+        return "".join(parts)
+
+    def split_index(self, values: Dict[str, Any], static_fields: Sequence[str] = ()) -> int:
+        """Index of the first segment that varies per call."""
+        for i, (is_placeholder, name) in enumerate(self.segments):
+            if is_placeholder and name in values and name not in static_fields:
+                return i
+        return len(self.segments)
+
+
+class TemplateRegistry:
+    """
+    Loads and compiles every template under templates/ once, and recompiles
+    a template when its file mtime changes.
+    """
+
+    def __init__(self, templates_dir: Path = TEMPLATES_DIR, reload_interval: float = PROMPT_RELOAD_INTERVAL):
+        self.templates_dir = Path(templates_dir)
+        self.reload_interval = reload_interval
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+        self.load_all()
+
+    def load_all(self) -> None:
+        for path in sorted(self.templates_dir.glob("*.txt")):
+            self._load(path)
+        logger.info("Compiled %d prompt templates from %s", len(self._templates), self.templates_dir)
+
+    def _load(self, path: Path) -> CompiledTemplate:
+        mtime_ns = path.stat().st_mtime_ns
+        with open(path, "r", encoding="utf-8") as f:
+            compiled = CompiledTemplate(path, f.read(), mtime_ns)
+        with self._lock:
+            self._templates[path.name] = compiled
+        return compiled
+
+    def get(self, name: str) -> CompiledTemplate:
+        compiled = self._templates.get(name)
+        if compiled is None:
+            return self._load(self.templates_dir / name)
+
+        now = time.monotonic()
+        if now - compiled.checked_at < self.reload_interval:
+            return compiled
+        compiled.checked_at = now
+        try:
+            mtime_ns = compiled.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            logger.warning("Template %s disappeared; keeping last compiled version", compiled.path)
+            return compiled
+        if mtime_ns != compiled.mtime_ns:
+            logger.info("Reloading changed template %s", compiled.path.name)
+            return self._load(compiled.path)
+        return compiled
+
+    def render(self, template_name: str, /, **kwargs) -> str:
+        return self.get(template_name).render(kwargs)
+
+
+_registries: Dict[Path, TemplateRegistry] = {}
+_registry_lock = threading.Lock()
+
+
+def get_registry(templates_dir: Path = TEMPLATES_DIR) -> TemplateRegistry:
+    """Process-wide registry for a templates directory, created on first use."""
+    key = Path(templates_dir).resolve()
+    registry = _registries.get(key)
+    if registry is None:
+        with _registry_lock:
+            registry = _registries.get(key)
+            if registry is None:
+                registry = _registries[key] = TemplateRegistry(key)
+    return registry
@@ -0,0 +1,181 @@
+import os
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+from .member_number import MemberNumberExtractor
+from .normalizers import Normalizers
+
+logger = logging.getLogger(__name__)
+
+PREEXTRACT_CONFIDENCE = float(os.getenv("PREEXTRACT_CONFIDENCE", "0.85"))
+REQUIRED_FIELDS = ("member_number", "member_name", "invoiced_amount")
+
+_NUMBER_WORDS = (
+    "zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|fourteen|"
+    "fifteen|sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|seventy|"
+    "eighty|ninety|hundred|thousand|million|billion|and"
+)
+_CURRENCY = r"(?:KES|KSHS?|Kshs?|Ksh\.|Kes)\.?"
+_MONEY = r"\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+\.\d{1,2}|\d+"
+# Line items must look like money (grouping or cents) so "Room 12" is not a cost.
+_ITEM_MONEY = r"\d{1,3}(?:,\d{3})+(?:\.\d{1,2})?|\d+\.\d{2}"
+_MONTHS = r"jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec"
+# Initials and titles keep their dot; any other dot ends the name ("Patient: John Doe. Total ...").
+_NAME_WORD = r"(?:[A-Za-z]\.|(?i:dr|mr|mrs|ms|prof)\.|[A-Za-z][A-Za-z'\-]*)"
+# Member-number shapes, without groups, so a labelled name never starts with one ("Member: DIV-25325554-01").
+_MEMBER_TOKEN = "|".join(p.strip("^$") for ps in MemberNumberExtractor.PATTERNS.values() for p in ps)
+# Table column separator: a tab, a pipe or a run of two or more spaces.
+_COL = r"(?:[ \t]*[\t|][ \t]*|[ ]{2,})"
+
+# One master pattern, scanned once per input. Alternatives are ordered by
+# precedence: labelled fields win over bare tokens at the same position.
+# Line items need a tabular layout (description, optional qty and cost in
+# separate columns) and no "Label:" in the description, so free-text lines
+# ending in a number are not items and labelled fields are never swallowed.
+MASTER_RE = re.compile(
+    r"(?P<total>\b(?i:grand\s+total|invoice\s+total|total\s+amount(?:\s+due)?|amount\s+due|net\s+total|total)"
+    r"\s*(?i:\((?:kes|kshs?)\))?\s*[:\-]?\s*(?:" + _CURRENCY + r"\s*)?(?P<total_value>" + _MONEY + r"))"
+    r"|(?P<name>(?P<name_label>(?i:patient(?:'s)?\s+name|member(?:'s)?\s+name|patient|name))"
+    r"\s*[:\-]\s*(?!" + _MEMBER_TOKEN + r")(?P<name_value>" + _NAME_WORD + r"(?:[ \t]+" + _NAME_WORD + r"){0,4}))"
+    r"|(?P<scheme>(?i:scheme(?:\s+name)?|insurer|employer)\s*[:\-]\s*(?P<scheme_value>[^\n]{2,80}))"
+    r"|(?P<member_label>(?i:member(?:ship)?\s*(?:no|number|#)\.?|card\s*(?:no|number)\.?)\s*[:\-]?\s*)"
+    r"(?=[A-Z0-9])"
+    r"|" + MemberNumberExtractor.TOKEN_RE.pattern +
+    r"|(?P<date>\b(?:\d{4}-\d{2}-\d{2}|\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}"
+    r"|\d{1,2}\s+(?i:" + _MONTHS + r")[a-z]*\.?,?\s+\d{4})\b)"
+    r"|(?P<word_amount>\b(?i:(?:(?:" + _NUMBER_WORDS + r")[\s\-]+)+(?:kenya(?:n)?\s+)?shillings?)\b)"
+    r"|(?P<currency_amount>" + _CURRENCY + r"\s*(?P<currency_value>" + _MONEY + r")(?:\s*/=)?)"
+    r"|(?m:^[ \t]*(?!(?i:sub[\s\-]*total|total|balance|paid|amount|vat|tax|discount|change|cash)\b)"
+    r"(?P<item>[A-Za-z][^\n:|\t]*?[A-Za-z)])(?:" + _COL + r"\d{1,4})?" + _COL + r"(?:" + _CURRENCY + r"\s*)?"
+    r"(?P<item_cost>" + _ITEM_MONEY + r")(?:\s*/=)?[ \t]*$)"
+)
+
+
+@dataclass
+class ScanResult:
+    """Entities found by EntityScanner, each with a 0..1 confidence."""
+    member_number: Optional[str] = None
+    is_smart: bool = False
+    member_name: Optional[str] = None
+    scheme_name: Optional[str] = None
+    invoiced_amount: Optional[float] = None
+    claim_details: List[Dict[str, Any]] = field(default_factory=list)
+    dates: List[str] = field(default_factory=list)
+    amounts: List[float] = field(default_factory=list)
+    confidence: Dict[str, float] = field(default_factory=dict)
+
+    def is_confident(self, required: Sequence[str] = REQUIRED_FIELDS, threshold: float = PREEXTRACT_CONFIDENCE) -> bool:
+        return all(self.confidence.get(f, 0.0) >= threshold for f in required)
+
+    def missing(self, required: Sequence[str] = REQUIRED_FIELDS, threshold: float = PREEXTRACT_CONFIDENCE) -> List[str]:
+        return [f for f in required if self.confidence.get(f, 0.0) < threshold]
+
+    def to_data(self) -> Dict[str, Any]:
+        """Return a dict shaped like the LLM extraction output."""
+        return {
+            "member_number": self.member_number or "unknown",
+            "member_name": self.member_name or "unknown",
+            "scheme_name": self.scheme_name or "unknown",
+            "claim_details": list(self.claim_details),
+            "invoiced_amount": self.invoiced_amount if self.invoiced_amount is not None else 0.0,
+        }
+
+
+class EntityScanner:
+    """
+    Deterministic, single-pass scanner for member numbers, KES amounts
+    (digits or words), dates, labelled names and invoice totals.
+    """
+
+    def scan(self, subject: str, body: str, attachment_text: str) -> ScanResult:
+        result = ScanResult()
+        totals: List[float] = []
+        for text in (subject, body, attachment_text):
+            if text:
+                self._scan_text(text, result, totals)
+
+        self._resolve_amount(result, totals)
+        return result
+
+    def _scan_text(self, text: str, result: ScanResult, totals: List[float]) -> None:
+        labelled_member = False
+        for m in MASTER_RE.finditer(text):
+            if m.group("total"):
+                value = Normalizers.parse_amount(m.group("total_value"))
+                if value is not None:
+                    totals.append(value)
+            elif m.group("name"):
+                label = m.group("name_label").lower()
+                conf = 0.6 if label == "name" else 0.9
+                if self.is_name(m.group("name_value")) and conf > result.confidence.get("member_name", 0.0):
+                    result.member_name = m.group("name_value").strip()
+                    result.confidence["member_name"] = conf
+            elif m.group("scheme"):
+                if "scheme_name" not in result.confidence:
+                    result.scheme_name = m.group("scheme_value").strip()
+                    result.confidence["scheme_name"] = 0.8
+            elif m.group("member_label") is not None:
+                labelled_member = True
+            elif m.group("smart") or m.group("slade"):
+                self._take_member(m, labelled_member, result)
+                labelled_member = False
+            elif m.group("date"):
+                result.dates.append(m.group("date"))
+            elif m.group("word_amount"):
+                value = Normalizers.parse_amount(m.group("word_amount"))
+                if value is not None:
+                    result.amounts.append(value)
+            elif m.group("currency_amount"):
+                value = Normalizers.parse_amount(m.group("currency_value"))
+                if value is not None:
+                    result.amounts.append(value)
+            elif m.group("item"):
+                cost = Normalizers.parse_amount(m.group("item_cost"))
+                if cost is not None:
+                    result.claim_details.append({"item": m.group("item").strip(), "cost": cost})
+
+    @staticmethod
+    def is_name(value: Optional[str]) -> bool:
+        """False for values that cannot be a person's name, e.g. a member-number fragment like "DIV-"."""
+        value = (value or "").strip()
+        return bool(value) and not any(ch.isdigit() for ch in value) and not value.endswith("-")
+
+    @staticmethod
+    def _take_member(m: "re.Match[str]", labelled: bool, result: ScanResult) -> None:
+        # Earlier sources (subject, then body) win, matching MemberNumberExtractor.
+        is_smart = bool(m.group("smart"))
+        if is_smart or labelled:
+            conf = 0.95
+        else:
+            conf = 0.7  # a bare 8-digit number may be a phone or invoice number
+        current = result.confidence.get("member_number", 0.0)
+        if result.member_number is None or conf > current:
+            result.member_number = m.group("smart") or m.group("slade")
+            result.is_smart = is_smart
+            result.confidence["member_number"] = conf
+
+    @staticmethod
+    def _resolve_amount(result: ScanResult, totals: List[float]) -> None:
+        items_sum = round(sum(c["cost"] for c in result.claim_details), 2)
+        if totals:
+            # The last "total" on an invoice is usually the grand total.
+            total = totals[-1]
+            result.invoiced_amount = total
+            if result.claim_details and abs(items_sum - total) < 0.01:
+                result.confidence["invoiced_amount"] = 0.98
+            else:
+                result.confidence["invoiced_amount"] = 0.9
+        elif result.claim_details:
+            result.invoiced_amount = items_sum
+            result.confidence["invoiced_amount"] = 0.6
+        elif result.amounts:
+            distinct = set(result.amounts)
+            result.invoiced_amount = max(distinct)
+            if len(distinct) == 1:
+                # e.g. "Ksh. 185,000/=" corroborated by the amount in words
+                result.confidence["invoiced_amount"] = 0.9 if len(result.amounts) > 1 else 0.5
+            else:
+                result.confidence["invoiced_amount"] = 0.3
+        if result.claim_details:
+            result.confidence["claim_details"] = result.confidence.get("invoiced_amount", 0.0)
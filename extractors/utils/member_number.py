@@ -13,6 +13,14 @@ class MemberNumberExtractor:
         ]
     }
 
+    # Compiled once; token boundaries mirror the old [A-Z0-9\-]+ tokenisation.
+    _BOUNDARY_L = r"(?<![A-Z0-9\-])"
+    _BOUNDARY_R = r"(?![A-Z0-9\-])"
+    TOKEN_RE = re.compile(
+        _BOUNDARY_L + r"(?:(?P<smart>" + "|".join(p.strip("^$") for p in PATTERNS["smart"]) + r")"
+        r"|(?P<slade>" + "|".join(p.strip("^$") for p in PATTERNS["slade-actisure"]) + r"))" + _BOUNDARY_R
+    )
+
     @classmethod
     def extract(cls, subject: str, body: str, attachment_text: str) -> Tuple[str, bool]:
         for source in (subject, body, attachment_text):
@@ -23,12 +31,9 @@ class MemberNumberExtractor:
 
     @classmethod
     def _find_candidate(cls, text: str) -> Tuple[Optional[str], bool]:
-        tokens = re.findall(r"[A-Z0-9\-]+", text or "")
-        for token in tokens:
-            for p in cls.PATTERNS["smart"]:
-                if re.fullmatch(p, token):
-                    return token, True
-            for p in cls.PATTERNS["slade-actisure"]:
-                if re.fullmatch(p, token):
-                    return token, False
-        return None, False
+        match = cls.TOKEN_RE.search(text or "")
+        if not match:
+            return None, False
+        if match.group("smart"):
+            return match.group("smart"), True
+        return match.group("slade"), False
@@ -1,17 +1,62 @@
 import re
 import logging
+from typing import Any, Optional
 from models.models import ClaimItem
 
+try:
+    from word2number import w2n
+except Exception:
+    w2n = None
+
 logger = logging.getLogger(__name__)
 
+_NON_NUMERIC = re.compile(r"[^\d.]")
+_HAS_DIGIT = re.compile(r"\d")
+_CURRENCY_WORDS = re.compile(r"\b(?:kenya(?:n)?|kes|kshs?|shillings?|only)\b", re.IGNORECASE)
+
 
 class Normalizers:
+    @staticmethod
+    def parse_amount(raw: Any) -> Optional[float]:
+        """
+        Parse a monetary amount such as "KES 12,500.50", "1,200/=" or
+        "twelve thousand shillings" into a float. Returns None if unparseable.
+        """
+        if raw is None:
+            return None
+        if isinstance(raw, (int, float)):
+            return float(raw)
+        text = str(raw).strip()
+        if not text:
+            return None
+
+        if not _HAS_DIGIT.search(text):
+            if w2n is None:
+                return None
+            words = _CURRENCY_WORDS.sub(" ", text).replace("-", " ").strip()
+            try:
+                return float(w2n.word_to_num(words))
+            except Exception:
+                return None
+
+        clean = _NON_NUMERIC.sub("", text.replace(",", "").replace("/=", ""))
+        if clean.count(".") > 1:
+            head, _, tail = clean.rpartition(".")
+            clean = head.replace(".", "") + "." + tail
+        clean = clean.strip(".")
+        if not clean:
+            return None
+        try:
+            return float(clean)
+        except ValueError:
+            return None
+
     @staticmethod
     def normalize_invoiced_amount(data: dict) -> None:
         invoiced_raw = data.get("invoiced_amount")
         if isinstance(invoiced_raw, str):
-            clean_amount = re.sub(r"[^\d]", "", invoiced_raw.replace(",", ""))
-            data["invoiced_amount"] = float(clean_amount) if clean_amount else 0.0
+            amount = Normalizers.parse_amount(invoiced_raw)
+            data["invoiced_amount"] = amount if amount is not None else 0.0
 
     @staticmethod
     def normalize_claim_details(data: dict) -> None:
@@ -17,9 +17,12 @@ class PromptRunner:
         Build prompt from prompt object and execute LLM completion.
         Returns the content string.
         """
-        prompt = prompt_obj.build(text)
+        if hasattr(prompt_obj, "build_messages"):
+            messages = prompt_obj.build_messages(text)
+        else:
+            messages = [{"role": "user", "content": prompt_obj.build(text)}]
         try:
-            resp = self.llm_client.chat_completion(messages=[{"role": "user", "content": prompt}])
+            resp = self.llm_client.chat_completion(messages=messages)
             return resp["choices"][0]["message"]["content"].strip()
         except Exception as e:
             logger.error("PromptRunner failed for prompt %s: %s", prompt_obj.__class__.__name__, e)
@@ -0,0 +1,187 @@
+import os
+import re
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+from .member_number import MemberNumberExtractor
+from .normalizers import Normalizers
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_LAYOUTS_PATH = os.getenv(
+    "PROVIDER_LAYOUTS_PATH",
+    str(Path(__file__).parent.parent.parent / "templates" / "provider_layouts.json"),
+)
+
+_WS = re.compile(r"\s+")
+
+
+def _norm_line(line: str) -> str:
+    return _WS.sub(" ", line).strip().lower()
+
+
+@dataclass
+class ProviderTemplate:
+    """Fixed invoice layout of a known provider, described by line anchors."""
+    name: str
+    provider_name: str
+    sender_domains: List[str]
+    fingerprints: List[str]
+    fields: Dict[str, Pattern[str]]
+    item_start: Pattern[str]
+    item_end: Pattern[str]
+    item_line: Pattern[str]
+    total: Pattern[str]
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    min_fingerprint_score: float = 0.6
+    total_tolerance: float = 1.0
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ProviderTemplate":
+        flags = re.IGNORECASE | re.MULTILINE
+        items = d["items"]
+        return cls(
+            name=d["name"],
+            provider_name=d["provider_name"],
+            sender_domains=[s.lower() for s in d.get("sender_domains", [])],
+            fingerprints=[_norm_line(f) for f in d.get("fingerprints", [])],
+            fields={k: re.compile(v, flags) for k, v in d.get("fields", {}).items()},
+            item_start=re.compile(items["start"], flags),
+            item_end=re.compile(items["end"], flags),
+            item_line=re.compile(items["line"], re.IGNORECASE),
+            total=re.compile(d["total"], flags),
+            defaults=d.get("defaults", {}),
+            min_fingerprint_score=float(d.get("min_fingerprint_score", 0.6)),
+            total_tolerance=float(d.get("total_tolerance", 1.0)),
+        )
+
+    def matches_domain(self, sender: Optional[str]) -> bool:
+        domain = (sender or "").rsplit("@", 1)[-1].lower()
+        return bool(domain) and any(domain == d or domain.endswith("." + d) for d in self.sender_domains)
+
+    def fingerprint_score(self, lines: List[str]) -> float:
+        if not self.fingerprints:
+            return 0.0
+        found = sum(1 for fp in self.fingerprints if any(fp in line for line in lines))
+        return found / len(self.fingerprints)
+
+
+class ProviderTemplateRegistry:
+    """
+    Recognises known provider layouts and extracts claim fields from their
+    anchors without an LLM call. Keeps hit/miss counters for reporting.
+    """
+
+    def __init__(self, path: str = PROVIDER_LAYOUTS_PATH):
+        self.path = path
+        self.templates: List[ProviderTemplate] = self._load(path)
+        self._lock = threading.Lock()
+        self.counters = {"attempts": 0, "hits": 0, "no_match": 0, "validation_failed": 0}
+
+    @staticmethod
+    def _load(path: str) -> List[ProviderTemplate]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            logger.info("No provider layouts at %s; template extraction disabled", path)
+            return []
+        templates = [ProviderTemplate.from_dict(t) for t in raw.get("templates", [])]
+        logger.info("Loaded %d provider layout templates", len(templates))
+        return templates
+
+    def match(self, sender: Optional[str], text: str) -> Optional[Tuple[ProviderTemplate, float]]:
+        """Return the best matching template and its fingerprint score, if any."""
+        if not self.templates or not text:
+            return None
+        lines = [_norm_line(line) for line in text.splitlines() if line.strip()]
+        best: Optional[Tuple[ProviderTemplate, float]] = None
+        for tpl in self.templates:
+            score = tpl.fingerprint_score(lines)
+            # Forwarded emails lose the provider domain, so demand every fingerprint then.
+            threshold = tpl.min_fingerprint_score if tpl.matches_domain(sender) else 1.0
+            if score >= threshold and (best is None or score > best[1]):
+                best = (tpl, score)
+        return best
+
+    def extract(self, sender: Optional[str], text: str) -> Optional[Dict[str, Any]]:
+        """
+        Extract claim data using a matching layout. Returns None when no
+        layout matches or the extracted values fail validation.
+        """
+        matched = self.match(sender, text)
+        if matched is None:
+            self._count("no_match")
+            return None
+
+        tpl, score = matched
+        data = self._apply(tpl, text)
+        problem = self._validate(tpl, data)
+        if problem:
+            logger.info("Template %s matched (score=%.2f) but failed validation: %s", tpl.name, score, problem)
+            self._count("validation_failed")
+            return None
+
+        self._count("hits")
+        logger.info("Template %s extracted claim (score=%.2f, hit rate %.1f%%)", tpl.name, score, self.hit_rate * 100)
+        return data
+
+    def _apply(self, tpl: ProviderTemplate, text: str) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"provider_name": tpl.provider_name, "template": tpl.name}
+        for key, pattern in tpl.fields.items():
+            m = pattern.search(text)
+            if m:
+                data[key] = m.group("value").strip()
+
+        items: List[Dict[str, Any]] = []
+        start = tpl.item_start.search(text)
+        if start:
+            end = tpl.item_end.search(text, start.end())
+            block = text[start.end(): end.start() if end else len(text)]
+            for line in block.splitlines():
+                m = tpl.item_line.match(line.strip())
+                if not m:
+                    continue
+                cost = Normalizers.parse_amount(m.group("cost"))
+                if cost is not None:
+                    items.append({"item": m.group("item").strip(), "cost": cost})
+        data["claim_details"] = items
+
+        total = tpl.total.search(text)
+        data["invoiced_amount"] = Normalizers.parse_amount(total.group("value")) if total else None
+        for key, value in tpl.defaults.items():
+            data.setdefault(key, value)
+        return data
+
+    @staticmethod
+    def _validate(tpl: ProviderTemplate, data: Dict[str, Any]) -> Optional[str]:
+        member_number = data.get("member_number") or ""
+        if not MemberNumberExtractor.TOKEN_RE.fullmatch(member_number):
+            return f"invalid member number {member_number!r}"
+        if not data.get("member_name"):
+            return "missing member name"
+        if not data["claim_details"]:
+            return "no line items"
+        if data["invoiced_amount"] is None:
+            return "missing total"
+        items_sum = sum(c["cost"] for c in data["claim_details"])
+        if abs(items_sum - data["invoiced_amount"]) > tpl.total_tolerance:
+            return f"line items sum {items_sum:.2f} != total {data['invoiced_amount']:.2f}"
+        return None
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self.counters["attempts"] += 1
+            self.counters[outcome] += 1
+
+    @property
+    def hit_rate(self) -> float:
+        attempts = self.counters["attempts"]
+        return self.counters["hits"] / attempts if attempts else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.counters, "hit_rate": self.hit_rate, "templates": len(self.templates)}
@@ -2,6 +2,7 @@
 import os, logging
 from extractors.prompts.notification_prompt import SimplificationPrompt
 from bedrock_llms.base import BaseLLMClient
+from bedrock_llms.messages import cacheable_block
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +27,7 @@ class ErrorSimplifier:
     def simplify(self, raw_error: str) -> dict:
         try:
             messages = [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": [cacheable_block(system_prompt)]},
                 {"role": "user", "content": self.simplify_prompt.build_prompt(ERROR_MESSAGE=raw_error)}
             ]
             response = self.llm_client.chat_completion(messages)
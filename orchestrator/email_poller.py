@@ -3,7 +3,9 @@ Email Poller Service using Microsoft Graph API (App-Only)
 
 Connects to a Microsoft 365 account via Graph API using client credentials,
 fetches unread emails for a specific user, cleans HTML email body using BeautifulSoup,
-processes attachments, uploads them to S3, passes data to pipeline, and marks emails as read.
+processes attachments, uploads them to S3 and queues each email in a durable work
+queue. Workers run the pipeline on queued emails and mark an email as read only once
+its claim has been processed, so a crash or deploy mid-pipeline loses nothing.
 """
 
 import os
@@ -11,7 +13,7 @@ import asyncio
 import logging
 import uuid
 import mimetypes
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import boto3
 import requests
@@ -19,7 +21,9 @@ from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
 from .config import ATTACHMENT_BUCKET
+from .work_queue import DEAD, DONE, WORK_QUEUE_WORKERS, WorkItem, WorkQueue
 from agent.langchain_agent import ClaimPipeline
+from rag.rag_client import RAGRunner
 from orchestrator.notification_service import GraphNotificationService
 from bedrock_llms.client import BedrockLLMClient
 from msal import ConfidentialClientApplication
@@ -165,9 +169,7 @@ class EmailProcessor:
                 "media_type": media_type or "application/octet-stream"
             })
 
-        # Mark email as read after processing
-        self.graph_client.mark_as_read(email_json["id"])
-
+        # Not marked as read here: that happens once the pipeline has processed the claim.
         return {
             "subject": subject,
             "from": sender,
@@ -180,8 +182,15 @@ class EmailProcessor:
 
 # ------------------------- Email Polling Service ------------------------- #
 class EmailPollingService:
-    def __init__(self, poll_interval: int = 10):
+    def __init__(
+        self,
+        poll_interval: int = 10,
+        rag_runner: Optional[RAGRunner] = None,
+        queue: Optional[WorkQueue] = None,
+        workers: int = WORK_QUEUE_WORKERS,
+    ):
         self.poll_interval = poll_interval
+        self.workers = workers
 
         if not ATTACHMENT_BUCKET:
             raise ValueError("ATTACHMENT_BUCKET environment variable must be set")
@@ -211,54 +220,137 @@ class EmailPollingService:
 
         self.s3_uploader = S3Uploader(ATTACHMENT_BUCKET)
         self.processor = EmailProcessor(self.s3_uploader, self.graph_client)
-        self.pipeline = ClaimPipeline(ocr_bucket=ATTACHMENT_BUCKET)
-
-    async def run(self) -> None:
+        # Share the server's RAG runner (and its index) instead of building a second one.
+        self.pipeline = ClaimPipeline(ocr_bucket=ATTACHMENT_BUCKET, rag_runner=rag_runner)
+        self.queue = queue or WorkQueue()
+
+    def enqueue_email(self, msg: Dict[str, Any]) -> bool:
+        """Upload attachments and queue an unread email; False if it is already known."""
+        email_id = msg["id"]
+        status = self.queue.status(email_id)
+        if status in (DONE, DEAD):
+            # Finished earlier, but marking it as read did not go through.
+            self.graph_client.mark_as_read(email_id)
+            return False
+        if status is not None:
+            return False
+        email_data = self.processor.process_email(msg)
+        queued = self.queue.enqueue(email_id, email_data)
+        if queued:
+            logger.info(f"Queued email from: {email_data['from']} with subject: {email_data['subject']}")
+        return queued
+
+    async def _keep_leased(self, item: WorkItem) -> None:
+        """Extend the lease while the pipeline is still working on the item."""
         while True:
-            logger.info("Polling for new emails...")
-            emails = self.graph_client.fetch_unread_emails()
+            await asyncio.sleep(self.queue.visibility_secs / 3)
+            if not await asyncio.to_thread(self.queue.extend, item):
+                logger.warning(f"Lost the lease on email {item.dedupe_key}")
+                return
+
+    async def process_item(self, item: WorkItem) -> None:
+        email_data = item.payload
+        subject = email_data["subject"]
+        received_time = email_data.get("received_time")
+        logger.info(f"Processing email from: {email_data['from']} with subject: {subject} (attempt {item.attempts})")
+
+        heartbeat = asyncio.create_task(self._keep_leased(item))
+        try:
+            result = await asyncio.to_thread(
+                self.pipeline.run,
+                subject=subject,
+                body=email_data["body"],
+                attachment_keys=[att["s3_key"] for att in email_data["attachments"]],
+                sender=email_data["from"],
+                received_time=received_time,
+                email_id=email_data["email_id"]
+            )
+        except Exception as e:
+            logger.error(f"Pipeline processing failed: {e}")
+            # Retried with backoff; the sender only hears about it once retries run out.
+            if await asyncio.to_thread(self.queue.fail, item, str(e)) == DEAD:
+                await self.notify_dead_letters()
+            return
+        finally:
+            heartbeat.cancel()
+
+        logger.info(f"Pipeline result: {result}")
+        pipeline_success = result.get("payload", {}).get("PipelineSuccess", 1)
+        if pipeline_success == 0:
+            # A processed claim with a reported error is final, not retried.
+            error_details = result.get("payload", {}).get("ProcessingError", "Unknown error")
+            logger.warning(f"Pipeline failed for email '{subject}': {error_details}")
+            await self.notifier.notify_failure(
+                sender=email_data["from"],
+                subject=subject,
+                received_time=received_time or "Unknown",
+                error_details=error_details,
+            )
+
+        if await asyncio.to_thread(self.queue.complete, item):
+            self.graph_client.mark_as_read(item.dedupe_key)
+        else:
+            logger.warning(f"Lease on email {item.dedupe_key} expired before completion; it will be redelivered")
+
+    async def notify_dead_letters(self) -> None:
+        """Tell senders about emails that ran out of attempts, including ones whose lease expired on the last."""
+        for dead in await asyncio.to_thread(self.queue.claim_dead_letters):
+            email_data = dead.payload
+            try:
+                await self.notifier.notify_failure(
+                    sender=email_data["from"],
+                    subject=email_data["subject"],
+                    received_time=email_data.get("received_time") or "Unknown",
+                    error_details=dead.last_error or "Unknown error",
+                )
+            except Exception as e:
+                logger.error(f"Failed to send the failure notification for email {dead.dedupe_key}: {e}")
+                await asyncio.to_thread(self.queue.unclaim_dead_letter, dead.dedupe_key)
+                continue
+            self.graph_client.mark_as_read(dead.dedupe_key)
 
-            for msg in emails:
-                email_data = self.processor.process_email(msg)
-                logger.info(f"Processing email from: {email_data['from']} with subject: {email_data['subject']}")
+    async def worker(self, n: int) -> None:
+        while True:
+            try:
+                item = await asyncio.to_thread(self.queue.lease)
+            except Exception as e:
+                logger.error(f"Worker {n} failed to lease work: {e}")
+                item = None
+            if item is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.process_item(item)
+            except Exception as e:
+                # The lease expires and the item is redelivered.
+                logger.error(f"Worker {n} failed on email {item.dedupe_key}: {e}")
 
-                subject = email_data["subject"]
-                body = email_data["body"]
-                attachment_keys = [att["s3_key"] for att in email_data["attachments"]]
-                received_time = email_data.get("received_time")
+    async def run(self) -> None:
+        workers = [asyncio.create_task(self.worker(n)) for n in range(self.workers)]
+        try:
+            while True:
+                logger.info("Polling for new emails...")
+                emails = self.graph_client.fetch_unread_emails()
+
+                for msg in emails:
+                    try:
+                        # Attachment uploads and queue writes block; keep them off the event loop.
+                        await asyncio.to_thread(self.enqueue_email, msg)
+                    except Exception as e:
+                        # Still unread, so the next poll picks it up again.
+                        logger.error(f"Failed to queue email {msg.get('id')}: {e}")
 
                 try:
-                    result = self.pipeline.run(
-                        subject=subject,
-                        body=body,
-                        attachment_keys=attachment_keys,
-                        sender=email_data["from"],
-                        received_time=received_time,
-                        email_id=email_data["email_id"]
-                    )
-                    logger.info(f"Pipeline result: {result}")
-
-                    pipeline_success = result.get("payload", {}).get("PipelineSuccess", 1)
-                    if pipeline_success == 0:
-                        error_details = result.get("payload", {}).get("ProcessingError", "Unknown error")
-                        logger.warning(f"Pipeline failed for email '{subject}': {error_details}")
-                        await self.notifier.notify_failure(
-                            sender=email_data["from"],
-                            subject=subject,
-                            received_time=received_time or "Unknown",
-                            error_details=error_details,
-                        )
-
+                    await self.notify_dead_letters()
+                    await asyncio.to_thread(self.queue.purge_done)
                 except Exception as e:
-                    logger.error(f"Pipeline processing failed: {e}")
-                    await self.notifier.notify_failure(
-                        sender=email_data["from"],
-                        subject=subject,
-                        received_time=received_time or "Unknown",
-                        error_details=str(e),
-                    )
-
-            await asyncio.sleep(self.poll_interval)
+                    logger.error(f"Work queue housekeeping failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            for task in workers:
+                task.cancel()
+            # The queue may be closed once run() returns, so workers must be gone by then.
+            await asyncio.gather(*workers, return_exceptions=True)
 
 
 if __name__ == "__main__":
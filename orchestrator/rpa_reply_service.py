@@ -5,6 +5,7 @@ import logging
 import requests
 from .rpa_client import RPAClient
 from bedrock_llms.client import BedrockLLMClient
+from bedrock_llms.messages import cacheable_block
 from orchestrator.email_poller import GraphEmailClient
 from stores.redis import AsyncRedisCache
 
@@ -69,7 +70,7 @@ class RPAReplyService:
                         rpa_result=json.dumps(parsed_output, indent=2)
                     )
                     messages = [
-                        {"role": "system", "content": self.system_prompt},
+                        {"role": "system", "content": [cacheable_block(self.system_prompt)]},
                         {"role": "user", "content": user_prompt},
                     ]
 
@@ -0,0 +1,342 @@
+"""
+Durable SQLite work queue between email intake and ClaimPipeline.
+
+Intake enqueues one item per email (deduplicated by email id); workers
+lease items with a visibility timeout, so an item whose worker crashed or
+was redeployed mid-pipeline becomes visible again once its lease expires.
+Failed items are retried with exponential backoff and moved to a
+dead-letter table after max_attempts. Processing is at-least-once.
+Dead letters are claimed once for notifying the sender, however they
+got there (a failed final attempt or a lease that expired on it).
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WORK_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", ".work_queue/claims.sqlite")
+# A lease not completed, failed or extended within this long is handed to another worker.
+WORK_QUEUE_VISIBILITY_SECS = float(os.getenv("WORK_QUEUE_VISIBILITY_SECS", "600"))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "5"))
+# Retry n waits backoff * 2^(n-1) seconds.
+WORK_QUEUE_RETRY_BACKOFF_SECS = float(os.getenv("WORK_QUEUE_RETRY_BACKOFF_SECS", "30"))
+# Completed items are kept this long so redelivered emails are recognised as done.
+WORK_QUEUE_DONE_RETENTION_DAYS = float(os.getenv("WORK_QUEUE_DONE_RETENTION_DAYS", "14"))
+WORK_QUEUE_WORKERS = int(os.getenv("WORK_QUEUE_WORKERS", "1"))
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+
+@dataclass
+class WorkItem:
+    id: int
+    dedupe_key: str
+    payload: Dict[str, Any]
+    attempts: int
+    lease_token: str
+    enqueued_at: float
+
+
+@dataclass
+class DeadLetter:
+    dedupe_key: str
+    payload: Dict[str, Any]
+    attempts: int
+    last_error: Optional[str]
+    failed_at: float
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue; safe to share between threads and between processes
+    on the same host. Each thread gets its own connection, and state changes
+    run in BEGIN IMMEDIATE transactions so two workers never lease the same
+    item. Completing or failing an item checks the lease token, so a worker
+    whose lease expired cannot overwrite the newer holder's outcome.
+    """
+
+    def __init__(
+        self,
+        path: str = WORK_QUEUE_PATH,
+        visibility_secs: float = WORK_QUEUE_VISIBILITY_SECS,
+        max_attempts: int = WORK_QUEUE_MAX_ATTEMPTS,
+        retry_backoff_secs: float = WORK_QUEUE_RETRY_BACKOFF_SECS,
+        busy_timeout_ms: int = 5000,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.visibility_secs = visibility_secs
+        self.max_attempts = max_attempts
+        self.retry_backoff_secs = retry_backoff_secs
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._conn_lock = threading.Lock()
+        self._create_tables()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly by _tx.
+            conn = sqlite3.connect(
+                str(self.path), timeout=self.busy_timeout_ms / 1000, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Claims must survive power loss, not just a process crash.
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+            with self._conn_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._conn_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _create_tables(self) -> None:
+        with self._tx() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS work_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedupe_key TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    lease_token TEXT,
+                    leased_until REAL,
+                    last_error TEXT,
+                    enqueued_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS work_items_ready ON work_items(status, available_at)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY,
+                    dedupe_key TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    enqueued_at REAL NOT NULL,
+                    failed_at REAL NOT NULL,
+                    notified_at REAL
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(dead_letters)")}
+            if "notified_at" not in columns:
+                # Items dead-lettered before the column existed were notified (or not) back then.
+                conn.execute("ALTER TABLE dead_letters ADD COLUMN notified_at REAL")
+                conn.execute("UPDATE dead_letters SET notified_at = failed_at")
+
+    # ---------------- Producer side ----------------
+    def enqueue(self, dedupe_key: str, payload: Dict[str, Any]) -> bool:
+        """Add an item; False if the key is already queued, done or dead-lettered."""
+        now = time.time()
+        with self._tx() as conn:
+            if conn.execute("SELECT 1 FROM dead_letters WHERE dedupe_key = ?", (dedupe_key,)).fetchone():
+                return False
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO work_items(dedupe_key, payload, status, available_at, enqueued_at, updated_at) "
+                "VALUES(?,?,?,?,?,?)",
+                (dedupe_key, json.dumps(payload), PENDING, now, now, now),
+            )
+            return cur.rowcount == 1
+
+    def status(self, dedupe_key: str) -> Optional[str]:
+        """pending | leased | done | dead, or None if the key was never enqueued."""
+        row = self.conn.execute("SELECT status FROM work_items WHERE dedupe_key = ?", (dedupe_key,)).fetchone()
+        if row:
+            return row[0]
+        if self.conn.execute("SELECT 1 FROM dead_letters WHERE dedupe_key = ?", (dedupe_key,)).fetchone():
+            return DEAD
+        return None
+
+    # ---------------- Consumer side ----------------
+    def lease(self) -> Optional[WorkItem]:
+        """
+        Lease the oldest ready item: pending and due, or leased with an
+        expired lease. An item whose lease expired on its last allowed
+        attempt (e.g. it crashes the worker every time) is dead-lettered.
+        """
+        while True:
+            now = time.time()
+            with self._tx() as conn:
+                row = conn.execute(
+                    "SELECT id, dedupe_key, payload, status, attempts, enqueued_at FROM work_items "
+                    "WHERE (status = ? AND available_at <= ?) OR (status = ? AND leased_until <= ?) "
+                    "ORDER BY available_at, id LIMIT 1",
+                    (PENDING, now, LEASED, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                item_id, key, payload, status, attempts, enqueued_at = row
+                if status == LEASED and attempts >= self.max_attempts:
+                    self._dead_letter(conn, item_id, "lease expired on final attempt")
+                    continue
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE work_items SET status = ?, attempts = attempts + 1, lease_token = ?, leased_until = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (LEASED, token, now + self.visibility_secs, now, item_id),
+                )
+            if status == LEASED:
+                logger.warning("Lease on work item %s expired; redelivering (attempt %d)", key, attempts + 1)
+            return WorkItem(item_id, key, json.loads(payload), attempts + 1, token, enqueued_at)
+
+    def extend(self, item: WorkItem, secs: Optional[float] = None) -> bool:
+        """Push the lease deadline out; False if the lease has been lost."""
+        now = time.time()
+        with self._tx() as conn:
+            cur = conn.execute(
+                "UPDATE work_items SET leased_until = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_token = ?",
+                (now + (secs or self.visibility_secs), now, item.id, LEASED, item.lease_token),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, item: WorkItem) -> bool:
+        now = time.time()
+        with self._tx() as conn:
+            cur = conn.execute(
+                "UPDATE work_items SET status = ?, lease_token = NULL, leased_until = NULL, last_error = NULL, "
+                "updated_at = ? WHERE id = ? AND status = ? AND lease_token = ?",
+                (DONE, now, item.id, LEASED, item.lease_token),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, item: WorkItem, error: str) -> Optional[str]:
+        """
+        Record a failed attempt: schedule a retry with backoff, or dead-letter
+        the item once max_attempts is reached. Returns the new status, or
+        None if the lease had already been lost.
+        """
+        now = time.time()
+        with self._tx() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM work_items WHERE id = ? AND status = ? AND lease_token = ?",
+                (item.id, LEASED, item.lease_token),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] >= self.max_attempts:
+                self._dead_letter(conn, item.id, error)
+                return DEAD
+            delay = self.retry_backoff_secs * 2 ** (row[0] - 1)
+            conn.execute(
+                "UPDATE work_items SET status = ?, available_at = ?, lease_token = NULL, leased_until = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (PENDING, now + delay, error, now, item.id),
+            )
+        logger.warning("Work item %s failed (attempt %d), retrying in %.0fs: %s", item.dedupe_key, row[0], delay, error)
+        return PENDING
+
+    def _dead_letter(self, conn: sqlite3.Connection, item_id: int, error: str) -> None:
+        key = conn.execute("SELECT dedupe_key FROM work_items WHERE id = ?", (item_id,)).fetchone()[0]
+        conn.execute(
+            "INSERT OR REPLACE INTO dead_letters(id, dedupe_key, payload, attempts, last_error, enqueued_at, failed_at) "
+            "SELECT id, dedupe_key, payload, attempts, ?, enqueued_at, ? FROM work_items WHERE id = ?",
+            (error, time.time(), item_id),
+        )
+        conn.execute("DELETE FROM work_items WHERE id = ?", (item_id,))
+        logger.error("Work item %s moved to dead letters: %s", key, error)
+
+    def claim_dead_letters(self, limit: int = 50) -> List[DeadLetter]:
+        """Dead letters nobody has been notified about yet, marked as notified in the same transaction."""
+        now = time.time()
+        with self._tx() as conn:
+            rows = conn.execute(
+                "SELECT dedupe_key, payload, attempts, last_error, failed_at FROM dead_letters "
+                "WHERE notified_at IS NULL ORDER BY failed_at LIMIT ?",
+                (limit,),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE dead_letters SET notified_at = ? WHERE dedupe_key = ?", [(now, row[0]) for row in rows]
+            )
+        return [DeadLetter(key, json.loads(payload), attempts, error, failed_at)
+                for key, payload, attempts, error, failed_at in rows]
+
+    def unclaim_dead_letter(self, dedupe_key: str) -> None:
+        """Hand a claimed dead letter back, e.g. when sending the notification failed."""
+        with self._tx() as conn:
+            conn.execute("UPDATE dead_letters SET notified_at = NULL WHERE dedupe_key = ?", (dedupe_key,))
+
+    # ---------------- Operations ----------------
+    def requeue_dead(self, dedupe_key: str) -> bool:
+        """Move a dead-lettered item back to the queue with a fresh attempt count."""
+        now = time.time()
+        with self._tx() as conn:
+            row = conn.execute(
+                "SELECT payload, enqueued_at FROM dead_letters WHERE dedupe_key = ?", (dedupe_key,)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM dead_letters WHERE dedupe_key = ?", (dedupe_key,))
+            conn.execute(
+                "INSERT INTO work_items(dedupe_key, payload, status, available_at, enqueued_at, updated_at) "
+                "VALUES(?,?,?,?,?,?)",
+                (dedupe_key, row[0], PENDING, now, row[1], now),
+            )
+        return True
+
+    def purge_done(self, older_than_days: float = WORK_QUEUE_DONE_RETENTION_DAYS) -> int:
+        cutoff = time.time() - older_than_days * 86400
+        with self._tx() as conn:
+            return conn.execute(
+                "DELETE FROM work_items WHERE status = ? AND updated_at < ?", (DONE, cutoff)
+            ).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and age, for deciding how many workers to run."""
+        now = time.time()
+        conn = self.conn
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM work_items GROUP BY status").fetchall())
+        ready = conn.execute(
+            "SELECT COUNT(*) FROM work_items WHERE (status = ? AND available_at <= ?) OR (status = ? AND leased_until <= ?)",
+            (PENDING, now, LEASED, now),
+        ).fetchone()[0]
+        oldest = conn.execute(
+            "SELECT MIN(enqueued_at) FROM work_items WHERE status IN (?, ?)", (PENDING, LEASED)
+        ).fetchone()[0]
+        dead = conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return {
+            "depth": counts.get(PENDING, 0) + counts.get(LEASED, 0),
+            "pending": counts.get(PENDING, 0),
+            "ready": ready,
+            "in_flight": counts.get(LEASED, 0),
+            "done": counts.get(DONE, 0),
+            "dead_letters": dead,
+            "oldest_age_secs": round(now - oldest, 1) if oldest else 0.0,
+        }
@@ -0,0 +1,26 @@
+from typing import Any, Dict, List, Sequence
+
+# Standard RRF damping constant; larger values flatten the rank weighting.
+RRF_K = 60
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    """Identity of a retrieved chunk across result lists."""
+    meta = result.get("metadata") or {}
+    return meta.get("content_hash") or result.get("content", "")
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[Dict[str, Any]]], k: int, c: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists by summing 1 / (c + rank). Each fused result
+    keeps its first-seen fields and gets the fused value in "rrf_score".
+    """
+    scores: Dict[str, float] = {}
+    first: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, r in enumerate(results, 1):
+            key = result_key(r)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (c + rank)
+            first.setdefault(key, r)
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+    return [{**first[key], "rrf_score": scores[key]} for key in ranked]
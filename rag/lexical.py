@@ -0,0 +1,159 @@
+import os
+import re
+import math
+import heapq
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from stores.base import VectorStore, chunk_key
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = float(os.getenv("RAG_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("RAG_BM25_B", "0.75"))
+
+# Codes such as J45.9, 99213, KES-25,000 or A/B-12 stay whole; their parts are indexed too.
+_TOKEN_RE = re.compile(r"\w+(?:[-./,]\w+)*")
+_PART_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for m in _TOKEN_RE.finditer(text.lower()):
+        token = m.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_PART_RE.findall(token))
+    return tokens
+
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over stored chunks, keyed by store id.
+
+    Postings are term -> {id: tf}. Per-document term counts are not kept:
+    a removed chunk's content is read back from the store and re-tokenized
+    to find its postings. Chunks are also indexed by (source, content_hash)
+    so deletions from the vector store can be mirrored; they must be removed
+    here before they are deleted from the store.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_len: Dict[int, int] = {}
+        self._total_len = 0
+        self._by_key: Dict[Tuple[str, str], int] = {}
+        self._by_source: Dict[str, Set[int]] = {}
+        self._key_of: Dict[int, Tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def add(self, docs: Iterable[Tuple[int, str, Optional[Dict[str, Any]]]]) -> None:
+        """Index (id, content, metadata) rows; re-adding an id replaces it."""
+        with self._lock:
+            for doc_id, content, meta in docs:
+                doc_id = int(doc_id)
+                key = chunk_key(content, meta)
+                if doc_id in self._doc_len:
+                    if self._key_of[doc_id] == key:
+                        continue
+                    self._remove_ids({doc_id: None})
+                terms: Dict[str, int] = {}
+                for token in tokenize(content):
+                    terms[token] = terms.get(token, 0) + 1
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+                length = sum(terms.values())
+                self._doc_len[doc_id] = length
+                self._total_len += length
+                self._by_key[key] = doc_id
+                self._key_of[doc_id] = key
+                self._by_source.setdefault(key[0], set()).add(doc_id)
+
+    def _remove_ids(self, contents: Dict[int, Optional[str]]) -> None:
+        """Remove documents given id -> content; without the content every posting is scanned."""
+        for doc_id, content in contents.items():
+            if doc_id not in self._doc_len:
+                continue
+            terms = set(tokenize(content)) if content is not None else list(self._postings)
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is not None and posting.pop(doc_id, None) is not None and not posting:
+                    del self._postings[term]
+            self._total_len -= self._doc_len.pop(doc_id)
+            key = self._key_of.pop(doc_id)
+            if self._by_key.get(key) == doc_id:
+                del self._by_key[key]
+            source_ids = self._by_source.get(key[0])
+            if source_ids is not None:
+                source_ids.discard(doc_id)
+                if not source_ids:
+                    del self._by_source[key[0]]
+
+    def _remove_stored(self, ids: List[int], store: VectorStore) -> None:
+        contents: Dict[int, Optional[str]] = {doc_id: None for doc_id in ids}
+        for doc in store.get(ids):
+            contents[doc["id"]] = doc["content"]
+        self._remove_ids(contents)
+
+    def delete_by_source(self, source: str, store: VectorStore) -> None:
+        """Remove a source's chunks; store must still hold them."""
+        with self._lock:
+            self._remove_stored(list(self._by_source.get(source or "", ())), store)
+
+    def delete_chunks(self, source: str, content_hashes: Iterable[str], store: VectorStore) -> None:
+        """Remove specific chunks of a source; store must still hold them."""
+        with self._lock:
+            ids = [self._by_key[(source or "", h)] for h in content_hashes if (source or "", h) in self._by_key]
+            self._remove_stored(ids, store)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def build(self, store: VectorStore, batch_size: int = 1000) -> int:
+        """Index every chunk currently in the store; returns the number indexed."""
+        n = 0
+        for rows in store.iter_documents(batch_size):
+            self.add(rows)
+            n += len(rows)
+        return n
+
+    def search(self, query: str, k: int) -> Tuple[List[Tuple[int, float]], float]:
+        """
+        Top-k (id, score) by BM25, plus the query's ideal score (every term
+        matched once in a document of average length) for judging strength.
+        Terms missing from the index count at the highest possible idf, so a
+        query only looks strong if most of it actually matched.
+        """
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return [], 0.0
+            avgdl = self._total_len / n_docs
+            scores: Dict[int, float] = {}
+            ideal = 0.0
+            max_idf = math.log(1 + (n_docs + 0.5) / 0.5)
+            for term in set(tokenize(query)):
+                posting = self._postings.get(term)
+                if not posting:
+                    ideal += max_idf
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                ideal += idf
+                for doc_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1]), ideal
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"docs": len(self._doc_len), "terms": len(self._postings)}
@@ -0,0 +1,109 @@
+import os
+import re
+import logging
+from typing import List, Optional
+
+from extractors.utils.entity_scanner import EntityScanner
+
+logger = logging.getLogger(__name__)
+
+RAG_QUERY_MODE = os.getenv("RAG_QUERY_MODE", "compact")  # compact | split
+RAG_QUERY_MAX_CHARS = int(os.getenv("RAG_QUERY_MAX_CHARS", "2000"))
+RAG_MAX_SUBQUERIES = int(os.getenv("RAG_MAX_SUBQUERIES", "4"))
+
+# Lines that say what was done or which benefit applies; these are what the
+# knowledge base (policies, benefit tables, tariffs) is about.
+KEY_LINE_RE = re.compile(
+    r"\b(?:diagnos\w*|procedure|treatment|services?|benefits?|consultation|admission|admitted|"
+    r"in-?patient|out-?patient|dental|optical|maternity|chronic|lab(?:oratory)?|radiology|x-?ray|"
+    r"scan|pharmacy|prescription|drugs?|pre-?auth\w*|scheme|cover(?:age)?|policy|exclusions?|limit)\b",
+    re.IGNORECASE,
+)
+_WS = re.compile(r"[ \t]+")
+_MAX_LINE = 200
+
+
+def _clean_lines(text: str) -> List[str]:
+    return [_WS.sub(" ", line).strip() for line in text.splitlines() if line.strip()]
+
+
+class QueryBuilder:
+    """
+    Turns a claim (subject, email body, OCR text) into bounded retrieval queries.
+
+    compact: one query from the subject, scheme, line items and key lines.
+    split: the raw text cut into up to max_subqueries windows, for rank fusion.
+    Every query is at most max_chars long.
+    """
+
+    def __init__(
+        self,
+        mode: str = RAG_QUERY_MODE,
+        max_chars: int = RAG_QUERY_MAX_CHARS,
+        max_subqueries: int = RAG_MAX_SUBQUERIES,
+        scanner: Optional[EntityScanner] = None,
+    ):
+        if mode not in ("compact", "split"):
+            raise ValueError(f"Unsupported query mode {mode!r}")
+        self.mode = mode
+        self.max_chars = max(1, max_chars)
+        self.max_subqueries = max(1, max_subqueries)
+        self.scanner = scanner or EntityScanner()
+
+    def build(self, subject: str, body: str, text: str) -> List[str]:
+        queries = self.compact(subject, body, text) if self.mode == "compact" else self.split(f"{text}\n\n{body}")
+        queries = [q for q in queries if q.strip()]
+        logger.debug("Built %d retrieval queries (%s)", len(queries), [len(q) for q in queries])
+        return queries
+
+    def compact(self, subject: str, body: str, text: str) -> List[str]:
+        scan = self.scanner.scan(subject, body, text)
+        parts: List[str] = []
+        if subject.strip():
+            parts.append(subject.strip())
+        if scan.scheme_name:
+            parts.append(f"Scheme: {scan.scheme_name}")
+        items = list(dict.fromkeys(d["item"] for d in scan.claim_details))
+        if items:
+            parts.append("Services: " + "; ".join(items))
+        parts.extend(
+            line[:_MAX_LINE] for line in dict.fromkeys(_clean_lines(f"{text}\n{body}")) if KEY_LINE_RE.search(line)
+        )
+
+        query = self._fit(list(dict.fromkeys(parts)))
+        if not query:
+            # Nothing salient found; fall back to the start of the document.
+            return self.split(f"{text}\n\n{body}")[:1]
+        return [query]
+
+    def split(self, text: str) -> List[str]:
+        """Line-aligned windows of at most max_chars, sampled evenly across the text."""
+        windows: List[str] = []
+        current: List[str] = []
+        size = 0
+        for line in _clean_lines(text):
+            line = line[:self.max_chars]
+            if current and size + len(line) + 1 > self.max_chars:
+                windows.append("\n".join(current))
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            windows.append("\n".join(current))
+
+        if len(windows) <= self.max_subqueries:
+            return windows
+        step = len(windows) / self.max_subqueries
+        return [windows[int(i * step)] for i in range(self.max_subqueries)]
+
+    def _fit(self, parts: List[str]) -> str:
+        out: List[str] = []
+        size = 0
+        for part in parts:
+            if size + len(part) + 1 > self.max_chars:
+                if not out:
+                    out.append(part[:self.max_chars])
+                break
+            out.append(part)
+            size += len(part) + 1
+        return "\n".join(out)
@@ -1,16 +1,30 @@
 import os
+import time
 import logging
+import threading
 from typing import List, Tuple, Optional, Dict, Any
-from dataclasses import dataclass
-from bedrock_llms.embed_client import BedrockEmbedClient
-from stores.pgvector_store import PgVectorStore
-from stores.faiss_store import FaissStore
+from dataclasses import dataclass, field
+from bedrock_llms.embed_client import SEARCH_QUERY, BedrockEmbedClient
+from stores.pgvector_store import PgVectorStore, PgIndexOptions
+from stores.faiss_store import FaissStore, FaissIndexOptions
+from stores.base import VectorStore, dedupe_results
+from stores.snapshot_sync import RAG_SNAPSHOT_ROLE, ROLES, SnapshotPublisher, open_remote
 from bedrock_llms.client import BedrockLLMClient
+from rag.fusion import reciprocal_rank_fusion
+from rag.lexical import BM25Index
+from rag.cache import LRUCache, query_hash, RAG_EMBED_CACHE_SIZE, RAG_RESULT_CACHE_SIZE, RAG_CACHE_TTL
 
 logger = logging.getLogger("ragsvc_runner")
 logger.setLevel(os.environ.get("RAG_LOG_LEVEL", "INFO"))
 
 PG_CONN = os.getenv("RAG_PG_CONN")
+# vector | hybrid (BM25 and vector ranks fused with RRF). Hybrid is opt-in. Its BM25 index lives
+# in this process, so with pgvector it only sees chunks written (or loaded) here: writes from
+# other processes sharing the database appear after the next build_lexical_index().
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "vector")
+# In hybrid mode, answer from BM25 alone (no embedding call) when the top hit scores at least
+# this fraction of the query's ideal BM25 score and there are k hits; 0 (default) disables.
+RAG_LEXICAL_FASTPATH = float(os.getenv("RAG_LEXICAL_FASTPATH", "0"))
 
 
 @dataclass
@@ -18,6 +32,19 @@ class RAGConfig:
     k: int = 5
     embed_dim: int = 1536
     use_faiss_if_no_pg: bool = True
+    # Where FaissStore snapshots are written/loaded; empty disables snapshots.
+    snapshot_dir: Optional[str] = os.getenv("RAG_SNAPSHOT_DIR", ".rag_ingest/faiss_snapshots")
+    faiss: FaissIndexOptions = field(default_factory=FaissIndexOptions)
+    pg: PgIndexOptions = field(default_factory=PgIndexOptions)
+    # SQLite file holding FaissStore chunk text/metadata; ":memory:" keeps it in-process.
+    docstore_path: str = os.getenv("RAG_DOCSTORE_PATH", ".rag_ingest/faiss_docs.sqlite")
+    embed_cache_size: int = RAG_EMBED_CACHE_SIZE
+    result_cache_size: int = RAG_RESULT_CACHE_SIZE
+    cache_ttl: float = RAG_CACHE_TTL
+    # standalone | builder (publish snapshots to RAG_SNAPSHOT_REMOTE) | replica (serve published snapshots)
+    snapshot_role: str = RAG_SNAPSHOT_ROLE
+    retrieval_mode: str = RAG_RETRIEVAL_MODE
+    lexical_fastpath: float = RAG_LEXICAL_FASTPATH
 
 
 class RAGRunner:
@@ -28,42 +55,273 @@ class RAGRunner:
         self.embed_client = BedrockEmbedClient()
         self.llm_client = llm_client or BedrockLLMClient()
         self.config = config or RAGConfig()
+        # Query text hash -> embedding, and (hash, k, index_version) -> results.
+        self.embedding_cache: LRUCache[List[float]] = LRUCache(self.config.embed_cache_size, self.config.cache_ttl)
+        self.result_cache: LRUCache[List[Dict[str, Any]]] = LRUCache(self.config.result_cache_size, self.config.cache_ttl)
+        self.index_version = 0
+        self._version_lock = threading.Lock()
+        if self.config.snapshot_role not in ROLES:
+            raise ValueError(f"Unsupported snapshot role {self.config.snapshot_role!r}; expected one of {ROLES}")
+        self.snapshot_publisher: Optional[SnapshotPublisher] = (
+            SnapshotPublisher(open_remote()) if self.config.snapshot_role == "builder" else None
+        )
+        self._published_version: Optional[str] = None
+        if self.config.retrieval_mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unsupported retrieval mode {self.config.retrieval_mode!r}")
+        # Kept in step with the store by index_vectors/delete_*; filled by build_lexical_index.
+        self.lexical: Optional[BM25Index] = BM25Index() if self.config.retrieval_mode == "hybrid" else None
+        # Query counts by path, guarded by _version_lock like index_version.
+        self.lexical_stats = {"fast_path": 0, "hybrid": 0}
+        # Store replaced by the last swap_store, closed on the next one so in-flight queries can finish.
+        self._retired_store: Optional[VectorStore] = None
 
+        self.store: VectorStore
         if PG_CONN:
             try:
-                self.store = PgVectorStore(PG_CONN)
+                self.store = PgVectorStore(PG_CONN, options=self.config.pg)
                 self.store.ensure_table(dim=self.config.embed_dim)
                 logger.info("Using PgVectorStore for RAG")
             except Exception as e:
                 logger.exception("Failed to init PgVectorStore: %s", e)
                 if self.config.use_faiss_if_no_pg and FaissStore:
-                    self.store = FaissStore(self.config.embed_dim)
+                    self.store = self._make_faiss_store()
                     logger.info("Falling back to FaissStore")
                 else:
                     raise
         else:
             if FaissStore:
-                self.store = FaissStore(self.config.embed_dim)
+                self.store = self._make_faiss_store()
                 logger.info("Using local FaissStore for RAG (PG_CONN not set)")
             else:
                 raise RuntimeError("No vector store available: set RAG_PG_CONN or install faiss")
 
+    def _make_faiss_store(self) -> FaissStore:
+        """Start from the latest snapshot when one exists, else an empty index."""
+        return self.load_faiss_snapshot() or FaissStore(
+            self.config.embed_dim, self.config.faiss, docstore_path=self.config.docstore_path
+        )
+
+    def load_faiss_snapshot(self) -> Optional[FaissStore]:
+        """The CURRENT local snapshot as a FaissStore, or None if absent or incompatible."""
+        docstore_path = self.config.docstore_path
+        if docstore_path != ":memory:":
+            os.makedirs(os.path.dirname(docstore_path) or ".", exist_ok=True)
+        if not self.config.snapshot_dir:
+            return None
+        try:
+            store = FaissStore.load_snapshot(
+                self.config.snapshot_dir, options=self.config.faiss, docstore_path=docstore_path
+            )
+            if store is not None and store.dim == self.config.embed_dim:
+                return store
+            if store is not None:
+                logger.warning("Snapshot dim %d != embed_dim %d; ignoring", store.dim, self.config.embed_dim)
+                store.close()
+        except Exception as e:
+            logger.exception("Failed to load FAISS snapshot: %s", e)
+        return None
+
+    def build_lexical_index(self) -> int:
+        """(Re)build the BM25 index from everything in the store; returns the chunk count."""
+        if self.lexical is None:
+            return 0
+        start = time.time()
+        lexical = BM25Index()
+        n = lexical.build(self.store)
+        self.lexical = lexical
+        logger.info("Built BM25 index over %d chunks in %.2fs", n, time.time() - start)
+        return n
+
+    def swap_store(self, store: VectorStore) -> None:
+        """Atomically replace the serving store (e.g. with a newly published snapshot)."""
+        lexical = None
+        if self.lexical is not None:
+            lexical = BM25Index()
+            lexical.build(store)
+        with self._version_lock:
+            retired, self._retired_store, self.store = self._retired_store, self.store, store
+            if lexical is not None:
+                self.lexical = lexical
+        self.bump_index_version()
+        if retired is not None and hasattr(retired, "close"):
+            retired.close()  # type: ignore[attr-defined]
+
+    def save_snapshot(self) -> Optional[str]:
+        """
+        Persist the in-memory index if the store supports snapshots and it
+        changed; builders also publish it for replicas.
+        """
+        if not self.config.snapshot_dir or not hasattr(self.store, "save_snapshot"):
+            return None
+        version = self.store.save_snapshot(self.config.snapshot_dir)  # type: ignore
+        # Also retries a snapshot whose earlier publish failed.
+        latest = version or getattr(self.store, "version", None)
+        if self.snapshot_publisher and latest and latest != self._published_version:
+            try:
+                self.snapshot_publisher.publish(self.config.snapshot_dir, latest)
+                self._published_version = latest
+            except Exception as e:
+                logger.exception("Failed to publish index snapshot %s: %s", latest, e)
+        return version
+
     def index_documents(self, docs: List[Tuple[str, Optional[Dict[str, Any]]]]) -> List[int]:
-        ids: List[int] = []
-        for content, meta in docs:
-            vec = self.embed_client.embed(content)
-            if isinstance(self.store, PgVectorStore):
-                idx = self.store.add_document(content, vec, meta)
-            else:
-                self.store.add(content, vec, meta)  # type: ignore
-                idx = len(self.store.meta) - 1  # type: ignore
-            ids.append(idx)
-        return ids
+        vectors = self.embed_client.embed_many([content for content, _ in docs])
+        return self.index_vectors(docs, vectors)
+
+    def index_vectors(
+        self,
+        docs: List[Tuple[str, Optional[Dict[str, Any]]]],
+        vectors: List[List[float]],
+    ) -> List[int]:
+        """
+        Upsert already-embedded documents into the store (no Bedrock calls).
+        Chunks already stored for the same source are not added again.
+        """
+        if not docs:
+            return []
+        try:
+            ids = self.store.upsert(docs, vectors)
+            if self.lexical is not None:
+                self.lexical.add((i, content, meta) for i, (content, meta) in zip(ids, docs))
+            return ids
+        finally:
+            self.bump_index_version()
+
+    def delete_source(self, source: str) -> int:
+        """Remove every chunk of a source document from the store."""
+        try:
+            if self.lexical is not None:
+                self.lexical.delete_by_source(source, self.store)
+            return self.store.delete_by_source(source)
+        finally:
+            self.bump_index_version()
+
+    def bump_index_version(self) -> None:
+        """Invalidate cached retrieval results after the index changes."""
+        with self._version_lock:
+            self.index_version += 1
+        self.result_cache.clear()
+
+    def embed_query(self, query_text: str) -> List[float]:
+        key = query_hash(query_text)
+        vec = self.embedding_cache.get(key)
+        if vec is None:
+            vec = self.embed_client.embed(query_text, input_type=SEARCH_QUERY)
+            self.embedding_cache.put(key, vec)
+        return vec
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeddings for queries in order; cache misses are embedded concurrently."""
+        keys = [query_hash(q) for q in queries]
+        vecs: List[Optional[List[float]]] = [self.embedding_cache.get(key) for key in keys]
+        # Embed each distinct uncached query once.
+        pending: Dict[str, int] = {}
+        for i, vec in enumerate(vecs):
+            if vec is None:
+                pending.setdefault(keys[i], i)
+        if pending:
+            texts = [queries[i] for i in pending.values()]
+            embedded = dict(zip(pending, self.embed_client.embed_many(texts, input_type=SEARCH_QUERY)))
+            for key, vec in embedded.items():
+                self.embedding_cache.put(key, vec)
+            vecs = [vec if vec is not None else embedded[key] for vec, key in zip(vecs, keys)]
+        return vecs  # type: ignore[return-value]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._version_lock:
+            lexical_stats = dict(self.lexical_stats)
+        return {
+            "index_version": self.index_version,
+            "store": self.store.stats(),
+            "embeddings": self.embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+            "retrieval_mode": self.config.retrieval_mode,
+            "lexical": {**self.lexical.stats(), **lexical_stats} if self.lexical is not None else None,
+        }
+
+    def delete_chunks(self, source: str, content_hashes: List[str]) -> int:
+        """Remove specific stale chunks of a source document."""
+        if not content_hashes:
+            return 0
+        try:
+            if self.lexical is not None:
+                self.lexical.delete_chunks(source, content_hashes, self.store)
+            return self.store.delete_chunks(source, content_hashes)
+        finally:
+            self.bump_index_version()
 
     def retrieve(self, query_text: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.retrieve_many([query_text], k=k)[0]
+
+    def _lexical_search(self, query_text: str, k: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        BM25 hits as stored chunks, and whether they are strong enough alone.
+        Each hit has "lexical_score" and, like vector results, a "score": the
+        BM25 score relative to the query's ideal score.
+        """
+        lexical = self.lexical
+        if lexical is None:
+            return [], False
+        ranked, ideal = lexical.search(query_text, 2 * k)
+        if not ranked:
+            return [], False
+        scores = dict(ranked)
+        hits = [
+            {**doc, "score": scores[doc["id"]] / ideal if ideal else 0.0, "lexical_score": scores[doc["id"]]}
+            for doc in self.store.get([i for i, _ in ranked])
+        ]
+        hits = dedupe_results(hits, 2 * k)
+        strong = (
+            self.config.lexical_fastpath > 0
+            and len(hits) >= k
+            and ideal > 0
+            and ranked[0][1] / ideal >= self.config.lexical_fastpath
+        )
+        return hits, strong
+
+    def retrieve_many(self, queries: List[str], k: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve for several queries at once: one concurrent embedding pass and
+        one batched store search. Returns one result list per query, in order.
+
+        In hybrid mode BM25 and vector rankings are fused with RRF; queries
+        whose exact-term matches are strong skip the embedding and vector search.
+        """
+        k = k or self.config.k
+        version = self.index_version
+        keys = [(query_hash(q), k, version) for q in queries]
+        results: List[Optional[List[Dict[str, Any]]]] = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        lexical_hits: Dict[int, List[Dict[str, Any]]] = {}
+        if self.lexical is not None:
+            for i in list(missing):
+                hits, strong = self._lexical_search(queries[i], k)
+                if strong:
+                    results[i] = hits[:k]
+                    missing.remove(i)
+                    with self._version_lock:
+                        self.lexical_stats["fast_path"] += 1
+                else:
+                    lexical_hits[i] = hits
+        if missing:
+            vecs = self.embed_queries([queries[i] for i in missing])
+            for i, found in zip(missing, self.store.query_many(vecs, k=k)):
+                if lexical_hits.get(i):
+                    found = reciprocal_rank_fusion([found, lexical_hits[i]], k)
+                    with self._version_lock:
+                        self.lexical_stats["hybrid"] += 1
+                results[i] = found
+        if version == self.index_version:
+            for key, found in zip(keys, results):
+                self.result_cache.put(key, found)  # type: ignore[arg-type]
+        return [[dict(r) for r in found] for found in results]  # type: ignore[union-attr]
+
+    def retrieve_fused(self, queries: List[str], k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Retrieve for each sub-query and merge the rankings with reciprocal rank fusion."""
         k = k or self.config.k
-        qvec = self.embed_client.embed(query_text)
-        return self.store.query(qvec, k=k)  # type: ignore
+        if len(queries) == 1:
+            return self.retrieve(queries[0], k=k)
+        return reciprocal_rank_fusion(self.retrieve_many(queries, k=k), k)
 
     def augment_and_query(
         self,
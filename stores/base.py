@@ -0,0 +1,91 @@
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# (content, metadata) pairs as produced by the ingestor.
+Document = Tuple[str, Optional[Dict[str, Any]]]
+
+
+def chunk_key(content: str, metadata: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+    """(source, content_hash) identifying a chunk; the hash is derived from content if absent."""
+    meta = metadata or {}
+    content_hash = meta.get("content_hash") or hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return meta.get("source") or "", content_hash
+
+
+def dedupe_results(results: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """Keep the best-ranked hit per chunk (content_hash, else content), up to k."""
+    seen: Set[str] = set()
+    out: List[Dict[str, Any]] = []
+    for r in results:
+        key = (r.get("metadata") or {}).get("content_hash") or r.get("content", "")
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(r)
+        if len(out) >= k:
+            break
+    return out
+
+
+class VectorStore(ABC):
+    """
+    Common interface for RAG vector stores. Chunks are identified by
+    (metadata["source"], metadata["content_hash"]); query results never
+    contain the same chunk text twice.
+    """
+
+    # False if contents are lost on restart and must be rebuilt (e.g. from the embed cache).
+    persistent: bool = False
+
+    @abstractmethod
+    def add(self, docs: List[Document], vectors: List[List[float]]) -> List[int]:
+        """Insert a batch of documents; returns their ids in input order."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, docs: List[Document], vectors: List[List[float]]) -> List[int]:
+        """
+        Insert documents whose (source, content_hash) is new and refresh the
+        metadata of those already stored. Returns ids in input order.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_by_source(self, source: str) -> int:
+        """Remove every chunk of a source document; returns the number removed."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_chunks(self, source: str, content_hashes: Iterable[str]) -> int:
+        """Remove specific chunks of a source document; returns the number removed."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, vec: List[float], k: int = 5) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def query_many(self, vecs: List[List[float]], k: int = 5) -> List[List[Dict[str, Any]]]:
+        return [self.query(v, k=k) for v in vecs]
+
+    @abstractmethod
+    def get(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Stored chunks ({"id", "content", "metadata"}) for the given ids, in input order; unknown ids are skipped."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[Tuple[int, str, Dict[str, Any]]]]:
+        """Batches of (id, content, metadata) for every live chunk, e.g. to build side indexes."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of live chunks."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def content_hashes(self) -> Set[str]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"store": type(self).__name__, "persistent": self.persistent, "count": self.count()}
@@ -0,0 +1,149 @@
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+# SQLite's default limit on host parameters is 999 on older builds.
+_IN_CHUNK = 500
+
+
+class SQLiteDocStore:
+    """
+    Chunk text and metadata keyed by vector id. Lives in SQLite (a file or
+    ":memory:") so the serving process holds only ids on the Python heap.
+    """
+
+    def __init__(self, path: str = ":memory:", readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self._create_table()
+        self._lock = threading.Lock()
+
+    def _create_table(self) -> None:
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                content_hash TEXT,
+                source TEXT,
+                content TEXT,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_docs_hash ON docs(content_hash);
+            CREATE INDEX IF NOT EXISTS idx_docs_source ON docs(source);
+            """
+        )
+        self.conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM docs")
+            self.conn.commit()
+
+    def add_many(self, rows: Iterable[Tuple[int, str, Dict[str, Any]]]) -> None:
+        """Insert (id, content, metadata) rows in one transaction."""
+        params = [
+            (doc_id, meta.get("content_hash"), meta.get("source") or "", content, json.dumps(meta))
+            for doc_id, content, meta in rows
+        ]
+        with self._lock:
+            self.conn.executemany(
+                "REPLACE INTO docs(id, content_hash, source, content, metadata) VALUES(?,?,?,?,?)", params
+            )
+            self.conn.commit()
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        ids = [int(i) for i in ids]
+        found: Dict[int, Dict[str, Any]] = {}
+        with self._lock:
+            for i in range(0, len(ids), _IN_CHUNK):
+                part = ids[i:i + _IN_CHUNK]
+                cur = self.conn.execute(
+                    f"SELECT id, content, metadata FROM docs WHERE id IN ({','.join('?' * len(part))})", part
+                )
+                for doc_id, content, meta in cur.fetchall():
+                    found[doc_id] = {"content": content, "metadata": json.loads(meta)}
+        return found
+
+    def lookup(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """Ids of stored chunks by (source, content_hash)."""
+        wanted = set(keys)
+        hashes = list({h for _, h in wanted})
+        found: Dict[Tuple[str, str], int] = {}
+        with self._lock:
+            for i in range(0, len(hashes), _IN_CHUNK):
+                part = hashes[i:i + _IN_CHUNK]
+                cur = self.conn.execute(
+                    f"SELECT id, source, content_hash FROM docs WHERE content_hash IN ({','.join('?' * len(part))})",
+                    part,
+                )
+                for doc_id, source, content_hash in cur.fetchall():
+                    if (source, content_hash) in wanted:
+                        found[(source, content_hash)] = doc_id
+        return found
+
+    def delete_by_source(self, source: str) -> List[int]:
+        """Delete a source's rows; returns the deleted ids."""
+        with self._lock:
+            ids = [row[0] for row in self.conn.execute("SELECT id FROM docs WHERE source = ?", (source,))]
+            self.conn.execute("DELETE FROM docs WHERE source = ?", (source,))
+            self.conn.commit()
+        return ids
+
+    def delete_ids(self, ids: Iterable[int]) -> None:
+        ids = [int(i) for i in ids]
+        with self._lock:
+            for i in range(0, len(ids), _IN_CHUNK):
+                part = ids[i:i + _IN_CHUNK]
+                self.conn.execute(f"DELETE FROM docs WHERE id IN ({','.join('?' * len(part))})", part)
+            self.conn.commit()
+
+    def iter_rows(self, batch_size: int = 1000) -> Iterator[List[Tuple[int, str, Dict[str, Any]]]]:
+        """Batches of (id, content, metadata) in id order."""
+        last = -1
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT id, content, metadata FROM docs WHERE id > ? ORDER BY id LIMIT ?", (last, batch_size)
+                ).fetchall()
+            if not rows:
+                break
+            last = rows[-1][0]
+            yield [(doc_id, content, json.loads(meta)) for doc_id, content, meta in rows]
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT id FROM docs ORDER BY id")]
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def content_hashes(self) -> Set[str]:
+        with self._lock:
+            cur = self.conn.execute("SELECT DISTINCT content_hash FROM docs WHERE content_hash IS NOT NULL")
+            return {row[0] for row in cur.fetchall()}
+
+    def backup(self, dest_path: str) -> None:
+        """Consistent copy of the whole store to dest_path (SQLite online backup)."""
+        dest = sqlite3.connect(dest_path)
+        try:
+            with self._lock:
+                self.conn.backup(dest)
+        finally:
+            dest.close()
+
+    def writable_copy(self, path: str = ":memory:") -> "SQLiteDocStore":
+        copy = SQLiteDocStore(path)
+        with self._lock:
+            self.conn.backup(copy.conn)
+        return copy
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
@@ -1,5 +1,15 @@
+import os
+import json
+import time
+import glob
+import uuid
+import atexit
+import shutil
 import logging
-from typing import List, Dict, Optional, Any, Tuple
+import threading
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Iterable, Iterator, List, Dict, Optional, Any, Set, Tuple
 
 try:
     import faiss
@@ -8,40 +18,509 @@ except ImportError:
 
 import numpy as np
 
+from stores.base import Document, VectorStore, chunk_key, dedupe_results
+from stores.doc_store import SQLiteDocStore
+
 logger = logging.getLogger("faiss_store")
 logger.setLevel(logging.INFO)
 
+# 2: chunk text/metadata moved from meta.jsonl to docs.sqlite.
+# 3: explicit vector ids (IDMap2 / IVF ids) and tombstones.
+SNAPSHOT_FORMAT = 3
+DOCS_FILE = "docs.sqlite"
+CURRENT_FILE = "CURRENT"
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "ivf_sq8")
+# Rebuild a tombstoned index once this fraction of its vectors is deleted.
+COMPACT_RATIO = float(os.getenv("RAG_FAISS_COMPACT_RATIO", "0.2"))
+
+
+@dataclass
+class FaissIndexOptions:
+    """
+    Index layout and search knobs.
+
+    index_type: flat | hnsw | ivf_flat | ivf_pq | ivf_sq8
+    metric: cosine (inner product on L2-normalised vectors) | l2
+    nlist: IVF cells; 0 picks ~4*sqrt(n) at training time
+    """
+    index_type: str = field(default_factory=lambda: os.getenv("RAG_FAISS_INDEX", "flat"))
+    metric: str = field(default_factory=lambda: os.getenv("RAG_FAISS_METRIC", "cosine"))
+    nlist: int = field(default_factory=lambda: int(os.getenv("RAG_FAISS_NLIST", "0")))
+    pq_m: int = field(default_factory=lambda: int(os.getenv("RAG_FAISS_PQ_M", "64")))
+    hnsw_m: int = field(default_factory=lambda: int(os.getenv("RAG_FAISS_HNSW_M", "32")))
+    ef_construction: int = field(default_factory=lambda: int(os.getenv("RAG_FAISS_EF_CONSTRUCTION", "80")))
+    ef_search: int = field(default_factory=lambda: int(os.getenv("RAG_FAISS_EF_SEARCH", "64")))
+    nprobe: int = field(default_factory=lambda: int(os.getenv("RAG_FAISS_NPROBE", "16")))
+    # IVF variants serve from a flat staging index until this many vectors exist.
+    min_train_size: int = field(default_factory=lambda: int(os.getenv("RAG_FAISS_MIN_TRAIN", "10000")))
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported FAISS index type {self.index_type!r}; expected one of {INDEX_TYPES}")
+        if self.metric not in ("cosine", "l2"):
+            raise ValueError(f"Unsupported FAISS metric {self.metric!r}")
+
+    @property
+    def faiss_metric(self) -> int:
+        return faiss.METRIC_INNER_PRODUCT if self.metric == "cosine" else faiss.METRIC_L2
+
+    @property
+    def needs_training(self) -> bool:
+        return self.index_type.startswith("ivf")
+
+    def layout(self) -> Dict[str, Any]:
+        """Fields that determine the on-disk index structure."""
+        return {k: v for k, v in asdict(self).items() if k in ("index_type", "metric", "nlist", "pq_m", "hnsw_m")}
+
+
+def build_index(dim: int, opts: FaissIndexOptions, n_train: int = 0) -> Any:
+    """
+    Create an empty index for opts that accepts caller-assigned ids
+    (add_with_ids). IVF variants need n_train to size nlist.
+    """
+    if opts.index_type == "flat" or (opts.needs_training and n_train == 0):
+        return faiss.IndexIDMap2(faiss.IndexFlat(dim, opts.faiss_metric))
+    if opts.index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, opts.hnsw_m, opts.faiss_metric)
+        index.hnsw.efConstruction = opts.ef_construction
+        return faiss.IndexIDMap2(index)
+    # IVF indexes store ids natively and support remove_ids.
+    nlist = opts.nlist or max(1, min(int(4 * np.sqrt(n_train)), n_train // 39))
+    encoding = {"ivf_flat": "Flat", "ivf_pq": f"PQ{opts.pq_m}", "ivf_sq8": "SQ8"}[opts.index_type]
+    return faiss.index_factory(dim, f"IVF{nlist},{encoding}", opts.faiss_metric)
+
+
+def _base_index(index: Any) -> Any:
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Scratch doc stores still owned by a live FaissStore in this process; removed at exit.
+_scratch_files: Set[str] = set()
+_scratch_lock = threading.Lock()
+
+
+def remove_scratch_docstore(path: Optional[str]) -> None:
+    """Delete a scratch doc store and its SQLite sidecar files."""
+    if not path or path == ":memory:":
+        return
+    with _scratch_lock:
+        _scratch_files.discard(path)
+    for leftover in (path, f"{path}-wal", f"{path}-shm", f"{path}-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+@atexit.register
+def _remove_scratch_docstores() -> None:
+    with _scratch_lock:
+        paths = list(_scratch_files)
+    for path in paths:
+        try:
+            remove_scratch_docstore(path)
+        except OSError:
+            pass
+
+
+def scratch_docstore_path(base: str) -> str:
+    """
+    A doc store file owned by one FaissStore, next to base (e.g.
+    faiss_docs.<pid>-<token>.sqlite). Stores in the same or other processes
+    never share, and so never wipe, each other's doc store; files left
+    behind by dead processes are removed.
+    """
+    if base == ":memory:":
+        return base
+    root, ext = os.path.splitext(base)
+    ext = ext or ".sqlite"
+    for path in glob.glob(f"{glob.escape(root)}.*-*{ext}"):
+        owner = path[len(root) + 1:-len(ext)].split("-", 1)[0]
+        if owner.isdigit() and not _pid_alive(int(owner)):
+            remove_scratch_docstore(path)
+    path = f"{root}.{os.getpid()}-{uuid.uuid4().hex[:8]}{ext}"
+    with _scratch_lock:
+        _scratch_files.add(path)
+    return path
+
+
+def supports_remove(index: Any) -> bool:
+    """HNSW graphs cannot drop vectors; deletes there become tombstones."""
+    return not isinstance(_base_index(index), faiss.IndexHNSW)
+
+
+def apply_search_params(index: Any, opts: FaissIndexOptions) -> None:
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = opts.ef_search
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        ivf.nprobe = min(opts.nprobe, ivf.nlist)
+
+
+def _vectors_with_ids(index: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """All stored vectors and their ids from an IDMap2-wrapped flat or HNSW index."""
+    n = int(index.ntotal)
+    return _base_index(index).reconstruct_n(0, n), faiss.vector_to_array(index.id_map).astype("int64")
+
+
+def _write_atomic(path: str, data: str) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
 
-class FaissStore:
-    """Local FAISS vector store fallback."""
 
-    def __init__(self, dim: int) -> None:
+class FaissStore(VectorStore):
+    """
+    Local FAISS vector store fallback. Vector ids are assigned here and shared
+    with the SQLite doc store that holds chunk text and metadata.
+    """
+
+    persistent = False
+
+    def __init__(
+        self,
+        dim: int,
+        options: Optional[FaissIndexOptions] = None,
+        docstore_path: str = ":memory:",
+        docs: Optional[SQLiteDocStore] = None,
+    ) -> None:
+        """
+        docstore_path names where chunk text is kept off-heap; each store
+        writes its own file next to it (see scratch_docstore_path). docs
+        adopts an existing doc store, e.g. a snapshot's read-only one.
+        """
         self.dim = dim
+        self.options = options or FaissIndexOptions()
+        self.docstore_path = docstore_path
+        self._scratch_path: Optional[str] = None
         # Use type ignore because FAISS is dynamically typed
-        self.index: faiss.IndexFlatL2 = faiss.IndexFlatL2(dim)  # type: ignore
-        self.meta: List[Dict[str, Any]] = []
+        self.index: Any = build_index(dim, self.options)  # type: ignore
+        apply_search_params(self.index, self.options)
+        self.trained = not self.options.needs_training
+        if docs is None:
+            # A fresh file of its own, so it starts empty without clearing anything shared.
+            self._scratch_path = scratch_docstore_path(docstore_path)
+            docs = SQLiteDocStore(self._scratch_path)
+        self.docs = docs
+        self.next_id = 0
+        # Live chunks; index.ntotal - live are tombstones awaiting compaction.
+        self.live = 0
+        self.version: Optional[str] = None
+        self.dirty = False
+        self._mmapped = False
+        self._mmap_path = ""
+        self._lock = threading.RLock()
+
+    def _prepare(self, vecs: np.ndarray) -> np.ndarray:
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        if self.options.metric == "cosine":
+            faiss.normalize_L2(vecs)
+        return vecs
+
+    def _make_writable(self) -> None:
+        """Copy a snapshot's read-only index and doc store before the first write."""
+        if self._mmapped:
+            # clone_index cannot copy mmapped IVF lists, so read the file into memory.
+            try:
+                self.index = faiss.read_index(self._mmap_path)
+            except Exception:
+                self.index = faiss.clone_index(self.index)
+            apply_search_params(self.index, self.options)
+            self._mmapped = False
+        if self.docs.readonly:
+            self._scratch_path = scratch_docstore_path(self.docstore_path)
+            docs = self.docs.writable_copy(self._scratch_path)
+            self.docs.close()
+            self.docs = docs
+
+    def add(self, docs: List[Document], vectors: List[List[float]]) -> List[int]:
+        """Add a batch of vectors and their documents in one index/doc store write."""
+        if not docs:
+            return []
+        v: np.ndarray = self._prepare(np.array(vectors, dtype=np.float32).reshape(len(docs), -1))
+        with self._lock:
+            self._make_writable()
+            ids = list(range(self.next_id, self.next_id + len(docs)))
+            self.index.add_with_ids(v, np.array(ids, dtype="int64"))  # type: ignore
+            self.docs.add_many((i, content, meta or {}) for i, (content, meta) in zip(ids, docs))
+            self.next_id += len(docs)
+            self.live += len(docs)
+            self.dirty = True
+            if not self.trained and self.index.ntotal >= self.options.min_train_size:
+                self.train()
+        logger.debug("Added %d vectors", len(docs))
+        return ids
+
+    def upsert(self, docs: List[Document], vectors: List[List[float]]) -> List[int]:
+        keys = [chunk_key(content, meta) for content, meta in docs]
+        docs = [(content, {**(meta or {}), "content_hash": key[1]}) for (content, meta), key in zip(docs, keys)]
+        with self._lock:
+            existing = self.docs.lookup(keys)
+            ids: List[Optional[int]] = [existing.get(key) for key in keys]
+            # Same content hash -> same vector, so stored chunks only get fresh metadata.
+            if any(doc_id is not None for doc_id in ids):
+                self._make_writable()
+            self.docs.add_many(
+                (doc_id, content, meta) for doc_id, (content, meta) in zip(ids, docs) if doc_id is not None
+            )
+            # New chunks, each distinct (source, hash) once even if repeated in the batch.
+            new: List[int] = []
+            first: Dict[Any, int] = {}
+            for i, key in enumerate(keys):
+                if ids[i] is not None or key in first:
+                    continue
+                first[key] = i
+                new.append(i)
+            for i, doc_id in zip(new, self.add([docs[i] for i in new], [vectors[i] for i in new])):
+                ids[i] = doc_id
+            for i, key in enumerate(keys):
+                if ids[i] is None:
+                    ids[i] = ids[first[key]]
+        return ids  # type: ignore[return-value]
+
+    def delete_by_source(self, source: str) -> int:
+        with self._lock:
+            self._make_writable()
+            ids = self.docs.delete_by_source(source)
+            self._remove(ids)
+        logger.info("Deleted %d chunks of %s", len(ids), source)
+        return len(ids)
+
+    def delete_chunks(self, source: str, content_hashes: Iterable[str]) -> int:
+        with self._lock:
+            self._make_writable()
+            ids = list(self.docs.lookup((source or "", h) for h in content_hashes).values())
+            self.docs.delete_ids(ids)
+            self._remove(ids)
+        return len(ids)
 
-    def add(self, content: str, vec: List[float], metadata: Optional[Dict[str, Any]] = None) -> None:
-        """Add a vector with associated content and optional metadata."""
-        v: np.ndarray = np.array(vec, dtype=np.float32).reshape(1, -1)
-        self.index.add(v)  # type: ignore
-        self.meta.append({"content": content, "metadata": metadata or {}})
-        logger.debug("Added vector: %s", content)
+    def _remove(self, ids: List[int]) -> None:
+        """Drop ids already deleted from the doc store from the index (or tombstone them)."""
+        if not ids:
+            return
+        if supports_remove(self.index):
+            self.index.remove_ids(np.array(ids, dtype="int64"))
+        self.live -= len(ids)
+        self.dirty = True
+        if self.index.ntotal - self.live > COMPACT_RATIO * max(1, self.index.ntotal):
+            self.compact()
+
+    def compact(self) -> None:
+        """Rebuild a tombstoned (HNSW) index from its live vectors."""
+        with self._lock:
+            if self.index.ntotal == self.live or not isinstance(self.index, faiss.IndexIDMap2):
+                return
+            start = time.time()
+            xb, ids = _vectors_with_ids(self.index)
+            keep = np.isin(ids, np.array(self.docs.ids(), dtype="int64"))
+            index = build_index(self.dim, self.options)
+            index.add_with_ids(xb[keep], ids[keep])
+            apply_search_params(index, self.options)
+            dropped = int(self.index.ntotal) - int(keep.sum())
+            self.index = index
+            self.dirty = True
+        logger.info("Compacted FAISS index: dropped %d tombstones in %.2fs", dropped, time.time() - start)
+
+    def train(self) -> None:
+        """
+        Train the configured IVF index on the vectors held so far and move them
+        into it. Until then, an IVF-configured store searches a flat staging index.
+        """
+        with self._lock:
+            if self.trained:
+                return
+            n = int(self.index.ntotal)
+            if n == 0:
+                return
+            start = time.time()
+            xb, ids = _vectors_with_ids(self.index)
+            index = build_index(self.dim, self.options, n_train=n)
+            index.train(xb)
+            index.add_with_ids(xb, ids)
+            apply_search_params(index, self.options)
+            self.index = index
+            self.trained = True
+            self.dirty = True
+        logger.info("Trained %s index on %d vectors in %.2fs", self.options.index_type, n, time.time() - start)
+
+    def _search(self, v: np.ndarray, k: int) -> List[List[Dict[str, Any]]]:
+        with self._lock:
+            ntotal = int(self.index.ntotal)
+            if ntotal == 0:
+                return [[] for _ in range(len(v))]
+            # Over-fetch to cover tombstones and duplicate chunks removed below.
+            fetch = min(ntotal, 2 * k + ntotal - self.live)
+            D, I = self.index.search(v, fetch)  # type: ignore
+            docs = self.docs.get_many({int(idx) for idx in I.ravel() if idx >= 0})
+        grouped: List[List[Dict[str, Any]]] = []
+        for scores, idxs in zip(D, I):
+            hits = [
+                {"content": docs[int(idx)]["content"], "metadata": docs[int(idx)]["metadata"], "score": float(score)}
+                for score, idx in zip(scores, idxs) if idx >= 0 and int(idx) in docs
+            ]
+            grouped.append(dedupe_results(hits, k))
+        return grouped
 
     def query(self, vec: List[float], k: int = 5) -> List[Dict[str, Any]]:
         """Query the vector store for k nearest neighbors."""
-        v: np.ndarray = np.array(vec, dtype=np.float32).reshape(1, -1)
-        D, I = self.index.search(v, k)  # type: ignore
-        results: List[Dict[str, Any]] = []
-
-        for score, idx in zip(D[0], I[0]):
-            if idx < 0:
-                continue
-            results.append({
-                "content": self.meta[idx]["content"],
-                "metadata": self.meta[idx]["metadata"],
-                "score": float(score)
-            })
-
+        results = self._search(self._prepare(np.array(vec, dtype=np.float32).reshape(1, -1)), k)[0]
         logger.debug("Query results: %d items", len(results))
         return results
+
+    def query_many(self, vecs: List[List[float]], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """One index search for all query vectors; results grouped per query."""
+        if not vecs:
+            return []
+        return self._search(self._prepare(np.array(vecs, dtype=np.float32).reshape(len(vecs), -1)), k)
+
+    def get(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        ids = [int(i) for i in ids]
+        docs = self.docs.get_many(ids)
+        return [{"id": i, **docs[i]} for i in ids if i in docs]
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[Tuple[int, str, Dict[str, Any]]]]:
+        return self.docs.iter_rows(batch_size)
+
+    def close(self) -> None:
+        """Release the doc store and delete its scratch file; the index is freed with the object."""
+        self.docs.close()
+        remove_scratch_docstore(self._scratch_path)
+
+    def count(self) -> int:
+        return self.live
+
+    def content_hashes(self) -> Set[str]:
+        return self.docs.content_hashes()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **super().stats(),
+                "index_type": self.options.index_type,
+                "trained": self.trained,
+                "tombstones": int(self.index.ntotal) - self.live,
+                "version": self.version,
+            }
+
+    # ---------------- Snapshots ----------------
+    def save_snapshot(self, snapshot_dir: str, keep: int = 3) -> Optional[str]:
+        """
+        Write index + doc store to a new versioned directory, then atomically
+        repoint CURRENT at it. Returns the version, or None if nothing changed.
+        """
+        with self._lock:
+            if not self.dirty and self.version is not None:
+                return None
+            os.makedirs(snapshot_dir, exist_ok=True)
+            version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            tmp_dir = os.path.join(snapshot_dir, f".tmp-{version}")
+            final_dir = os.path.join(snapshot_dir, f"v{version}")
+            start = time.time()
+
+            os.makedirs(tmp_dir)
+            faiss.write_index(self.index, os.path.join(tmp_dir, "index.faiss"))
+            self.docs.backup(os.path.join(tmp_dir, DOCS_FILE))
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "version": version,
+                "dim": self.dim,
+                "ntotal": int(self.index.ntotal),
+                "live": self.live,
+                "next_id": self.next_id,
+                "options": self.options.layout(),
+                "trained": self.trained,
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            _write_atomic(os.path.join(tmp_dir, "manifest.json"), json.dumps(manifest))
+
+            os.replace(tmp_dir, final_dir)
+            _write_atomic(os.path.join(snapshot_dir, CURRENT_FILE), f"v{version}")
+            self.version = version
+            self.dirty = False
+
+        logger.info("Saved FAISS snapshot v%s (%d vectors) in %.2fs", version, manifest["ntotal"], time.time() - start)
+        self._prune_snapshots(snapshot_dir, keep)
+        return version
+
+    @staticmethod
+    def _prune_snapshots(snapshot_dir: str, keep: int) -> None:
+        versions = sorted(d for d in os.listdir(snapshot_dir) if d.startswith("v"))
+        for old in versions[:-keep] if keep > 0 else []:
+            shutil.rmtree(os.path.join(snapshot_dir, old), ignore_errors=True)
+
+    @classmethod
+    def load_snapshot(
+        cls,
+        snapshot_dir: str,
+        mmap: bool = True,
+        options: Optional[FaissIndexOptions] = None,
+        docstore_path: str = ":memory:",
+    ) -> Optional["FaissStore"]:
+        """
+        Load the CURRENT snapshot, memory-mapping the index when possible. The
+        snapshot's doc store is opened read-only and copied to a scratch file
+        of its own next to docstore_path on the first write. Returns None if
+        the snapshot was built with a different index layout.
+        """
+        try:
+            with open(os.path.join(snapshot_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+                current = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        path = os.path.join(snapshot_dir, current)
+        start = time.time()
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            logger.warning("Ignoring FAISS snapshot %s with unsupported format %s", path, manifest.get("format"))
+            return None
+
+        options = options or FaissIndexOptions()
+        # Snapshots written before index options existed were flat L2.
+        layout = manifest.get("options") or {"index_type": "flat", "metric": "l2"}
+        wanted = options.layout()
+        if any(wanted.get(k) != v for k, v in layout.items()):
+            logger.warning("FAISS snapshot %s layout %s differs from configured %s; ignoring", path, layout, wanted)
+            return None
+
+        docs = SQLiteDocStore(os.path.join(path, DOCS_FILE), readonly=True)
+        store = cls(manifest["dim"], options, docstore_path=docstore_path, docs=docs)
+        index_path = os.path.join(path, "index.faiss")
+        if mmap:
+            try:
+                store.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                store._mmapped = True
+                store._mmap_path = index_path
+            except Exception as e:
+                logger.warning("Memory-mapped load failed for %s, reading into memory: %s", index_path, e)
+        if not store._mmapped:
+            store.index = faiss.read_index(index_path)
+        apply_search_params(store.index, options)
+        store.trained = manifest.get("trained", True)
+
+        n_docs = store.docs.count()
+        if n_docs != manifest["live"] or store.index.ntotal != manifest["ntotal"]:
+            logger.warning("FAISS snapshot %s is inconsistent (%d vectors, %d docs); ignoring",
+                           path, store.index.ntotal, n_docs)
+            store.docs.close()
+            return None
+        store.live = n_docs
+        store.next_id = manifest["next_id"]
+        store.version = manifest["version"]
+        logger.info("Loaded FAISS snapshot %s (%d vectors) in %.2fs", current, store.index.ntotal, time.time() - start)
+        return store
@@ -1,28 +1,87 @@
 import os
 import json
 import logging
-from typing import List, Optional, Dict, Any, cast
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Set, Tuple, cast
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
-try:
-    from pgvector.psycopg2 import Vector  # type: ignore
-except Exception:
-    Vector: Any = None  # fallback
+from stores.base import Document, VectorStore, chunk_key, dedupe_results
 
 logger = logging.getLogger("pgvector_store")
 logger.setLevel(os.environ.get("PGVECTOR_LOG_LEVEL", "INFO"))
 
 PG_CONN: Optional[str] = os.getenv("RAG_PG_CONN")
 PG_TABLE = os.getenv("RAG_PG_TABLE", "documents")
+PG_POOL_MIN = int(os.getenv("RAG_PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.getenv("RAG_PG_POOL_MAX", "8"))
+PG_BATCH_SIZE = int(os.getenv("RAG_PG_BATCH_SIZE", "500"))
+INDEX_TYPES = ("none", "hnsw", "ivfflat")
 
 
-class PgVectorStore:
-    def __init__(self, pg_conn: Optional[str] = PG_CONN, table: str = PG_TABLE):
+@dataclass
+class PgIndexOptions:
+    """
+    ANN index on content_vector (L2, matching the <-> operator used by query).
+
+    index_type: none (sequential scan) | hnsw | ivfflat
+    lists: IVFFlat lists; build after the bulk load, roughly rows/1000
+    """
+    index_type: str = field(default_factory=lambda: os.getenv("RAG_PG_INDEX", "none"))
+    hnsw_m: int = field(default_factory=lambda: int(os.getenv("RAG_PG_HNSW_M", "16")))
+    ef_construction: int = field(default_factory=lambda: int(os.getenv("RAG_PG_EF_CONSTRUCTION", "64")))
+    ef_search: int = field(default_factory=lambda: int(os.getenv("RAG_PG_EF_SEARCH", "40")))
+    lists: int = field(default_factory=lambda: int(os.getenv("RAG_PG_IVF_LISTS", "100")))
+    probes: int = field(default_factory=lambda: int(os.getenv("RAG_PG_IVF_PROBES", "10")))
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported pgvector index type {self.index_type!r}; expected one of {INDEX_TYPES}")
+
+
+def _vector_literal(vector: List[float]) -> str:
+    """pgvector text input format, cast with ::vector."""
+    return "[" + ",".join(map(repr, map(float, vector))) + "]"
+
+
+class PgVectorStore(VectorStore):
+    persistent = True
+
+    def __init__(
+        self,
+        pg_conn: Optional[str] = PG_CONN,
+        table: str = PG_TABLE,
+        options: Optional[PgIndexOptions] = None,
+        pool_min: int = PG_POOL_MIN,
+        pool_max: int = PG_POOL_MAX,
+    ):
         if not pg_conn:
             raise ValueError("RAG_PG_CONN must be set to use PgVectorStore")
-        self.conn = psycopg2.connect(pg_conn)
+        self.pool = ThreadedConnectionPool(pool_min, pool_max, pg_conn)
+        # ThreadedConnectionPool raises when exhausted; make callers wait instead.
+        self._slots = threading.BoundedSemaphore(pool_max)
         self.table = table
+        self.options = options or PgIndexOptions()
+
+    @contextmanager
+    def _connection(self) -> Iterator[Any]:
+        """Borrow a pooled connection; commit on success, roll back on error."""
+        with self._slots:
+            conn = self.pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self.pool.putconn(conn)
+
+    def close(self) -> None:
+        self.pool.closeall()
 
     def ensure_table(self, dim: int = 1536) -> None:
         """Create table and ensure vector extension exists."""
@@ -32,57 +91,195 @@ class PgVectorStore:
             id SERIAL PRIMARY KEY,
             content TEXT,
             metadata JSONB,
-            content_vector VECTOR({dim})
+            content_vector VECTOR({dim}),
+            source TEXT,
+            content_hash TEXT
         );
         """
-        with self.conn.cursor() as cur:
+        # Tables created before upsert support: add the key columns, backfill
+        # them from metadata and drop the duplicate chunks earlier runs inserted.
+        migrate = f"""
+        ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS source TEXT;
+        ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS content_hash TEXT;
+        UPDATE {self.table} SET source = COALESCE(metadata->>'source', ''),
+            content_hash = COALESCE(metadata->>'content_hash', encode(sha256(convert_to(content, 'UTF8')), 'hex'))
+            WHERE source IS NULL OR content_hash IS NULL;
+        DELETE FROM {self.table} a USING {self.table} b
+            WHERE a.id < b.id AND a.source = b.source AND a.content_hash = b.content_hash;
+        CREATE UNIQUE INDEX IF NOT EXISTS {self.table}_chunk_key ON {self.table} (source, content_hash);
+        CREATE INDEX IF NOT EXISTS {self.table}_source ON {self.table} (source);
+        """
+        with self._connection() as conn, conn.cursor() as cur:
             cur.execute(create_ext)
             cur.execute(create_tbl)
-            self.conn.commit()
+            cur.execute(migrate)
+        self.ensure_index()
+
+    def ensure_index(self) -> None:
+        """
+        Create the configured ANN index if missing. IVFFlat centroids come from
+        the rows present at build time, so call again (after dropping it) once
+        the table is loaded.
+        """
+        opts = self.options
+        if opts.index_type == "none":
+            return
+        if opts.index_type == "hnsw":
+            ddl = (
+                f"CREATE INDEX IF NOT EXISTS {self.table}_vec_hnsw ON {self.table} "
+                f"USING hnsw (content_vector vector_l2_ops) "
+                f"WITH (m = {int(opts.hnsw_m)}, ef_construction = {int(opts.ef_construction)});"
+            )
+        else:
+            ddl = (
+                f"CREATE INDEX IF NOT EXISTS {self.table}_vec_ivfflat ON {self.table} "
+                f"USING ivfflat (content_vector vector_l2_ops) WITH (lists = {int(opts.lists)});"
+            )
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(ddl)
+        logger.info("Ensured %s index on %s", opts.index_type, self.table)
 
-    def add_document(
+    def add(self, docs: List[Document], vectors: List[List[float]]) -> List[int]:
+        """Chunks are unique per (source, content_hash) in this table, so add is an upsert."""
+        return self.upsert(docs, vectors)
+
+    def upsert(
         self,
-        content: str,
-        vector: List[float],
-        metadata: Optional[Dict[str, Any]] = None
-    ) -> int:
-        meta = json.dumps(metadata or {})
-        with self.conn.cursor() as cur:
-            if Vector:
-                cur.execute(
-                    f"INSERT INTO {self.table} (content, metadata, content_vector) "
-                    "VALUES (%s, %s, %s) RETURNING id;",
-                    (content, meta, Vector(vector))  # type: ignore
-                )
-            else:
-                vec_str = "{" + ",".join(map(str, vector)) + "}"
+        docs: List[Document],
+        vectors: List[List[float]],
+        batch_size: int = PG_BATCH_SIZE,
+    ) -> List[int]:
+        """
+        Bulk INSERT ... ON CONFLICT (source, content_hash) DO UPDATE, one
+        transaction per batch. Returns ids in input order.
+        """
+        ids: List[int] = []
+        for i in range(0, len(docs), batch_size):
+            ids.extend(self._upsert_batch(docs[i:i + batch_size], vectors[i:i + batch_size]))
+        logger.debug("Upserted %d documents into %s", len(ids), self.table)
+        return ids
+
+    def _upsert_batch(self, docs: List[Document], vectors: List[List[float]]) -> List[int]:
+        # A row may only be touched once per statement, so collapse repeats first.
+        rows: Dict[Tuple[str, str], Tuple[Any, ...]] = {}
+        keys: List[Tuple[str, str]] = []
+        for (content, meta), vec in zip(docs, vectors):
+            key = chunk_key(content, meta)
+            keys.append(key)
+            meta = {**(meta or {}), "content_hash": key[1]}
+            rows[key] = (content, json.dumps(meta), _vector_literal(vec), key[0], key[1])
+
+        with self._connection() as conn, conn.cursor() as cur:
+            returned = execute_values(
+                cur,
+                f"INSERT INTO {self.table} (content, metadata, content_vector, source, content_hash) VALUES %s "
+                f"ON CONFLICT (source, content_hash) DO UPDATE SET metadata = EXCLUDED.metadata "
+                f"RETURNING id, source, content_hash;",
+                list(rows.values()),
+                template="(%s, %s::jsonb, %s::vector, %s, %s)",
+                page_size=len(rows),
+                fetch=True,
+            )
+        by_key = {(source, content_hash): row_id for row_id, source, content_hash in returned}
+        if len(by_key) != len(rows):
+            raise RuntimeError("Upsert failed, not all IDs returned")
+        return [by_key[key] for key in keys]
+
+    def delete_by_source(self, source: str) -> int:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {self.table} WHERE source = %s;", (source,))
+            deleted = cur.rowcount
+        logger.info("Deleted %d chunks of %s from %s", deleted, source, self.table)
+        return deleted
+
+    def delete_chunks(self, source: str, content_hashes: Iterable[str]) -> int:
+        hashes = list(content_hashes)
+        if not hashes:
+            return 0
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"DELETE FROM {self.table} WHERE source = %s AND content_hash = ANY(%s);",
+                (source or "", hashes),
+            )
+            return cur.rowcount
+
+    def get(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"SELECT id, content, metadata FROM {self.table} WHERE id = ANY(%s);", (ids,))
+            found = {r["id"]: dict(r) for r in cur.fetchall()}
+        return [found[i] for i in ids if i in found]
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[List[Tuple[int, str, Dict[str, Any]]]]:
+        """Keyset-paginated scan, one short transaction per batch."""
+        last = 0
+        while True:
+            with self._connection() as conn, conn.cursor() as cur:
                 cur.execute(
-                    f"INSERT INTO {self.table} (content, metadata, content_vector) "
-                    "VALUES (%s, %s, %s::vector) RETURNING id;",
-                    (content, meta, vec_str)
+                    f"SELECT id, content, metadata FROM {self.table} WHERE id > %s ORDER BY id LIMIT %s;",
+                    (last, batch_size),
                 )
-            id_row = cur.fetchone()
-            if not id_row:
-                raise RuntimeError("Insert failed, no ID returned")
-            self.conn.commit()
-            return id_row[0]
+                rows = cur.fetchall()
+            if not rows:
+                break
+            last = rows[-1][0]
+            yield [(row_id, content, metadata or {}) for row_id, content, metadata in rows]
+
+    def count(self) -> int:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM {self.table};")
+            return cur.fetchone()[0]
+
+    def content_hashes(self) -> Set[str]:
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(f"SELECT DISTINCT content_hash FROM {self.table} WHERE content_hash IS NOT NULL;")
+            return {row[0] for row in cur.fetchall()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "table": self.table, "index_type": self.options.index_type}
+
+    def _set_search_params(self, cur: Any) -> None:
+        # SET LOCAL only lasts for the current transaction, so pooled connections stay clean.
+        if self.options.index_type == "hnsw":
+            cur.execute("SET LOCAL hnsw.ef_search = %s;", (int(self.options.ef_search),))
+        elif self.options.index_type == "ivfflat":
+            cur.execute("SET LOCAL ivfflat.probes = %s;", (int(self.options.probes),))
 
     def query(self, q_vector: List[float], k: int = 5) -> List[Dict[str, Any]]:
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            if Vector:
-                cur.execute(
-                    f"SELECT id, content, metadata, content_vector <-> %s AS distance "
-                    f"FROM {self.table} ORDER BY distance LIMIT %s;",
-                    (Vector(q_vector), k)  # type: ignore
-                )
-            else:
-                vec_str = "{" + ",".join(map(str, q_vector)) + "}"
-                cur.execute(
-                    f"SELECT id, content, metadata, content_vector <-> %s::vector AS distance "
-                    f"FROM {self.table} ORDER BY distance LIMIT %s;",
-                    (vec_str, k)
-                )
+        with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            self._set_search_params(cur)
+            cur.execute(
+                f"SELECT id, content, metadata, content_vector <-> %s::vector AS distance "
+                f"FROM {self.table} ORDER BY distance LIMIT %s;",
+                (_vector_literal(q_vector), 2 * k)
+            )
+            rows = cast(List[Dict[str, Any]], cur.fetchall())
+        for r in rows:
+            r["score"] = float(r.pop("distance"))
+        # Over-fetched so identical chunks from different sources can be dropped.
+        return dedupe_results(rows, k)
+
+    def query_many(self, q_vectors: List[List[float]], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """All queries in one statement: a LATERAL top-k per unnested query vector."""
+        if not q_vectors:
+            return []
+        with self._connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            self._set_search_params(cur)
+            cur.execute(
+                f"SELECT q.ord, d.id, d.content, d.metadata, d.distance "
+                f"FROM unnest(%s::int[], %s::text[]) AS q(ord, vec) "
+                f"CROSS JOIN LATERAL ("
+                f"  SELECT id, content, metadata, content_vector <-> q.vec::vector AS distance "
+                f"  FROM {self.table} ORDER BY distance LIMIT %s"
+                f") d ORDER BY q.ord, d.distance;",
+                (list(range(len(q_vectors))), [_vector_literal(v) for v in q_vectors], 2 * k)
+            )
             rows = cast(List[Dict[str, Any]], cur.fetchall())
-            for r in rows:
-                r["score"] = float(r.pop("distance"))
-            return rows
+        grouped: List[List[Dict[str, Any]]] = [[] for _ in q_vectors]
+        for r in rows:
+            ord_ = r.pop("ord")
+            r["score"] = float(r.pop("distance"))
+            grouped[ord_].append(r)
+        return [dedupe_results(g, k) for g in grouped]
@@ -0,0 +1,252 @@
+import os
+import shutil
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, List, Optional
+
+from stores.faiss_store import CURRENT_FILE, FaissStore, _write_atomic
+
+if TYPE_CHECKING:
+    from rag.rag_client import RAGRunner
+
+logger = logging.getLogger("snapshot_sync")
+logger.setLevel(os.environ.get("RAG_LOG_LEVEL", "INFO"))
+
+# standalone: ingest and serve locally | builder: ingest and publish | replica: serve published snapshots
+RAG_SNAPSHOT_ROLE = os.getenv("RAG_SNAPSHOT_ROLE", "standalone")
+# Shared snapshot location: s3://bucket/prefix or a filesystem path (e.g. a shared volume).
+RAG_SNAPSHOT_REMOTE: Optional[str] = os.getenv("RAG_SNAPSHOT_REMOTE")
+# Custom S3 endpoint for MinIO/LocalStack.
+RAG_SNAPSHOT_S3_ENDPOINT: Optional[str] = os.getenv("RAG_SNAPSHOT_S3_ENDPOINT")
+RAG_SNAPSHOT_POLL_SECS = float(os.getenv("RAG_SNAPSHOT_POLL_SECS", "60"))
+RAG_SNAPSHOT_KEEP = int(os.getenv("RAG_SNAPSHOT_KEEP", "3"))
+ROLES = ("standalone", "builder", "replica")
+
+LATEST_FILE = "LATEST"
+# Uploaded last, so a version whose manifest exists is complete.
+SNAPSHOT_FILES = ("index.faiss", "docs.sqlite", "manifest.json")
+
+
+class SnapshotRemote(ABC):
+    """
+    Shared store of published snapshots:
+
+      <root>/versions/<version>/{index.faiss,docs.sqlite,manifest.json}
+      <root>/LATEST   name of the newest complete version
+    """
+
+    @abstractmethod
+    def upload(self, local_dir: str, version: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def download(self, version: str, dest_dir: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest(self) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_latest(self, version: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def versions(self) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, version: str) -> None:
+        raise NotImplementedError
+
+    def prune(self, keep: int) -> None:
+        latest = self.latest()
+        for version in sorted(self.versions())[:-keep] if keep > 0 else []:
+            if version != latest:
+                self.delete(version)
+
+
+class LocalSnapshotRemote(SnapshotRemote):
+    """A directory, e.g. a shared volume, or a stand-in for S3 in tests."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "versions"), exist_ok=True)
+
+    def _dir(self, version: str) -> str:
+        return os.path.join(self.root, "versions", version)
+
+    def upload(self, local_dir: str, version: str) -> None:
+        tmp = self._dir(f".tmp-{version}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in SNAPSHOT_FILES:
+            shutil.copy2(os.path.join(local_dir, name), os.path.join(tmp, name))
+        os.replace(tmp, self._dir(version))
+
+    def download(self, version: str, dest_dir: str) -> None:
+        os.makedirs(dest_dir, exist_ok=True)
+        for name in SNAPSHOT_FILES:
+            shutil.copy2(os.path.join(self._dir(version), name), os.path.join(dest_dir, name))
+
+    def latest(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, LATEST_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set_latest(self, version: str) -> None:
+        _write_atomic(os.path.join(self.root, LATEST_FILE), version)
+
+    def versions(self) -> List[str]:
+        return [d for d in os.listdir(os.path.join(self.root, "versions")) if not d.startswith(".")]
+
+    def delete(self, version: str) -> None:
+        shutil.rmtree(self._dir(version), ignore_errors=True)
+
+
+class S3SnapshotRemote(SnapshotRemote):
+    """s3://bucket/prefix; endpoint_url points at MinIO or LocalStack for local runs."""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None, endpoint_url: Optional[str] = RAG_SNAPSHOT_S3_ENDPOINT):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.s3 = client or boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, *parts: str) -> str:
+        return "/".join(p for p in (self.prefix, *parts) if p)
+
+    def upload(self, local_dir: str, version: str) -> None:
+        for name in SNAPSHOT_FILES:
+            self.s3.upload_file(os.path.join(local_dir, name), self.bucket, self._key("versions", version, name))
+
+    def download(self, version: str, dest_dir: str) -> None:
+        os.makedirs(dest_dir, exist_ok=True)
+        for name in SNAPSHOT_FILES:
+            self.s3.download_file(self.bucket, self._key("versions", version, name), os.path.join(dest_dir, name))
+
+    def latest(self) -> Optional[str]:
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=self._key(LATEST_FILE))["Body"]
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return body.read().decode("utf-8").strip() or None
+
+    def set_latest(self, version: str) -> None:
+        # Single-object PUTs are atomic, so readers see the old or the new pointer.
+        self.s3.put_object(Bucket=self.bucket, Key=self._key(LATEST_FILE), Body=version.encode("utf-8"))
+
+    def versions(self) -> List[str]:
+        prefix = self._key("versions") + "/"
+        found: List[str] = []
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix, Delimiter="/"):
+            found.extend(p["Prefix"][len(prefix):].rstrip("/") for p in page.get("CommonPrefixes", []))
+        return found
+
+    def delete(self, version: str) -> None:
+        self.s3.delete_objects(
+            Bucket=self.bucket,
+            Delete={"Objects": [{"Key": self._key("versions", version, name)} for name in SNAPSHOT_FILES]},
+        )
+
+
+def open_remote(url: Optional[str] = RAG_SNAPSHOT_REMOTE) -> SnapshotRemote:
+    if not url:
+        raise ValueError("RAG_SNAPSHOT_REMOTE must be set for builder/replica roles")
+    if url.startswith("s3://"):
+        bucket, _, prefix = url[len("s3://"):].partition("/")
+        return S3SnapshotRemote(bucket, prefix)
+    return LocalSnapshotRemote(url[len("file://"):] if url.startswith("file://") else url)
+
+
+class SnapshotPublisher:
+    """Builder side: upload each locally saved snapshot, then move LATEST to it."""
+
+    def __init__(self, remote: SnapshotRemote, keep: int = RAG_SNAPSHOT_KEEP):
+        self.remote = remote
+        self.keep = keep
+
+    def publish(self, snapshot_dir: str, version: str) -> None:
+        # Local snapshot directories are named v<version>.
+        name = f"v{version}"
+        self.remote.upload(os.path.join(snapshot_dir, name), name)
+        self.remote.set_latest(name)
+        logger.info("Published index snapshot %s", name)
+        self.remote.prune(self.keep)
+
+
+class SnapshotSubscriber:
+    """
+    Replica side: poll LATEST, download new versions next to the local
+    snapshots, repoint the local CURRENT and swap the loaded store into the
+    RAGRunner. Queries keep using the old store until the swap, so there is
+    no downtime; a failed download or load leaves the current index serving.
+    """
+
+    def __init__(
+        self,
+        rag: "RAGRunner",
+        remote: SnapshotRemote,
+        poll_secs: float = RAG_SNAPSHOT_POLL_SECS,
+        keep: int = RAG_SNAPSHOT_KEEP,
+    ):
+        if not rag.config.snapshot_dir:
+            raise ValueError("RAG_SNAPSHOT_DIR must be set on replicas")
+        self.rag = rag
+        self.remote = remote
+        self.poll_secs = poll_secs
+        self.keep = keep
+        self.local_dir = rag.config.snapshot_dir
+        self.current: Optional[str] = None
+        store_version = getattr(rag.store, "version", None)
+        if store_version:
+            self.current = f"v{store_version}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll_once(self) -> bool:
+        """Fetch and swap in the published version if it is new; True if swapped."""
+        latest = self.remote.latest()
+        if not latest or latest == self.current:
+            return False
+        os.makedirs(self.local_dir, exist_ok=True)
+        tmp = os.path.join(self.local_dir, f".tmp-{latest}")
+        final = os.path.join(self.local_dir, latest)
+        shutil.rmtree(tmp, ignore_errors=True)
+        try:
+            if not os.path.isdir(final):
+                self.remote.download(latest, tmp)
+                os.replace(tmp, final)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        _write_atomic(os.path.join(self.local_dir, CURRENT_FILE), latest)
+
+        store = self.rag.load_faiss_snapshot()
+        if store is None:
+            raise RuntimeError(f"Published snapshot {latest} could not be loaded")
+        self.rag.swap_store(store)
+        self.current = latest
+        FaissStore._prune_snapshots(self.local_dir, self.keep)
+        logger.info("Swapped in published index snapshot %s (%d vectors)", latest, store.count())
+        return True
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception("Snapshot poll failed")
+            self._stop.wait(self.poll_secs)
+
+    def start(self) -> "SnapshotSubscriber":
+        self._thread = threading.Thread(target=self.run, name="snapshot-sync", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
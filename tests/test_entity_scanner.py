@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import pytest
+
+from extractors.utils.entity_scanner import EntityScanner
+
+FIXTURES = Path(__file__).parent.parent / "benchmarks" / "fixtures" / "ocr"
+
+
+@pytest.fixture
+def scanner():
+    return EntityScanner()
+
+
+def test_aku_invoice_is_confident(scanner):
+    result = scanner.scan("", "", (FIXTURES / "aku_outpatient_invoice.txt").read_text())
+
+    assert result.member_number == "DIV-25325554-01"
+    assert result.is_smart
+    assert result.member_name == "Jane Wanjiku Mwangi"
+    assert result.invoiced_amount == 7700.0
+    assert [c["cost"] for c in result.claim_details] == [4500.0, 1850.0, 950.0, 400.0]
+    assert result.is_confident()
+
+
+def test_amount_in_words_corroborates_currency_amount(scanner):
+    result = scanner.scan("", "", (FIXTURES / "handwritten_preauth.txt").read_text())
+
+    assert result.member_number == "46665825-00"
+    assert result.invoiced_amount == 185000.0
+    assert result.confidence["invoiced_amount"] == 0.9
+    assert result.claim_details == []
+
+
+def test_member_label_with_member_number_is_not_a_name(scanner):
+    result = scanner.scan("", "", "Member: DIV-25325554-01\nPatient: John Doe\n")
+
+    assert result.member_number == "DIV-25325554-01"
+    assert result.is_smart
+    assert result.member_name == "John Doe"
+
+
+def test_name_label_never_takes_a_member_number(scanner):
+    result = scanner.scan("", "", "Name: 46665825-00\n")
+
+    assert result.member_name is None
+    assert result.member_number == "46665825-00"
+
+
+def test_labelled_member_number_beats_earlier_bare_number(scanner):
+    result = scanner.scan("", "Call us on 12345678", "Member Number: 87654321\n")
+
+    assert result.member_number == "87654321"
+    assert result.confidence["member_number"] == 0.95
+
+
+def test_free_text_ending_in_a_number_is_not_a_claim_item(scanner):
+    result = scanner.scan("Claim", "Please find the invoice. Patient: John Doe. Total 1,200.00", "")
+
+    assert result.member_name == "John Doe"
+    assert result.invoiced_amount == 1200.0
+    assert result.claim_details == []
+
+
+def test_pipe_table_rows_are_claim_items(scanner):
+    text = "Item | Qty | Cost\nX-Ray Chest | 1 | 3,000.00\nDr. A. Kamau review\t2,000.00\n"
+
+    result = scanner.scan("", "", text)
+
+    assert result.claim_details == [
+        {"item": "X-Ray Chest", "cost": 3000.0},
+        {"item": "Dr. A. Kamau review", "cost": 2000.0},
+    ]
+    assert result.invoiced_amount == 5000.0
+    assert not result.is_confident()
+
+
+def test_is_name():
+    assert EntityScanner.is_name("Jane W. Mwangi")
+    assert not EntityScanner.is_name("DIV-")
+    assert not EntityScanner.is_name("J45")
+    assert not EntityScanner.is_name("")
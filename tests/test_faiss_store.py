@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from stores.faiss_store import INDEX_TYPES, FaissIndexOptions, FaissStore  # noqa: E402
+
+DIM = 16
+N_DOCS = 300  # enough to train IVF-PQ's 256-centroid codebooks
+
+
+def options(index_type):
+    return FaissIndexOptions(
+        index_type=index_type, metric="cosine", nlist=4, nprobe=4, pq_m=2, hnsw_m=8, min_train_size=N_DOCS
+    )
+
+
+def corpus():
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(N_DOCS, DIM)).astype("float32").tolist()
+    docs = [(f"chunk {i}", {"source": f"doc{i % 10}.pdf", "page": i}) for i in range(N_DOCS)]
+    return docs, vectors
+
+
+def contents(hits):
+    return [h["content"] for h in hits]
+
+
+@pytest.fixture(scope="module", params=INDEX_TYPES)
+def snapshot(request, tmp_path_factory):
+    """The corpus indexed once per index type (IVF-PQ training is slow); tests load a copy."""
+    work = tmp_path_factory.mktemp(request.param)
+    s = FaissStore(DIM, options(request.param), docstore_path=str(work / "faiss_docs.sqlite"))
+    docs, vectors = corpus()
+    s.upsert(docs, vectors)
+    s.save_snapshot(str(work / "snapshots"))
+    s.close()
+    return request.param, str(work / "snapshots")
+
+
+@pytest.fixture
+def store(snapshot, tmp_path):
+    index_type, snapshot_dir = snapshot
+    s = FaissStore.load_snapshot(snapshot_dir, options=options(index_type), docstore_path=str(tmp_path / "docs.sqlite"))
+    yield s
+    s.close()
+
+
+def test_query(store):
+    docs, vectors = corpus()
+    assert store.count() == N_DOCS
+    assert store.trained
+    assert store.index.ntotal == N_DOCS
+    hits = store.query(vectors[42], k=5)
+    assert "chunk 42" in contents(hits)
+    assert hits[0]["metadata"]["source"] == "doc2.pdf"
+    assert [contents(h)[:1] for h in store.query_many([vectors[1], vectors[2]], k=1)] == [["chunk 1"], ["chunk 2"]]
+
+
+def test_upsert_same_chunk_refreshes_metadata(store):
+    docs, vectors = corpus()
+    ids = store.upsert([("chunk 5", {"source": "doc5.pdf", "page": 99})], [vectors[5]])
+    assert store.count() == N_DOCS
+    assert store.get(ids)[0]["metadata"]["page"] == 99
+
+
+def test_delete_by_source_and_chunks(store):
+    docs, vectors = corpus()
+    assert store.delete_by_source("doc3.pdf") == N_DOCS // 10
+    assert store.count() == N_DOCS - N_DOCS // 10
+    assert "chunk 3" not in contents(store.query(vectors[3], k=10))
+
+    _, meta = docs[4]
+    hashes = {row[2]["content_hash"] for batch in store.iter_documents() for row in batch if row[1] == "chunk 4"}
+    assert store.delete_chunks(meta["source"], hashes) == 1
+    assert "chunk 4" not in contents(store.query(vectors[4], k=10))
+    assert store.count() == N_DOCS - N_DOCS // 10 - 1
+
+
+def test_snapshot_round_trip(store, tmp_path):
+    docs, vectors = corpus()
+    store.delete_by_source("doc0.pdf")
+    snapshots = str(tmp_path / "snapshots")
+    assert store.save_snapshot(snapshots) is not None
+    assert store.save_snapshot(snapshots) is None  # unchanged
+
+    loaded = FaissStore.load_snapshot(
+        snapshots, options=options(store.options.index_type), docstore_path=str(tmp_path / "loaded.sqlite")
+    )
+    try:
+        assert loaded.count() == store.count()
+        assert loaded.content_hashes() == store.content_hashes()
+        assert "chunk 11" in contents(loaded.query(vectors[11], k=5))
+        assert "chunk 10" not in contents(loaded.query(vectors[10], k=10))
+
+        # The first write copies the read-only snapshot; the snapshot itself is untouched
+        loaded.upsert([("new chunk", {"source": "new.pdf"})], [vectors[0]])
+        assert loaded.count() == store.count() + 1
+        reread = FaissStore.load_snapshot(snapshots, options=options(store.options.index_type))
+        assert reread.count() == store.count()
+        reread.close()
+    finally:
+        loaded.close()
+
+
+def test_snapshot_with_other_layout_is_ignored(tmp_path):
+    s = FaissStore(DIM, options("flat"))
+    docs, vectors = corpus()
+    s.upsert(docs[:5], vectors[:5])
+    s.save_snapshot(str(tmp_path))
+    assert FaissStore.load_snapshot(str(tmp_path), options=options("hnsw")) is None
+    s.close()
+
+
+def test_ivf_serves_from_staging_until_trained(tmp_path):
+    s = FaissStore(DIM, options("ivf_flat"))
+    docs, vectors = corpus()
+    s.upsert(docs[:10], vectors[:10])
+    assert not s.trained
+    assert contents(s.query(vectors[3], k=1)) == ["chunk 3"]
+    s.upsert(docs[10:], vectors[10:])
+    assert s.trained
+    assert s.count() == N_DOCS
+    s.close()
+
+
+def test_hnsw_deletes_are_tombstoned_then_compacted(tmp_path):
+    s = FaissStore(DIM, options("hnsw"))
+    docs, vectors = corpus()
+    s.upsert(docs, vectors)
+    s.delete_by_source("doc1.pdf")
+    assert s.stats()["tombstones"] == N_DOCS // 10
+    s.delete_by_source("doc2.pdf")
+    s.delete_by_source("doc3.pdf")
+    # Past the compaction ratio the graph is rebuilt from live vectors
+    assert s.stats()["tombstones"] == 0
+    assert s.index.ntotal == s.count() == N_DOCS - 3 * N_DOCS // 10
+    s.close()
+
+
+def test_scratch_docstore_removed_on_close(tmp_path):
+    s = FaissStore(DIM, options("flat"), docstore_path=str(tmp_path / "faiss_docs.sqlite"))
+    s.upsert([("a", {"source": "a.pdf"})], [[1.0] * DIM])
+    scratch = s._scratch_path
+    assert scratch.startswith(str(tmp_path / "faiss_docs.")) and os.path.exists(scratch)
+    s.close()
+    assert not any(name.startswith("faiss_docs.") for name in os.listdir(tmp_path))
@@ -0,0 +1,120 @@
+import pytest
+
+pytest.importorskip("faiss")
+
+from rag.fusion import reciprocal_rank_fusion  # noqa: E402
+from rag.lexical import BM25Index, tokenize  # noqa: E402
+from rag.rag_client import RAGConfig, RAGRunner  # noqa: E402
+from stores.faiss_store import FaissIndexOptions, FaissStore  # noqa: E402
+
+CHUNKS = [
+    ("Asthma J45.9 is covered under the chronic benefit.", {"source": "chronic.pdf"}),
+    ("Dental cover excludes cosmetic procedures.", {"source": "dental.pdf"}),
+    ("Outpatient consultation code 99213 limit KES-25,000 per year.", {"source": "outpatient.pdf"}),
+    ("Outpatient pharmacy is capped per visit.", {"source": "outpatient.pdf"}),
+]
+
+
+@pytest.fixture
+def store():
+    s = FaissStore(4, FaissIndexOptions(index_type="flat", metric="l2"))
+    s.upsert(CHUNKS, [[float(i), 0.0, 0.0, 1.0] for i in range(len(CHUNKS))])
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def index(store):
+    bm25 = BM25Index()
+    assert bm25.build(store) == len(CHUNKS)
+    return bm25
+
+
+def sources(store, ranked):
+    docs = {d["id"]: d for d in store.get([doc_id for doc_id, _ in ranked])}
+    return [docs[doc_id]["metadata"]["source"] for doc_id, _ in ranked]
+
+
+def test_tokenize_keeps_codes_whole_and_indexes_their_parts():
+    assert tokenize("ICD J45.9, KES-25,000") == ["icd", "j45.9", "j45", "9", "kes-25,000", "kes", "25", "000"]
+
+
+def test_exact_code_ranks_first(store, index):
+    ranked, _ = index.search("J45.9", k=3)
+    assert sources(store, ranked) == ["chronic.pdf"]
+
+    ranked, _ = index.search("99213 outpatient", k=3)
+    assert sources(store, ranked)[0] == "outpatient.pdf"
+    assert len(ranked) == 2
+
+
+def test_unmatched_terms_lower_the_score_relative_to_ideal(index):
+    [(_, matched)], matched_ideal = index.search("dental", k=1)
+    [(_, partial)], partial_ideal = index.search("dental orthodontics implants", k=1)
+    assert matched / matched_ideal > partial / partial_ideal
+
+
+def test_delete_mirrors_store(store, index):
+    index.delete_by_source("outpatient.pdf", store)
+    store.delete_by_source("outpatient.pdf")
+    assert index.search("outpatient", k=5)[0] == []
+    assert len(index) == 2
+
+    [(_, content, meta)] = [row for batch in store.iter_documents() for row in batch if row[2]["source"] == "dental.pdf"]
+    index.delete_chunks("dental.pdf", [meta["content_hash"]], store)
+    assert index.search("dental", k=5)[0] == []
+    assert index.stats()["docs"] == 1
+
+
+def test_re_adding_changed_content_replaces_postings(index):
+    index.add([(0, "Malaria treatment is covered.", {"source": "chronic.pdf"})])
+    assert index.search("asthma", k=5)[0] == []
+    assert [doc_id for doc_id, _ in index.search("malaria", k=5)[0]] == [0]
+    assert len(index) == len(CHUNKS)
+
+
+def test_empty_index():
+    assert BM25Index().search("anything", k=5) == ([], 0.0)
+
+
+def hit(name, source="a.pdf"):
+    return {"content": name, "metadata": {"source": source, "content_hash": name}}
+
+
+def test_rrf_rewards_agreement_between_lists():
+    vector = [hit("a"), hit("b"), hit("c")]
+    lexical = [hit("c"), hit("d")]
+    fused = reciprocal_rank_fusion([vector, lexical], k=3)
+    # b and d tie at rank 2; ties keep first-seen order
+    assert [r["content"] for r in fused] == ["c", "a", "b"]
+    assert fused[0]["rrf_score"] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_rrf_keeps_first_seen_fields():
+    vector = [{**hit("a"), "score": 0.9}]
+    lexical = [{**hit("a"), "score": 12.0, "lexical_score": 12.0}]
+    [fused] = reciprocal_rank_fusion([vector, lexical], k=5)
+    assert fused["score"] == 0.9 and "lexical_score" not in fused
+
+
+def lexical_runner(store, index, fastpath):
+    runner = RAGRunner.__new__(RAGRunner)
+    runner.config = RAGConfig(retrieval_mode="hybrid", lexical_fastpath=fastpath)
+    runner.store = store
+    runner.lexical = index
+    return runner
+
+
+def test_lexical_hits_are_scored_like_vector_hits(store, index):
+    hits, strong = lexical_runner(store, index, fastpath=0)._lexical_search("J45.9 asthma", k=1)
+    assert hits[0]["metadata"]["source"] == "chronic.pdf"
+    assert 0 < hits[0]["score"] < hits[0]["lexical_score"]
+    # The fast path is off unless configured
+    assert not strong
+
+
+def test_lexical_fast_path_when_configured(store, index):
+    _, strong = lexical_runner(store, index, fastpath=0.5)._lexical_search("J45.9 asthma", k=1)
+    assert strong
+    _, strong = lexical_runner(store, index, fastpath=0.5)._lexical_search("asthma orthodontics implants", k=1)
+    assert not strong
@@ -0,0 +1,98 @@
+import datetime
+import hashlib
+import io
+import random
+
+import pytest
+
+from document_ingestor.s3_ingestor import S3DocumentIngestor
+
+WORDS = "member claim benefit outpatient dental optical maternity limit policy scheme cover hospital annual family".split()
+
+
+class FakeEmbedClient:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_many(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+class FakeRAG:
+    """Just enough of RAGRunner for the ingestor: an in-memory store keyed by (source, content_hash)."""
+
+    def __init__(self):
+        self.embed_client = FakeEmbedClient()
+        self.docs = {}
+
+    def index_vectors(self, docs, vectors):
+        ids = []
+        for text, meta in docs:
+            self.docs[(meta["source"], meta["content_hash"])] = text
+            ids.append(len(self.docs))
+        return ids
+
+    def delete_source(self, source):
+        keys = [k for k in self.docs if k[0] == source]
+        for k in keys:
+            del self.docs[k]
+        return len(keys)
+
+    def delete_chunks(self, source, hashes):
+        keys = [(source, h) for h in hashes if (source, h) in self.docs]
+        for k in keys:
+            del self.docs[k]
+        return len(keys)
+
+    def save_snapshot(self):
+        pass
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def head_object(self, Bucket, Key):
+        data = self.objects[Key]
+        return {
+            "ETag": '"%s"' % hashlib.md5(data).hexdigest(),
+            "ContentLength": len(data),
+            "LastModified": datetime.datetime(2025, 1, 1),
+            "ContentType": "text/plain",
+        }
+
+    def get_object(self, Bucket, Key):
+        data = self.objects[Key]
+        return {"Body": io.BytesIO(data), "ContentType": "text/plain", "ContentLength": len(data)}
+
+
+@pytest.fixture
+def ingestor(tmp_path, monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    return S3DocumentIngestor(
+        FakeRAG(), bucket="kb", chunk_size=80, chunk_overlap=0, work_dir=str(tmp_path),
+        pipelined=False, near_dup_mode="skip",
+    )
+
+
+def test_chunk_edited_in_place_is_reembedded(ingestor):
+    rng = random.Random(7)
+    paragraphs = [" ".join(rng.choice(WORDS) for _ in range(60)) + "." for _ in range(3)]
+    ingestor.s3 = FakeS3({"policy.txt": "\n\n".join(paragraphs).encode()})
+    assert ingestor.ingest_file("policy.txt")["status"] == "added"
+    assert len(ingestor.rag.docs) == 3
+
+    # A small edit leaves the chunk a near-duplicate of its own previous text.
+    edited = paragraphs[1] + " Amended 2025."
+    paragraphs[1] = edited
+    ingestor.s3 = FakeS3({"policy.txt": "\n\n".join(paragraphs).encode()})
+    ingestor.rag.embed_client.embedded.clear()
+
+    result = ingestor.ingest_file("policy.txt")
+
+    assert result["status"] == "updated"
+    assert result["near_dups"] == 0
+    assert ingestor.rag.embed_client.embedded == [edited]
+    assert len(ingestor.rag.docs) == 3
+    assert edited in ingestor.rag.docs.values()
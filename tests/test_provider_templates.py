@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+from bedrock_llms.base import BaseLLMClient
+from extractors.claim_extractor import ClaimExtractor
+from extractors.utils.provider_templates import ProviderTemplateRegistry
+
+FIXTURES = Path(__file__).parent.parent / "benchmarks" / "fixtures" / "ocr"
+
+
+def fixture(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+class StubLLM(BaseLLMClient):
+    """Answers every prompt with the same text and records the prompts it saw."""
+
+    def __init__(self, answer="no"):
+        self.answer = answer
+        self.calls = []
+
+    def invoke(self, prompt):
+        return self.answer
+
+    def chat_completion(self, messages):
+        self.calls.append(messages)
+        return {"choices": [{"message": {"content": self.answer}}]}
+
+    def stream(self, messages, *, temperature=None, max_tokens=None):
+        yield self.answer
+
+
+@pytest.fixture
+def registry():
+    return ProviderTemplateRegistry()
+
+
+def test_aku_invoice(registry):
+    data = registry.extract("billing@aku.edu", fixture("aku_outpatient_invoice.txt"))
+    assert data["template"] == "aku_outpatient_invoice"
+    assert data["member_number"] == "DIV-25325554-01"
+    assert data["member_name"] == "Jane Wanjiku Mwangi"
+    assert data["scheme_name"] == "Diversey Kenya Staff Medical Scheme"
+    assert data["invoiced_amount"] == 7700.0
+    assert [c["cost"] for c in data["claim_details"]] == [4500.0, 1850.0, 950.0, 400.0]
+    assert data["benefit_type"] == "outpatient"
+
+
+def test_mp_shah_invoice_forwarded_without_provider_domain(registry):
+    # Every fingerprint is present, so the sender domain is not needed
+    data = registry.extract("claims.desk@gmail.com", fixture("mp_shah_lab_invoice.txt"))
+    assert data["provider_name"] == "M.P. Shah Hospital"
+    assert data["member_number"] == "12345678"
+    assert data["invoiced_amount"] == 8100.0
+    assert len(data["claim_details"]) == 3
+    assert data["service_type"] == "laboratory"
+
+
+def test_partial_fingerprints_need_the_provider_domain(registry):
+    text = fixture("mp_shah_lab_invoice.txt").replace("Shivachi Road, Parklands\n", "")
+    assert registry.extract("someone@gmail.com", text) is None
+    assert registry.extract("lab@mpshahhosp.org", text) is not None
+
+
+def test_totals_that_do_not_add_up_fail_validation(registry):
+    text = fixture("aku_outpatient_invoice.txt").replace("Grand Total (KES)                          7,700.00",
+                                                         "Grand Total (KES)                          9,700.00")
+    assert registry.extract("billing@aku.edu", text) is None
+    assert registry.stats()["validation_failed"] == 1
+
+
+def test_unknown_layout_and_stats(registry):
+    assert registry.extract("x@y.com", fixture("handwritten_preauth.txt")) is None
+    registry.extract("billing@aku.edu", fixture("aku_outpatient_invoice.txt"))
+    stats = registry.stats()
+    assert (stats["attempts"], stats["hits"], stats["no_match"]) == (2, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["templates"] == 2
+
+
+def test_missing_layout_file_disables_templates(tmp_path):
+    registry = ProviderTemplateRegistry(str(tmp_path / "missing.json"))
+    assert registry.extract("billing@aku.edu", fixture("aku_outpatient_invoice.txt")) is None
+
+
+def test_extractor_skips_llm_for_fields_the_template_supplies():
+    llm = StubLLM()
+    result = ClaimExtractor(llm_client=llm).extract(
+        "Lab claim", "Please process.", fixture("mp_shah_lab_invoice.txt"), sender="lab@mpshahhosp.org"
+    )
+    assert result.member_number == "12345678"
+    assert result.provider_name == "M.P. Shah Hospital"
+    assert result.service_type == "laboratory" and result.benefit_type == "outpatient"
+    # Only the clinical summary and chronic-condition prompts remain
+    assert len(llm.calls) == 2
+
+
+def test_extractor_reads_templates_from_ocr_text_not_retrieved_context():
+    ocr = fixture("aku_outpatient_invoice.txt")
+    context = "Tariff: Consultation - Specialist 1 9,999.00\nMember No: 00000000\n"
+    llm = StubLLM()
+    result = ClaimExtractor(llm_client=llm).extract(
+        "Claim", "", f"{context}\n\n{ocr}", sender="billing@aku.edu", ocr_text=ocr
+    )
+    assert result.member_number == "DIV-25325554-01"
+    assert result.invoiced_amount == 7700.0
+    assert len(result.claim_details) == 4
+    assert result.is_smart
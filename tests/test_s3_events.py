@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from document_ingestor.events import CREATED, REMOVED, S3EventConsumer, parse_s3_event
+from document_ingestor.s3_ingestor import S3DocumentIngestor
+
+
+def s3_event(name, key, bucket="kb"):
+    return json.dumps({"Records": [{"eventName": name, "s3": {"bucket": {"name": bucket}, "object": {"key": key}}}]})
+
+
+class FakeSQS:
+    def __init__(self):
+        self.messages = []
+        self.deleted = []
+        self.extended = []
+        self.delete_failures = 0
+
+    def send(self, body):
+        self.messages.append({"Body": body, "ReceiptHandle": f"rh{len(self.messages) + len(self.deleted)}"})
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, VisibilityTimeout=None):
+        out, self.messages = self.messages[:MaxNumberOfMessages], self.messages[MaxNumberOfMessages:]
+        return {"Messages": out}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self.extended += [(e["ReceiptHandle"], e["VisibilityTimeout"]) for e in Entries]
+        return {"Successful": [{"Id": e["Id"]} for e in Entries]}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        if self.delete_failures:
+            self.delete_failures -= 1
+            failed, ok = Entries[-1:], Entries[:-1]
+        else:
+            failed, ok = [], Entries
+        self.deleted += [e["ReceiptHandle"] for e in ok]
+        return {
+            "Successful": [{"Id": e["Id"]} for e in ok],
+            "Failed": [{"Id": e["Id"], "Code": "InternalError", "Message": "try again", "SenderFault": False}
+                       for e in failed],
+        }
+
+
+class FakeRAG:
+    def __init__(self):
+        self.snapshots = 0
+
+    def save_snapshot(self):
+        self.snapshots += 1
+
+
+class FakeIngestor:
+    """The parts of S3DocumentIngestor the consumer drives."""
+
+    _summarize = staticmethod(S3DocumentIngestor._summarize)
+
+    def __init__(self, objects, failing=()):
+        self.bucket = "kb"
+        self.objects = objects
+        self.failing = set(failing)
+        self.run_lock = threading.Lock()
+        self.rag = FakeRAG()
+        self.ingested = []
+        self.removed = []
+        self.delay = 0.0
+
+    def _head(self, key):
+        if key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"Key": key, "ETag": self.objects[key]}
+
+    def ingest_file(self, key, obj=None, save_state=True):
+        time.sleep(self.delay)
+        self.ingested.append(key)
+        return {"file": key, "status": "failed" if key in self.failing else "added", "embedded": 1}
+
+    def remove_source(self, key):
+        self.removed.append(key)
+        return 2
+
+    def _save_state(self):
+        pass
+
+
+def consumer(ingestor, sqs, **kwargs):
+    return S3EventConsumer(ingestor, queue_url="q", sqs=sqs, coalesce_secs=0, wait_secs=0, **kwargs)
+
+
+def test_parse_s3_event_direct_and_sns():
+    assert parse_s3_event(s3_event("ObjectCreated:Put", "policies/a+b%2B.pdf")) == [("policies/a b+.pdf", CREATED)]
+    wrapped = json.dumps({"Type": "Notification", "Message": s3_event("ObjectRemoved:Delete", "c.txt")})
+    assert parse_s3_event(wrapped, "kb") == [("c.txt", REMOVED)]
+
+
+@pytest.mark.parametrize("body", [
+    "not json",
+    json.dumps({"Event": "s3:TestEvent", "Bucket": "kb"}),
+    s3_event("ObjectCreated:Put", "x.txt", bucket="other"),
+    s3_event("ObjectRestore:Post", "x.txt"),
+    json.dumps([1, 2]),
+])
+def test_parse_s3_event_ignores_irrelevant_messages(body):
+    assert parse_s3_event(body, "kb") == []
+
+
+def test_poll_once_coalesces_and_deletes_applied_messages():
+    sqs = FakeSQS()
+    for _ in range(15):
+        sqs.send(s3_event("ObjectCreated:Put", "a.txt"))
+    sqs.send(s3_event("ObjectRemoved:Delete", "gone.txt"))
+    sqs.send(s3_event("ObjectCreated:Put", "elsewhere.txt", bucket="other"))
+    ingestor = FakeIngestor({"a.txt": "e1"})
+
+    results = consumer(ingestor, sqs).poll_once()
+
+    assert sorted((r["file"], r["status"]) for r in results) == [("a.txt", "added"), ("gone.txt", "removed")]
+    assert ingestor.ingested == ["a.txt"]
+    assert ingestor.removed == ["gone.txt"]
+    assert len(sqs.deleted) == 17
+    assert ingestor.rag.snapshots == 1
+
+
+def test_poll_once_reads_current_state_not_event_order():
+    sqs = FakeSQS()
+    sqs.send(s3_event("ObjectCreated:Put", "a.txt"))
+    ingestor = FakeIngestor({})
+
+    results = consumer(ingestor, sqs).poll_once()
+
+    assert [(r["file"], r["status"]) for r in results] == [("a.txt", "removed")]
+    assert ingestor.ingested == []
+
+
+def test_poll_once_keeps_messages_of_failed_keys():
+    sqs = FakeSQS()
+    sqs.send(s3_event("ObjectCreated:Put", "ok.txt"))
+    sqs.send(s3_event("ObjectCreated:Put", "bad.txt"))
+    ingestor = FakeIngestor({"ok.txt": "e1", "bad.txt": "e2"}, failing={"bad.txt"})
+
+    c = consumer(ingestor, sqs)
+    c.poll_once()
+
+    assert sqs.deleted == ["rh0"]
+    assert c.last_summary["added"] == 1 and c.last_summary["failed"] == 1
+
+
+def test_poll_once_with_empty_queue():
+    assert consumer(FakeIngestor({}), FakeSQS()).poll_once() == []
+
+
+def test_failed_deletes_are_retried():
+    sqs = FakeSQS()
+    for key in ("a.txt", "b.txt", "c.txt"):
+        sqs.send(s3_event("ObjectCreated:Put", key))
+    sqs.delete_failures = 1
+
+    consumer(FakeIngestor({"a.txt": "1", "b.txt": "2", "c.txt": "3"}), sqs).poll_once()
+
+    assert sorted(sqs.deleted) == ["rh0", "rh1", "rh2"]
+
+
+def test_visibility_heartbeat_while_batch_is_applied():
+    sqs = FakeSQS()
+    sqs.send(s3_event("ObjectCreated:Put", "a.txt"))
+    ingestor = FakeIngestor({"a.txt": "e1"})
+    ingestor.delay = 0.3
+
+    c = consumer(ingestor, sqs)
+    c.visibility_secs = 0.15  # heartbeat every 0.05s
+    c.poll_once()
+
+    assert len(sqs.extended) >= 2
+    assert all(handle == "rh0" for handle, _ in sqs.extended)
+    assert sqs.deleted == ["rh0"]
+    assert c._held == set()
+
+
+def test_consumer_requires_queue_url():
+    with pytest.raises(ValueError):
+        S3EventConsumer(FakeIngestor({}), queue_url=None, sqs=FakeSQS())
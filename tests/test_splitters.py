@@ -0,0 +1,81 @@
+import pytest
+
+from document_ingestor.splitters import SplitOptions, TokenSplitter, approx_tokens
+
+
+def splitter(size=40, overlap=8):
+    return TokenSplitter(SplitOptions(chunk_size=size, chunk_overlap=overlap))
+
+
+def sentences(n, prefix="Sentence"):
+    return " ".join(f"{prefix} {i} covers outpatient consultations." for i in range(n))
+
+
+def test_approx_tokens_is_additive_over_whitespace():
+    assert approx_tokens("J45.9") == 3
+    assert approx_tokens("a pharmacological") == 1 + 3
+    assert approx_tokens("one two") == approx_tokens("one") + approx_tokens("two")
+
+
+def test_short_text_is_one_chunk():
+    assert splitter().split_text("Dental cover excludes cosmetic work.") == ["Dental cover excludes cosmetic work."]
+    assert splitter().split_text("  \n\n ") == []
+
+
+def test_chunks_respect_size_and_end_on_sentences():
+    s = splitter()
+    chunks = s.split_text(sentences(30))
+    assert len(chunks) > 1
+    assert all(approx_tokens(c) <= 40 for c in chunks)
+    assert all(c.endswith(".") for c in chunks)
+    # Every sentence survives
+    text = " ".join(chunks)
+    assert all(f"Sentence {i} covers" in text for i in range(30))
+
+
+def test_chunks_overlap_by_whole_sentences():
+    chunks = splitter(size=40, overlap=10).split_text(sentences(12))
+    for prev, nxt in zip(chunks, chunks[1:]):
+        last_sentence = prev.rsplit(". ", 1)[-1]
+        assert nxt.startswith(last_sentence)
+
+
+def test_no_overlap():
+    chunks = splitter(size=40, overlap=0).split_text(sentences(12))
+    assert " ".join(chunks) == sentences(12)
+
+
+def test_prefers_paragraph_breaks():
+    text = sentences(3, "Intro") + "\n\n" + sentences(3, "Body")
+    chunks = splitter(size=40, overlap=0).split_text(text)
+    assert chunks[0] == sentences(3, "Intro")
+    assert chunks[1].startswith("Body 0")
+
+
+def test_oversized_units_are_cut_between_words():
+    long_line = " ".join(["benefit"] * 200)
+    chunks = splitter(size=30, overlap=0).split_text(long_line)
+    assert all(approx_tokens(c) <= 30 for c in chunks)
+    assert " ".join(chunks).split() == long_line.split()
+
+
+def test_unbroken_text_is_force_cut():
+    blob = "A" * 5000
+    chunks = splitter(size=20, overlap=0).split_text(blob)
+    assert "".join(chunks) == blob
+    assert all(approx_tokens(c) <= 20 for c in chunks)
+
+
+def test_streaming_blocks_match_whole_text():
+    text = sentences(20) + "\r\n\r\n" + sentences(5, "Tail")
+    s = splitter()
+    # Block boundaries mid-word, mid-sentence and inside a CRLF pair
+    cuts = [7, 50, text.index("\r\n") + 1, len(text) - 3]
+    blocks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+    assert list(s.split_blocks(blocks)) == s.split_text(text.replace("\r\n", "\n"))
+
+
+@pytest.mark.parametrize("size, overlap", [(0, 0), (10, 10), (10, -1)])
+def test_invalid_options(size, overlap):
+    with pytest.raises(ValueError):
+        TokenSplitter(SplitOptions(chunk_size=size, chunk_overlap=overlap))
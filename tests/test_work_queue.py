@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+from orchestrator.work_queue import DEAD, DONE, LEASED, PENDING, WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = WorkQueue(str(tmp_path / "q.sqlite"), visibility_secs=60, max_attempts=2, retry_backoff_secs=0)
+    yield q
+    q.close()
+
+
+def test_enqueue_is_deduplicated(queue):
+    assert queue.enqueue("m1", {"n": 1})
+    assert not queue.enqueue("m1", {"n": 2})
+    item = queue.lease()
+    assert item.payload == {"n": 1}
+    assert queue.lease() is None
+
+
+def test_lease_then_complete(queue):
+    queue.enqueue("m1", {})
+    item = queue.lease()
+    assert item.attempts == 1
+    assert queue.status("m1") == LEASED
+    assert queue.complete(item)
+    assert queue.status("m1") == DONE
+    # Redelivery of a finished email is recognised as done
+    assert not queue.enqueue("m1", {})
+
+
+def test_fail_retries_then_dead_letters(queue):
+    queue.enqueue("m1", {"subject": "claim"})
+    assert queue.fail(queue.lease(), "ocr down") == PENDING
+    assert queue.status("m1") == PENDING
+
+    item = queue.lease()
+    assert item.attempts == 2
+    assert queue.fail(item, "ocr still down") == DEAD
+    assert queue.status("m1") == DEAD
+    assert queue.lease() is None
+    assert not queue.enqueue("m1", {})
+
+
+def test_retry_waits_for_backoff(tmp_path):
+    q = WorkQueue(str(tmp_path / "q.sqlite"), max_attempts=3, retry_backoff_secs=60)
+    q.enqueue("m1", {})
+    q.fail(q.lease(), "boom")
+    assert q.lease() is None
+    assert q.stats()["pending"] == 1 and q.stats()["ready"] == 0
+    q.close()
+
+
+def test_expired_lease_is_redelivered_and_stale_token_rejected(queue):
+    queue.visibility_secs = 0.01
+    queue.enqueue("m1", {})
+    first = queue.lease()
+    time.sleep(0.05)
+
+    second = queue.lease()
+    assert second.attempts == 2
+    assert second.lease_token != first.lease_token
+    assert not queue.complete(first)
+    assert queue.fail(first, "late") is None
+    assert not queue.extend(first)
+    assert queue.complete(second)
+
+
+def test_lease_expired_on_final_attempt_is_dead_lettered(queue):
+    queue.visibility_secs = 0.01
+    queue.enqueue("m1", {"subject": "crash"})
+    for _ in range(2):
+        assert queue.lease() is not None
+        time.sleep(0.05)
+
+    assert queue.lease() is None
+    assert queue.status("m1") == DEAD
+    [dead] = queue.claim_dead_letters()
+    assert dead.last_error == "lease expired on final attempt"
+    assert dead.payload == {"subject": "crash"}
+
+
+def test_dead_letters_are_claimed_once(queue):
+    queue.enqueue("m1", {})
+    queue.fail(queue.lease(), "a")
+    queue.fail(queue.lease(), "b")
+
+    [dead] = queue.claim_dead_letters()
+    assert (dead.dedupe_key, dead.attempts, dead.last_error) == ("m1", 2, "b")
+    assert queue.claim_dead_letters() == []
+
+    queue.unclaim_dead_letter("m1")
+    assert [d.dedupe_key for d in queue.claim_dead_letters()] == ["m1"]
+
+
+def test_requeue_dead_resets_attempts(queue):
+    queue.enqueue("m1", {"n": 1})
+    queue.fail(queue.lease(), "a")
+    queue.fail(queue.lease(), "b")
+
+    assert queue.requeue_dead("m1")
+    assert not queue.requeue_dead("m1")
+    item = queue.lease()
+    assert (item.attempts, item.payload) == (1, {"n": 1})
+    assert queue.stats()["dead_letters"] == 0
+
+
+def test_stats_and_purge(queue):
+    queue.enqueue("m1", {})
+    queue.enqueue("m2", {})
+    queue.complete(queue.lease())
+    stats = queue.stats()
+    assert (stats["depth"], stats["pending"], stats["done"]) == (1, 1, 1)
+    assert queue.purge_done(older_than_days=0) == 1
+    assert queue.status("m1") is None